@@ -0,0 +1,342 @@
+"""Local product catalog mirror.
+
+Keeps the product fields the app uses (id, name, sku, slug, images,
+meta_data) in a SQLite database under the per-user data directory, one set of
+rows per store URL. `sync()` fetches only products modified since the last
+sync (`modified_after`, with a small overlap), so after the first run a
+refresh is usually a single request. Deleted products never show up as
+modified, so a full sync, which also drops them, runs at least once a day.
+
+Searches, previews and run planning read from the mirror instead of the API.
+The `_image_processed` meta value of every product is kept in its own indexed
+column, so finding the products that still need processing is one query.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+from utils import events
+
+# Re-fetch products modified shortly before the watermark: clocks and
+# second-resolution timestamps make the boundary unreliable.
+SYNC_OVERLAP = timedelta(minutes=1)
+FULL_SYNC_AGE = 24 * 60 * 60
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS products (
+    store TEXT NOT NULL,
+    id INTEGER NOT NULL,
+    name TEXT,
+    sku TEXT,
+    slug TEXT,
+    images TEXT,
+    meta_data TEXT,
+    date_modified_gmt TEXT,
+    processed_hash TEXT,
+    PRIMARY KEY (store, id)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    store TEXT PRIMARY KEY,
+    watermark TEXT,
+    synced_at REAL,
+    full_synced_at REAL
+);
+"""
+
+
+class ProductCatalog:
+    def __init__(self, path, store: str):
+        """
+        Initialize the ProductCatalog.
+
+        Args:
+            path (str | Path): The SQLite database file.
+            store (str): The store URL; each store has its own rows.
+        """
+        self.path = Path(path)
+        self.store = store.rstrip("/")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._db:
+            self._db.executescript(_SCHEMA)
+            self._migrate()
+
+    def _migrate(self) -> None:
+        columns = {row[1] for row in self._db.execute("PRAGMA table_info(products)")}
+        if "processed_hash" not in columns:
+            self._db.execute("ALTER TABLE products ADD COLUMN processed_hash TEXT")
+            rows = self._db.execute("SELECT store, id, meta_data FROM products").fetchall()
+            self._db.executemany(
+                "UPDATE products SET processed_hash = ? WHERE store = ? AND id = ?",
+                [(processed_hash(json.loads(meta or "[]")), store, product_id) for store, product_id, meta in rows],
+            )
+        self._db.execute("CREATE INDEX IF NOT EXISTS products_processed ON products (store, processed_hash)")
+
+    # -- sync -------------------------------------------------------------
+
+    def state(self):
+        """
+        Returns:
+            tuple: (watermark, synced_at, full_synced_at), all None if never synced.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT watermark, synced_at, full_synced_at FROM sync_state WHERE store = ?", (self.store,)
+            ).fetchone()
+        return row if row else (None, None, None)
+
+    @property
+    def synced(self) -> bool:
+        return self.state()[1] is not None
+
+    def age(self) -> Optional[float]:
+        """Seconds since the last sync, or None if never synced."""
+        synced_at = self.state()[1]
+        return time.time() - synced_at if synced_at else None
+
+    def sync(self, wcapi, full: bool = False, concurrency: Optional[int] = None) -> int:
+        """
+        Fetch new and changed products from the store.
+
+        Args:
+            wcapi (WooCommerceClient): The API client.
+            full (bool): Re-list the whole catalog and drop products that are gone.
+            concurrency (int, optional): Pages fetched at the same time.
+
+        Returns:
+            int: The number of products fetched.
+
+        Raises:
+            requests.RequestException: A page failed. The products fetched so far are
+                kept, but nothing is pruned and the watermark stays where it was.
+        """
+        from api.woocommerce_api import LIST_CONCURRENCY, PRODUCT_FIELDS, list_products
+
+        watermark, _, full_synced_at = self.state()
+        if full:
+            watermark = None
+        params = {"_fields": f"{PRODUCT_FIELDS},date_modified_gmt"}
+        if watermark:
+            since = datetime.fromisoformat(watermark) - SYNC_OVERLAP
+            params.update({"modified_after": since.isoformat(timespec="seconds"), "dates_are_gmt": "true"})
+
+        fetched = 0
+        seen: List[int] = []
+        latest = watermark
+        batch: List[Dict[str, Any]] = []
+        with events.span("catalog_sync", full=full, since=watermark) as sync_event:
+            for product in list_products(wcapi, params, concurrency=concurrency or LIST_CONCURRENCY):
+                batch.append(product)
+                seen.append(product["id"])
+                modified = product.get("date_modified_gmt")
+                if modified and (latest is None or modified > latest):
+                    latest = modified
+                if len(batch) >= 500:
+                    self._upsert(batch)
+                    fetched += len(batch)
+                    batch = []
+            self._upsert(batch)
+            fetched += len(batch)
+
+            # Only reached once every page was listed: an incomplete listing must
+            # neither prune the mirror nor move the watermark past unseen products.
+            removed = self._prune(seen) if full else 0
+            now = time.time()
+            with self._lock, self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO sync_state VALUES (?, ?, ?, ?)",
+                    (self.store, latest, now, now if full else full_synced_at),
+                )
+            sync_event["count"] = fetched
+            sync_event["removed"] = removed
+        return fetched
+
+    def refresh(self, wcapi, max_age: float = 0, concurrency: Optional[int] = None) -> int:
+        """
+        Sync if the mirror is older than `max_age` seconds.
+
+        The sync is a full one if the mirror was never fully synced or the last
+        full sync is older than FULL_SYNC_AGE.
+
+        Returns:
+            int: The number of products fetched.
+        """
+        _, synced_at, full_synced_at = self.state()
+        now = time.time()
+        if synced_at is not None and now - synced_at < max_age:
+            return 0
+        full = full_synced_at is None or now - full_synced_at >= FULL_SYNC_AGE
+        return self.sync(wcapi, full=full, concurrency=concurrency)
+
+    def _upsert(self, products: List[Dict[str, Any]]) -> None:
+        if not products:
+            return
+        rows = [
+            (
+                self.store,
+                product["id"],
+                product.get("name"),
+                product.get("sku"),
+                product.get("slug"),
+                json.dumps(product.get("images") or []),
+                json.dumps(product.get("meta_data") or []),
+                product.get("date_modified_gmt"),
+                processed_hash(product.get("meta_data")),
+            )
+            for product in products
+        ]
+        with self._lock, self._db:
+            self._db.executemany("INSERT OR REPLACE INTO products VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def _prune(self, seen_ids: List[int]) -> int:
+        seen = set(seen_ids)
+        with self._lock:
+            stored = [row[0] for row in self._db.execute("SELECT id FROM products WHERE store = ?", (self.store,))]
+            gone = [(self.store, product_id) for product_id in stored if product_id not in seen]
+            with self._db:
+                self._db.executemany("DELETE FROM products WHERE store = ? AND id = ?", gone)
+        return len(gone)
+
+    def put(self, product: Dict[str, Any]) -> None:
+        """
+        Store one product, e.g. the response of an update made by this app, so
+        the mirror is current before the next sync.
+        """
+        if product and product.get("id"):
+            self._upsert([product])
+
+    # -- queries ----------------------------------------------------------
+
+    @staticmethod
+    def _product(row) -> Dict[str, Any]:
+        product_id, name, sku, slug, images, meta_data, modified = row
+        return {
+            "id": product_id,
+            "name": name,
+            "sku": sku,
+            "slug": slug,
+            "images": json.loads(images or "[]"),
+            "meta_data": json.loads(meta_data or "[]"),
+            "date_modified_gmt": modified,
+        }
+
+    _COLUMNS = "id, name, sku, slug, images, meta_data, date_modified_gmt"
+
+    def get(self, product_id: int) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM products WHERE store = ? AND id = ?", (self.store, product_id)
+            ).fetchone()
+        return self._product(row) if row else None
+
+    def count(self, pending: Optional[str] = None) -> int:
+        """
+        The number of mirrored products, or of those not processed with the hash `pending`.
+        """
+        query = "SELECT COUNT(*) FROM products WHERE store = ?"
+        args = (self.store,)
+        if pending is not None:
+            query += " AND processed_hash IS NOT ?"
+            args += (pending,)
+        with self._lock:
+            return self._db.execute(query, args).fetchone()[0]
+
+    def products(self, chunk_size: int = 500, pending: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+        """
+        All mirrored products, by ID, read in chunks.
+
+        Args:
+            chunk_size (int): Rows read per query.
+            pending (str, optional): Only products whose processed hash differs from this one.
+        """
+        where = "store = ? AND id > ?"
+        extra = ()
+        if pending is not None:
+            where += " AND processed_hash IS NOT ?"
+            extra = (pending,)
+        last_id = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    f"SELECT {self._COLUMNS} FROM products WHERE {where} ORDER BY id LIMIT ?",
+                    (self.store, last_id, *extra, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            for row in rows:
+                yield self._product(row)
+            last_id = rows[-1][0]
+
+    def search(self, term: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Products whose name, SKU or slug contains `term` (case-insensitive).
+        """
+        escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        pattern = f"%{escaped}%"
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {self._COLUMNS} FROM products WHERE store = ? "
+                "AND (name LIKE ? ESCAPE '\\' OR sku LIKE ? ESCAPE '\\' OR slug LIKE ? ESCAPE '\\') "
+                "ORDER BY id LIMIT ?",
+                (self.store, pattern, pattern, pattern, limit),
+            ).fetchall()
+        return [self._product(row) for row in rows]
+
+
+def processed_hash(meta_data) -> Optional[str]:
+    """
+    The `_image_processed` value in a product's meta data, or None.
+    """
+    for meta in meta_data or []:
+        if meta.get("key") == "_image_processed":
+            value = meta.get("value")
+            return value if isinstance(value, str) else None
+    return None
+
+
+_catalogs: Dict[str, ProductCatalog] = {}
+_catalogs_lock = threading.Lock()
+
+
+def _default_path() -> Path:
+    setting = os.environ.get("IMAGE_PROCESSOR_CATALOG")
+    if setting:
+        return Path(setting)
+
+    import platformdirs
+
+    from config.encrypt_config import APP_AUTHOR, APP_NAME
+
+    return Path(platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)) / "catalog.sqlite"
+
+
+def get_catalog(store: str) -> Optional[ProductCatalog]:
+    """
+    The catalog mirror of a store.
+
+    Args:
+        store (str): The store URL.
+
+    Returns:
+        ProductCatalog: The mirror, or None if it is disabled or cannot be opened.
+    """
+    if os.environ.get("IMAGE_PROCESSOR_CATALOG", "").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    key = store.rstrip("/")
+    with _catalogs_lock:
+        catalog = _catalogs.get(key)
+        if catalog is None:
+            try:
+                catalog = ProductCatalog(_default_path(), key)
+            except (OSError, sqlite3.Error):
+                return None
+            _catalogs[key] = catalog
+        return catalog
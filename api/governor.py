@@ -0,0 +1,384 @@
+"""Per-host request governor.
+
+Every request to a host passes through that host's governor, which:
+
+- spaces requests with a token bucket (`rate` requests per second; off by
+  default, since the adaptive limit and Retry-After already back off when
+  the host asks for it);
+- caps the requests in flight with an adaptive limit (AIMD): the limit grows
+  by about one per round of successful requests and is cut in half when the
+  host throttles (429/503) or fails, and by a tenth when latency climbs well
+  above the best latency seen so far for that method (uploads and listings
+  take very different times);
+- retries throttled and failed requests with jittered exponential backoff,
+  honouring Retry-After. A Retry-After pauses the whole host, not just the
+  request that got it. Connection errors and 502/504 are only retried for
+  idempotent methods, since a POST may have been applied.
+
+A streamed response (e.g. an image download) keeps its slot until it is
+closed, so body transfers count against the limit too. Its latency for the
+adaptive limit is still the time to the headers: the body time grows with
+the file size, not with congestion.
+
+The limit and the in-flight count are reported to the status panel as the
+"http:<host>" stage, and `summary()` gives the counters per host.
+"""
+from __future__ import annotations
+
+import random
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from utils import events
+from utils.metrics import metrics
+
+DEFAULT_RATE = 0.0
+DEFAULT_MAX_CONCURRENCY = 16
+DEFAULT_MAX_RETRIES = 4
+INITIAL_CONCURRENCY = 4
+BACKOFF_BASE = 0.5
+BACKOFF_MAX = 30.0
+RETRY_AFTER_MAX = 120.0
+# A latency this many times the best one seen counts as congestion.
+LATENCY_FACTOR = 3.0
+# Latencies below this are all "fast"; jitter under it is ignored.
+LATENCY_FLOOR = 0.05
+# The limit is cut at most once per this many seconds.
+DECREASE_COOLDOWN = 1.0
+
+THROTTLE_STATUSES = (429, 503)
+FAILURE_STATUSES = (502, 504)
+IDEMPOTENT_METHODS = ("GET", "HEAD", "OPTIONS", "PUT", "DELETE")
+
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """
+        Initialize the TokenBucket.
+
+        Args:
+            rate (float): Tokens added per second; 0 disables the bucket.
+            burst (float, optional): The bucket size, by default one second of tokens.
+        """
+        self._lock = threading.Lock()
+        self._tokens = 0.0
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self.set_rate(rate, burst)
+        self._tokens = self.burst
+
+    def set_rate(self, rate: float, burst: Optional[float] = None) -> None:
+        with self._lock:
+            self.rate = max(0.0, float(rate))
+            self.burst = max(1.0, float(burst) if burst else self.rate)
+            self._tokens = min(self._tokens, self.burst)
+
+    def pause(self, seconds: float) -> None:
+        """Hand out no tokens for `seconds`."""
+        with self._lock:
+            self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+
+    def acquire(self) -> None:
+        """Take one token, waiting for it if needed."""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    wait = self._paused_until - now
+                elif self.rate <= 0:
+                    return
+                else:
+                    self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                    self._updated = now
+                    if self._tokens >= 1:
+                        self._tokens -= 1
+                        return
+                    wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class AdaptiveLimit:
+    def __init__(self, initial: int = INITIAL_CONCURRENCY, minimum: int = 1, maximum: int = DEFAULT_MAX_CONCURRENCY):
+        """
+        Initialize the AdaptiveLimit.
+
+        Args:
+            initial (int): The starting limit.
+            minimum (int): The limit never drops below this.
+            maximum (int): The limit never grows beyond this.
+        """
+        self.minimum = minimum
+        self.maximum = max(minimum, maximum)
+        self.limit = float(min(max(initial, minimum), self.maximum))
+        self.in_flight = 0
+        self.best_latency: Dict[str, float] = {}
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+    def set_maximum(self, maximum: int) -> None:
+        with self._cond:
+            self.maximum = max(self.minimum, int(maximum))
+            self.limit = min(self.limit, self.maximum)
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self):
+        """Hold one of the `limit` request slots for the duration of the block."""
+        with self._cond:
+            while self.in_flight >= int(self.limit):
+                self._cond.wait()
+            self.in_flight += 1
+        try:
+            yield
+        finally:
+            with self._cond:
+                self.in_flight -= 1
+                self._cond.notify()
+
+    def record(self, latency: float, throttled: bool = False, failed: bool = False, kind: str = "") -> Optional[str]:
+        """
+        Adjust the limit after a response.
+
+        Args:
+            latency (float): The response time in seconds.
+            throttled (bool): The host answered 429 or 503.
+            failed (bool): The request failed (connection error, 502, 504).
+            kind (str): The kind of request (e.g. the method); latency is compared per kind.
+
+        Returns:
+            str: The reason if the limit was cut ("throttled", "failed" or "latency"), else None.
+        """
+        with self._cond:
+            now = time.monotonic()
+            reason = "throttled" if throttled else "failed" if failed else None
+            if reason is None and latency > 0:
+                best = self.best_latency.get(kind)
+                if best is None or latency < best:
+                    best = latency
+                elif latency > max(best, LATENCY_FLOOR) * LATENCY_FACTOR:
+                    reason = "latency"
+                # Let the baseline drift up slowly, so one lucky fast response does not pin it.
+                self.best_latency[kind] = best * 1.001
+            if reason is None:
+                self.limit = min(self.maximum, self.limit + 1.0 / self.limit)
+                self._cond.notify_all()
+                return None
+            if now - self._last_decrease < DECREASE_COOLDOWN:
+                return None
+            self._last_decrease = now
+            factor = 0.9 if reason == "latency" else 0.5
+            self.limit = max(float(self.minimum), self.limit * factor)
+            return reason
+
+
+def retry_after(response) -> Optional[float]:
+    """
+    The Retry-After delay of a response in seconds, or None.
+    """
+    value = response.headers.get("Retry-After") if response is not None else None
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return min(float(value), RETRY_AFTER_MAX)
+    try:
+        delay = parsedate_to_datetime(value).timestamp() - time.time()
+    except (TypeError, ValueError):
+        return None
+    return min(max(delay, 0.0), RETRY_AFTER_MAX)
+
+
+class HostGovernor:
+    def __init__(self, host: str, rate: float, max_concurrency: int, max_retries: int):
+        """
+        Initialize the HostGovernor.
+
+        Args:
+            host (str): The host name (with port, if any).
+            rate (float): Requests per second; 0 disables rate limiting.
+            max_concurrency (int): The ceiling of the adaptive limit.
+            max_retries (int): Retries per request after the first attempt.
+        """
+        self.host = host
+        self.stage = f"http:{host}"
+        self.bucket = TokenBucket(rate)
+        self.limit = AdaptiveLimit(maximum=max_concurrency)
+        self.max_retries = max_retries
+        self._lock = threading.Lock()
+        self.counters = {"requests": 0, "retries": 0, "throttled": 0, "errors": 0, "cuts": 0}
+        self.latency_total = 0.0
+        metrics.set_workers(self.stage, int(self.limit.limit))
+
+    def _count(self, key: str, amount: int = 1) -> None:
+        with self._lock:
+            self.counters[key] += amount
+
+    def send(self, method: str, send: Callable[[], requests.Response], stream: bool = False) -> requests.Response:
+        """
+        Send a request through the governor, retrying it when that is safe.
+
+        Args:
+            method (str): The HTTP method.
+            send (callable): Sends the request once and returns the response.
+            stream (bool): The body is read after this returns; the request keeps its
+                slot until the response is closed, so the caller must close it.
+
+        Returns:
+            requests.Response: The last response. The last exception is re-raised if no response came.
+        """
+        method = method.upper()
+        attempt = 0
+        while True:
+            self.bucket.acquire()
+            response = None
+            error = None
+            held = ExitStack()
+            held.enter_context(self.limit.slot())
+            held.enter_context(metrics.busy(self.stage))
+            started = time.monotonic()
+            try:
+                response = send()
+            except (requests.ConnectionError, requests.Timeout) as exc:
+                error = exc
+            except BaseException:
+                held.close()
+                raise
+            latency = time.monotonic() - started
+            if stream and response is not None:
+                _release_on_close(response, held)
+            else:
+                held.close()
+
+            status = response.status_code if response is not None else None
+            throttled = status in THROTTLE_STATUSES
+            failed = error is not None or status in FAILURE_STATUSES
+            with self._lock:
+                self.counters["requests"] += 1
+                self.latency_total += latency
+                if throttled:
+                    self.counters["throttled"] += 1
+                if failed:
+                    self.counters["errors"] += 1
+            cut = self.limit.record(latency, throttled, failed, kind=method)
+            if cut:
+                self._count("cuts")
+                events.emit("http_limit", host=self.host, limit=round(self.limit.limit, 2), reason=cut)
+            metrics.set_workers(self.stage, int(self.limit.limit))
+
+            retryable = throttled or (failed and method in IDEMPOTENT_METHODS)
+            if not retryable or attempt >= self.max_retries:
+                if error is not None:
+                    raise error
+                return response
+
+            delay = retry_after(response)
+            if delay is not None:
+                self.bucket.pause(delay)
+            else:
+                delay = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * (2 ** attempt)))
+            attempt += 1
+            self._count("retries")
+            events.emit(
+                "http_retry",
+                host=self.host,
+                method=method,
+                status=status,
+                reason=type(error).__name__ if error is not None else None,
+                attempt=attempt,
+                delay=round(delay, 3),
+            )
+            if response is not None:
+                response.close()
+            time.sleep(delay)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            counters = dict(self.counters)
+            requests_made = counters["requests"]
+            average = self.latency_total / requests_made if requests_made else 0.0
+        counters.update(
+            limit=round(self.limit.limit, 2),
+            in_flight=self.limit.in_flight,
+            rate=self.bucket.rate,
+            latency_ms=round(average * 1000, 1),
+        )
+        return counters
+
+
+def _release_on_close(response: requests.Response, held: ExitStack) -> None:
+    """Keep the request's slot until `response` is closed."""
+    close = response.close
+
+    def close_and_release():
+        try:
+            close()
+        finally:
+            held.close()
+
+    response.close = close_and_release
+
+
+_governors: Dict[str, HostGovernor] = {}
+_lock = threading.Lock()
+_settings = {"rate": DEFAULT_RATE, "max_concurrency": DEFAULT_MAX_CONCURRENCY, "max_retries": DEFAULT_MAX_RETRIES}
+
+
+def configure(rate: Optional[float] = None, max_concurrency: Optional[int] = None, max_retries: Optional[int] = None) -> None:
+    """
+    Change the settings of all governors, current and future. None keeps a setting.
+    """
+    with _lock:
+        if rate is not None:
+            _settings["rate"] = max(0.0, float(rate))
+        if max_concurrency is not None:
+            _settings["max_concurrency"] = max(1, int(max_concurrency))
+        if max_retries is not None:
+            _settings["max_retries"] = max(0, int(max_retries))
+        for governor in _governors.values():
+            governor.bucket.set_rate(_settings["rate"])
+            governor.limit.set_maximum(_settings["max_concurrency"])
+            governor.max_retries = _settings["max_retries"]
+
+
+def for_url(url: str) -> HostGovernor:
+    """
+    The governor of the host of `url`.
+    """
+    host = urlsplit(url).netloc.lower()
+    governor = _governors.get(host)
+    if governor is None:
+        with _lock:
+            governor = _governors.get(host)
+            if governor is None:
+                governor = HostGovernor(host, **_settings)
+                _governors[host] = governor
+    return governor
+
+
+def stats() -> Dict[str, Dict[str, float]]:
+    """The counters of every host, keyed by host."""
+    with _lock:
+        governors = list(_governors.values())
+    return {governor.host: governor.stats() for governor in governors}
+
+
+def summary() -> str:
+    """
+    A text table of the per-host counters, or "" if no request was made.
+    """
+    rows = stats()
+    if not rows:
+        return ""
+    lines = [f"{'host':<40} {'requests':>8} {'retries':>7} {'429/503':>7} {'errors':>6} {'limit':>6} {'avg ms':>8}"]
+    for host, row in sorted(rows.items()):
+        lines.append(
+            f"{host[:40]:<40} {row['requests']:>8} {row['retries']:>7} {row['throttled']:>7} "
+            f"{row['errors']:>6} {row['limit']:>6} {row['latency_ms']:>8}"
+        )
+    return "\n".join(lines)
@@ -0,0 +1,178 @@
+"""Shared HTTP layer.
+
+All WooCommerce and WordPress traffic goes through one `requests.Session`, so
+connections (and their TLS handshakes) are kept alive and reused across
+images, products and worker threads. The connection pool per host is sized
+with `configure_pool()` to match the download/upload concurrency. Requests
+pass through the per-host governor (api/governor.py) for rate limiting,
+adaptive concurrency and retries.
+"""
+from __future__ import annotations
+
+import base64
+import threading
+import time
+from typing import Any, Dict, Optional, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.auth import HTTPBasicAuth
+
+from api import governor
+
+DEFAULT_POOL_SIZE = 10
+DEFAULT_TIMEOUT = 30
+USER_AGENT = "images_py"
+
+_lock = threading.Lock()
+_session: Optional[requests.Session] = None
+_pool_size = DEFAULT_POOL_SIZE
+_clients: Dict[Tuple[str, str, str], "WooCommerceClient"] = {}
+
+
+def _mount(session: requests.Session, pool_size: int) -> None:
+    for prefix in ("https://", "http://"):
+        session.mount(prefix, HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+
+
+def get_session() -> requests.Session:
+    """
+    The process-wide session. Safe to use from several threads at once.
+    """
+    global _session
+    if _session is None:
+        with _lock:
+            if _session is None:
+                session = requests.Session()
+                session.headers["User-Agent"] = USER_AGENT
+                _mount(session, _pool_size)
+                _session = session
+    return _session
+
+
+def configure_pool(size: int) -> None:
+    """
+    Make sure the per-host connection pool can hold `size` connections.
+
+    Only grows the pool: running threads keep their connections.
+
+    Args:
+        size (int): The number of requests that may be in flight per host.
+    """
+    global _pool_size
+    size = max(1, int(size))
+    with _lock:
+        if size <= _pool_size:
+            return
+        _pool_size = size
+        if _session is not None:
+            _mount(_session, size)
+
+
+def request(method: str, url: str, **kwargs: Any) -> requests.Response:
+    """
+    Send a request over the shared session, with a default timeout, through the host's governor.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    session = get_session()
+    return governor.for_url(url).send(
+        method, lambda: session.request(method, url, **kwargs), stream=kwargs.get("stream", False)
+    )
+
+
+def basic_auth_header(username: str, password: str) -> str:
+    """
+    The Authorization header value for WordPress application passwords.
+    """
+    token = base64.b64encode(f"{username}:{password}".encode()).decode()
+    return f"basic {token}"
+
+
+class WooCommerceClient:
+    """
+    Minimal WooCommerce REST client on the shared session.
+
+    Has the same get/post/put/delete interface as `woocommerce.API`.
+    """
+
+    def __init__(self, url, consumer_key, consumer_secret, version="wc/v3", timeout=DEFAULT_TIMEOUT, verify_ssl=True):
+        self.url = url if url.endswith("/") else f"{url}/"
+        self.consumer_key = consumer_key
+        self.consumer_secret = consumer_secret
+        self.version = version
+        self.timeout = timeout
+        self.verify_ssl = verify_ssl
+        self.is_ssl = url.startswith("https")
+        self._auth = HTTPBasicAuth(consumer_key, consumer_secret) if self.is_ssl else None
+
+    def _url(self, endpoint: str) -> str:
+        return f"{self.url}wp-json/{self.version}/{endpoint}"
+
+    def _oauth_url(self, url: str, method: str, params: Dict[str, Any]) -> str:
+        # Plain http stores only accept OAuth 1.0a signed query strings.
+        from urllib.parse import urlencode
+
+        from woocommerce.oauth import OAuth
+
+        if params:
+            url = f"{url}?{urlencode(params)}"
+        return OAuth(
+            url=url,
+            consumer_key=self.consumer_key,
+            consumer_secret=self.consumer_secret,
+            version=self.version,
+            method=method,
+            oauth_timestamp=int(time.time()),
+        ).get_oauth_url()
+
+    def request(self, method: str, endpoint: str, data=None, params=None, **kwargs) -> requests.Response:
+        url = self._url(endpoint)
+        params = dict(params or {})
+        kwargs.setdefault("timeout", self.timeout)
+        session = get_session()
+
+        def send():
+            # Signed per attempt: a retry must not reuse the OAuth nonce.
+            target, query = (url, params) if self.is_ssl else (self._oauth_url(url, method, params), {})
+            return session.request(
+                method,
+                target,
+                params=query,
+                json=data,
+                auth=self._auth,
+                verify=self.verify_ssl,
+                headers={"Accept": "application/json"},
+                **kwargs,
+            )
+
+        return governor.for_url(url).send(method, send, stream=kwargs.get("stream", False))
+
+    def get(self, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("GET", endpoint, **kwargs)
+
+    def post(self, endpoint: str, data, **kwargs) -> requests.Response:
+        return self.request("POST", endpoint, data=data, **kwargs)
+
+    def put(self, endpoint: str, data, **kwargs) -> requests.Response:
+        return self.request("PUT", endpoint, data=data, **kwargs)
+
+    def delete(self, endpoint: str, **kwargs) -> requests.Response:
+        return self.request("DELETE", endpoint, **kwargs)
+
+
+def get_client(credentials: Dict[str, Any]) -> WooCommerceClient:
+    """
+    The cached client for a credential set. A new one is made when the credentials change.
+
+    Args:
+        credentials (dict): Holds url, consumer_key and consumer_secret.
+    """
+    key = (credentials["url"], credentials["consumer_key"], credentials["consumer_secret"])
+    client = _clients.get(key)
+    if client is None:
+        with _lock:
+            client = _clients.get(key)
+            if client is None:
+                client = WooCommerceClient(*key)
+                _clients[key] = client
+    return client
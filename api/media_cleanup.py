@@ -0,0 +1,266 @@
+"""Persistent queue of old media to delete.
+
+Replaced images are not deleted while a product is being updated. Their IDs
+go into a SQLite queue under the per-user data directory and a background
+worker deletes them with bounded concurrency. Failed deletions are retried
+with exponential backoff. The queue survives restarts, so IDs enqueued by a
+run that was interrupted are deleted by a later run or by `python -m cli
+cleanup`.
+
+Modes (the "media_cleanup" option):
+    background  delete while the run goes on (default)
+    end_of_run  delete once the run is done
+    deferred    only enqueue; the cleanup command deletes them
+"""
+from __future__ import annotations
+
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from utils import events
+
+MODES = ("background", "end_of_run", "deferred")
+DEFAULT_MODE = "background"
+DEFAULT_CONCURRENCY = 2
+MAX_ATTEMPTS = 8
+RETRY_BASE = 5.0
+RETRY_MAX = 15 * 60.0
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS media (
+    store TEXT NOT NULL,
+    media_id INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt REAL NOT NULL,
+    last_error TEXT,
+    added_at REAL NOT NULL,
+    PRIMARY KEY (store, media_id)
+)
+"""
+
+
+class MediaCleanupQueue:
+    def __init__(self, path):
+        """
+        Initialize the MediaCleanupQueue.
+
+        Args:
+            path (str | Path): The SQLite database file.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._db:
+            self._db.execute(_SCHEMA)
+
+    def add(self, store: str, media_ids: Iterable[int]) -> None:
+        now = time.time()
+        rows = [(store, int(media_id), now, now) for media_id in media_ids]
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR IGNORE INTO media (store, media_id, next_attempt, added_at) VALUES (?, ?, ?, ?)", rows
+            )
+
+    def due(self, store: str, limit: int, exclude: Iterable[int] = ()) -> List[Tuple[int, int]]:
+        """
+        IDs whose next attempt is due, as (media_id, attempts), oldest first.
+        """
+        skip = set(exclude)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT media_id, attempts FROM media WHERE store = ? AND next_attempt <= ? AND attempts < ? "
+                "ORDER BY next_attempt LIMIT ?",
+                (store, time.time(), MAX_ATTEMPTS, limit + len(skip)),
+            ).fetchall()
+        return [row for row in rows if row[0] not in skip][:limit]
+
+    def next_due(self, store: str) -> Optional[float]:
+        """The time of the next retry, or None if nothing is waiting."""
+        with self._lock:
+            return self._db.execute(
+                "SELECT MIN(next_attempt) FROM media WHERE store = ? AND attempts < ?", (store, MAX_ATTEMPTS)
+            ).fetchone()[0]
+
+    def done(self, store: str, media_id: int) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM media WHERE store = ? AND media_id = ?", (store, media_id))
+
+    def retry(self, store: str, media_id: int, attempts: int, error: str) -> None:
+        delay = min(RETRY_BASE * (2 ** attempts), RETRY_MAX)
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE media SET attempts = ?, next_attempt = ?, last_error = ? WHERE store = ? AND media_id = ?",
+                (attempts + 1, time.time() + delay, error[:500], store, media_id),
+            )
+
+    def reset_failed(self, store: str) -> int:
+        """Give the IDs that ran out of attempts a new round. Returns their number."""
+        with self._lock, self._db:
+            return self._db.execute(
+                "UPDATE media SET attempts = 0, next_attempt = ? WHERE store = ? AND attempts >= ?",
+                (time.time(), store, MAX_ATTEMPTS),
+            ).rowcount
+
+    def counts(self, store: str) -> Tuple[int, int]:
+        """
+        Returns:
+            tuple: (pending, failed) for the store.
+        """
+        with self._lock:
+            pending, failed = self._db.execute(
+                "SELECT COALESCE(SUM(attempts < ?), 0), COALESCE(SUM(attempts >= ?), 0) FROM media WHERE store = ?",
+                (MAX_ATTEMPTS, MAX_ATTEMPTS, store),
+            ).fetchone()
+        return pending, failed
+
+
+class MediaCleaner:
+    """
+    Deletes the queued media of one store, in the background or on demand.
+    """
+
+    def __init__(
+        self,
+        queue: MediaCleanupQueue,
+        store: str,
+        delete: Callable[[int], bool],
+        concurrency: int = DEFAULT_CONCURRENCY,
+        mode: str = DEFAULT_MODE,
+    ):
+        """
+        Initialize the MediaCleaner.
+
+        Args:
+            queue (MediaCleanupQueue): The persistent queue.
+            store (str): The store URL.
+            delete (callable): Deletes one media ID; returns True on success.
+            concurrency (int): Deletions in flight at the same time.
+            mode (str): One of MODES.
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown media cleanup mode: {mode!r}")
+        self.queue = queue
+        self.store = store.rstrip("/")
+        self.delete = delete
+        self.concurrency = max(1, int(concurrency))
+        self.mode = mode
+        self.deleted = 0
+        self._wake = threading.Event()
+        self._closing = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+
+    def start(self) -> "MediaCleaner":
+        """Start the background worker (background mode only). It also picks up earlier leftovers."""
+        if self.mode == "background" and self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="media-cleanup", daemon=True)
+            self._thread.start()
+        return self
+
+    def add(self, media_ids: Iterable[int]) -> None:
+        """Queue media for deletion. The IDs are on disk when this returns."""
+        media_ids = list(media_ids)
+        if not media_ids:
+            return
+        self.queue.add(self.store, media_ids)
+        events.emit("cleanup_enqueue", count=len(media_ids))
+        self._wake.set()
+
+    def close(self) -> Tuple[int, int]:
+        """
+        Finish up at the end of a run: drain the due deletions (background and
+        end_of_run modes) and stop the worker. IDs waiting for a retry stay queued.
+
+        Returns:
+            tuple: (pending, failed) left in the queue.
+        """
+        if self._thread is not None:
+            self._closing.set()
+            self._wake.set()
+            self._thread.join()
+            self._thread = None
+        elif self.mode == "end_of_run":
+            self.run_pending()
+        if self._pool is not None:
+            self._pool.shutdown(wait=True)
+            self._pool = None
+        return self.queue.counts(self.store)
+
+    def run_pending(self) -> int:
+        """
+        Delete everything that is due now, blocking until done.
+
+        Returns:
+            int: The number of media deleted.
+        """
+        before = self.deleted
+        while True:
+            batch = self.queue.due(self.store, self.concurrency * 4)
+            if not batch:
+                return self.deleted - before
+            self._process(batch)
+
+    def _run(self) -> None:
+        while True:
+            batch = self.queue.due(self.store, self.concurrency * 4)
+            if batch:
+                self._process(batch)
+                continue
+            if self._closing.is_set():
+                return
+            next_due = self.queue.next_due(self.store)
+            timeout = 5.0 if next_due is None else min(5.0, max(0.1, next_due - time.time()))
+            self._wake.wait(timeout)
+            self._wake.clear()
+
+    def _process(self, batch: List[Tuple[int, int]]) -> None:
+        if self._pool is None:
+            self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="media-cleanup")
+        futures: Dict[int, Tuple[int, object]] = {
+            media_id: (attempts, events.submit(self._pool, self.delete, media_id)) for media_id, attempts in batch
+        }
+        for media_id, (attempts, future) in futures.items():
+            try:
+                ok = future.result()
+                error = "Delete failed"
+            except Exception as exc:
+                ok = False
+                error = f"{type(exc).__name__}: {exc}"
+            if ok:
+                self.queue.done(self.store, media_id)
+                self.deleted += 1
+            else:
+                self.queue.retry(self.store, media_id, attempts, error)
+
+
+_queue: Optional[MediaCleanupQueue] = None
+_queue_lock = threading.Lock()
+
+
+def _default_path() -> Path:
+    setting = os.environ.get("IMAGE_PROCESSOR_CLEANUP_QUEUE")
+    if setting:
+        return Path(setting)
+
+    import platformdirs
+
+    from config.encrypt_config import APP_AUTHOR, APP_NAME
+
+    return Path(platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)) / "media_cleanup.sqlite"
+
+
+def get_queue() -> MediaCleanupQueue:
+    """
+    The process-wide cleanup queue.
+    """
+    global _queue
+    with _queue_lock:
+        if _queue is None:
+            _queue = MediaCleanupQueue(_default_path())
+        return _queue
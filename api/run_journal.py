@@ -0,0 +1,284 @@
+"""Persistent journal of all-products runs.
+
+Each run gets a row with its store and options hash. Every product it takes
+on is tracked with a status:
+
+    started    handed to the pipeline
+    uploaded   all new media uploaded, product not yet updated
+    updating   update sent (or queued for a batch), outcome not known yet
+    done       product updated
+    failed     the update was definitely not applied: the store rejected it,
+               or the product was fetched and does not have the new media
+
+Each new media ID is recorded as soon as its upload returns. Without the
+catalog mirror the planned work list is stored too. A run that did not finish
+(crash, reboot, cancel) can then be resumed: the same plan continues, and
+products that got media uploaded are reconciled instead of being uploaded
+again. Deletions of replaced media are tracked by the cleanup queue
+(api/media_cleanup.py), not here.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+STARTED = "started"
+UPLOADED = "uploaded"
+UPDATING = "updating"
+DONE = "done"
+FAILED = "failed"
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id TEXT PRIMARY KEY,
+    store TEXT NOT NULL,
+    hash_string TEXT NOT NULL,
+    status TEXT NOT NULL,
+    planned INTEGER,
+    started_at REAL NOT NULL,
+    finished_at REAL
+);
+CREATE TABLE IF NOT EXISTS run_products (
+    run_id TEXT NOT NULL,
+    product_id INTEGER NOT NULL,
+    status TEXT NOT NULL,
+    uploaded TEXT NOT NULL DEFAULT '{}',
+    error TEXT,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (run_id, product_id)
+);
+CREATE TABLE IF NOT EXISTS run_plan (
+    run_id TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    product TEXT NOT NULL,
+    PRIMARY KEY (run_id, position)
+);
+"""
+
+
+class RunJournal:
+    def __init__(self, path):
+        """
+        Initialize the RunJournal.
+
+        Args:
+            path (str | Path): The SQLite database file.
+        """
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(str(self.path), check_same_thread=False)
+        with self._db:
+            self._db.executescript(_SCHEMA)
+
+    # -- runs -------------------------------------------------------------
+
+    def start(self, store: str, hash_string: str) -> str:
+        """Open a new run; returns its ID."""
+        run_id = uuid.uuid4().hex[:12]
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO runs (run_id, store, hash_string, status, started_at) VALUES (?, ?, ?, 'running', ?)",
+                (run_id, store, hash_string, time.time()),
+            )
+        return run_id
+
+    def unfinished(self, store: str, hash_string: str) -> Optional[str]:
+        """The latest run for this store and options that did not finish, or None."""
+        with self._lock:
+            row = self._db.execute(
+                "SELECT run_id FROM runs WHERE store = ? AND hash_string = ? AND status = 'running' "
+                "ORDER BY started_at DESC LIMIT 1",
+                (store, hash_string),
+            ).fetchone()
+        return row[0] if row else None
+
+    def finish(self, run_id: str) -> None:
+        """Mark a run complete and drop its per-product rows and plan."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE runs SET status = 'complete', finished_at = ? WHERE run_id = ?", (time.time(), run_id)
+            )
+            self._db.execute("DELETE FROM run_products WHERE run_id = ?", (run_id,))
+            self._db.execute("DELETE FROM run_plan WHERE run_id = ?", (run_id,))
+
+    def abandon(self, store: str, keep: Optional[str] = None) -> List[int]:
+        """
+        Close the unfinished runs of a store other than `keep` (e.g. after the options changed).
+
+        Returns:
+            list: Their uploaded media that never got attached to a product.
+        """
+        with self._lock:
+            run_ids = [
+                row[0]
+                for row in self._db.execute(
+                    "SELECT run_id FROM runs WHERE store = ? AND status = 'running' AND run_id IS NOT ?", (store, keep)
+                )
+            ]
+        orphans = []
+        for run_id in run_ids:
+            orphans.extend(self.orphaned_media(run_id))
+            with self._lock, self._db:
+                self._db.execute(
+                    "UPDATE runs SET status = 'abandoned', finished_at = ? WHERE run_id = ?", (time.time(), run_id)
+                )
+                self._db.execute("DELETE FROM run_products WHERE run_id = ?", (run_id,))
+                self._db.execute("DELETE FROM run_plan WHERE run_id = ?", (run_id,))
+        return orphans
+
+    def orphaned_media(self, run_id: str) -> List[int]:
+        """
+        New media of products whose update was never sent or definitely failed, so nothing
+        refers to it. Products in "updating" are left out: their update may have landed
+        (e.g. a batch that timed out after the store applied it) until the product is checked.
+        """
+        return [
+            new_id
+            for state in self.products(run_id).values()
+            if state["status"] in (STARTED, UPLOADED, FAILED)
+            for new_id in state["uploaded"].values()
+        ]
+
+    # -- plan -------------------------------------------------------------
+
+    def save_plan(self, run_id: str, products: List[Dict[str, Any]]) -> None:
+        with self._lock, self._db:
+            self._db.execute("DELETE FROM run_plan WHERE run_id = ?", (run_id,))
+            self._db.executemany(
+                "INSERT INTO run_plan VALUES (?, ?, ?)",
+                [(run_id, position, json.dumps(product)) for position, product in enumerate(products)],
+            )
+            self._db.execute("UPDATE runs SET planned = ? WHERE run_id = ?", (len(products), run_id))
+
+    def planned(self, run_id: str) -> Optional[int]:
+        """The length of the stored work list, or None if the run has none."""
+        with self._lock:
+            row = self._db.execute("SELECT planned FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        return row[0] if row else None
+
+    def plan(self, run_id: str, chunk_size: int = 500) -> Iterator[Dict[str, Any]]:
+        """The stored work list, in order."""
+        position = -1
+        while True:
+            with self._lock:
+                rows = self._db.execute(
+                    "SELECT position, product FROM run_plan WHERE run_id = ? AND position > ? ORDER BY position LIMIT ?",
+                    (run_id, position, chunk_size),
+                ).fetchall()
+            if not rows:
+                return
+            for _, product in rows:
+                yield json.loads(product)
+            position = rows[-1][0]
+
+    # -- products ---------------------------------------------------------
+
+    def set_status(self, run_id: str, product_id: int, status: str, error: Optional[str] = None) -> None:
+        with self._lock, self._db:
+            self._db.execute(
+                "INSERT INTO run_products (run_id, product_id, status, error, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, product_id) DO UPDATE SET status = excluded.status, "
+                "error = excluded.error, updated_at = excluded.updated_at",
+                (run_id, product_id, status, error, time.time()),
+            )
+
+    def record_upload(self, run_id: str, product_id: int, old_id: int, new_id: int) -> None:
+        """Remember one uploaded image, before anything else can go wrong."""
+        with self._lock, self._db:
+            row = self._db.execute(
+                "SELECT uploaded FROM run_products WHERE run_id = ? AND product_id = ?", (run_id, product_id)
+            ).fetchone()
+            uploaded = json.loads(row[0]) if row else {}
+            uploaded[str(old_id)] = new_id
+            self._db.execute(
+                "INSERT INTO run_products (run_id, product_id, status, uploaded, updated_at) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (run_id, product_id) DO UPDATE SET uploaded = excluded.uploaded, "
+                "updated_at = excluded.updated_at",
+                (run_id, product_id, STARTED, json.dumps(uploaded), time.time()),
+            )
+
+    def set_uploads(self, run_id: str, product_id: int, uploaded: Dict[int, int]) -> None:
+        """Replace the recorded uploads of a product (e.g. after dropping stale ones)."""
+        with self._lock, self._db:
+            self._db.execute(
+                "UPDATE run_products SET uploaded = ?, updated_at = ? WHERE run_id = ? AND product_id = ?",
+                (json.dumps({str(old): new for old, new in uploaded.items()}), time.time(), run_id, product_id),
+            )
+
+    def products(self, run_id: str) -> Dict[int, Dict[str, Any]]:
+        """
+        Returns:
+            dict: product ID -> {"status", "uploaded" ({old ID: new ID}), "error"}.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT product_id, status, uploaded, error FROM run_products WHERE run_id = ?", (run_id,)
+            ).fetchall()
+        return {
+            product_id: {
+                "status": status,
+                "uploaded": {int(old): new for old, new in json.loads(uploaded or "{}").items()},
+                "error": error,
+            }
+            for product_id, status, uploaded, error in rows
+        }
+
+
+class RunSession:
+    """One run's handle on the journal, passed along in the options as "run_journal"."""
+
+    def __init__(self, journal: RunJournal, run_id: str, resumed: bool = False):
+        self.journal = journal
+        self.run_id = run_id
+        self.resumed = resumed
+
+    def status(self, product_id, status: str, error: Optional[str] = None) -> None:
+        self.journal.set_status(self.run_id, product_id, status, error)
+
+    def uploaded(self, product_id, old_id, new_id) -> None:
+        self.journal.record_upload(self.run_id, product_id, old_id, new_id)
+
+    def set_uploads(self, product_id, uploaded) -> None:
+        self.journal.set_uploads(self.run_id, product_id, uploaded)
+
+    def finish(self) -> None:
+        self.journal.finish(self.run_id)
+
+
+_journal: Optional[RunJournal] = None
+_journal_lock = threading.Lock()
+
+
+def _default_path() -> Path:
+    setting = os.environ.get("IMAGE_PROCESSOR_RUN_JOURNAL")
+    if setting:
+        return Path(setting)
+
+    import platformdirs
+
+    from config.encrypt_config import APP_AUTHOR, APP_NAME
+
+    return Path(platformdirs.user_data_dir(APP_NAME, APP_AUTHOR)) / "runs.sqlite"
+
+
+def get_journal() -> Optional[RunJournal]:
+    """
+    The process-wide run journal, or None if it is disabled or cannot be opened.
+    """
+    global _journal
+    if os.environ.get("IMAGE_PROCESSOR_RUN_JOURNAL", "").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    with _journal_lock:
+        if _journal is None:
+            try:
+                _journal = RunJournal(_default_path())
+            except (OSError, sqlite3.Error):
+                return None
+        return _journal
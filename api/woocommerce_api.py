@@ -1,13 +1,24 @@
-import json
+import functools
+import itertools
+import logging
 import os
-import base64
+import shutil
+import sqlite3
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
 import requests
-from tkinter import messagebox
-from woocommerce import API
-from utils.image_processing import ImageProcessor
+from api import catalog as product_catalog
+from api import governor, http_client, media_cleanup, run_journal
 from config.encrypt_config import ConfigEncryptor
 from utils.file_operations import FileProcessor
+from utils.image_processing import EncodedImage
+from utils import download_cache, events
+from utils.metrics import metrics
+from utils.cancellation import checkpoint
+from utils.notifications import notify
+from utils.pipeline import Pipeline, Stage
 import hashlib
 import pprint
 
@@ -48,30 +59,36 @@ def load_credentials():
 
 def get_wcapi():
     """
-    Get a WooCommerce API client instance using the active credentials.
+    Get the WooCommerce API client for the active credentials.
+
+    The client is cached per credential set and shares the pooled HTTP session.
 
     Returns:
-        woocommerce.API: The WooCommerce API client instance, or None if credentials are missing.
+        WooCommerceClient: The WooCommerce API client instance, or None if credentials are missing.
     """
     active_credentials = load_credentials()
 
     if not active_credentials:
-        messagebox.showerror(
+        notify(
+            "error",
             "Missing credentials",
             "No active credentials found. Please configure them in Settings first.",
         )
         return None
 
-    pprint.pprint(active_credentials)
+    return http_client.get_client(active_credentials)
+
 
-    return API(
-        url=active_credentials["url"],
-        consumer_key=active_credentials["consumer_key"],
-        consumer_secret=active_credentials["consumer_secret"],
-        version="wc/v3",
-        timeout=30,
-    )
 
+def configure_http(options):
+    """
+    Apply the HTTP governor options (rate limit, concurrency ceiling, retries) of a job.
+    """
+    governor.configure(
+        rate=options.get("http_rate_limit"),
+        max_concurrency=options.get("http_max_concurrency"),
+        max_retries=options.get("http_max_retries"),
+    )
 
 
 def get_product(product_id):
@@ -87,38 +104,179 @@ def get_product(product_id):
     wcapi = get_wcapi()
     if not wcapi:
         return None
-    result = wcapi.get(f"products/{product_id}")
+    result = wcapi.get(f"products/{product_id}", params={"_fields": PRODUCT_FIELDS})
 
     
     product = result.json()
     
     return product
 
-def get_images(product, limit = 0):
+DOWNLOAD_CONCURRENCY = 4
+UPLOAD_CONCURRENCY = 4
+DOWNLOAD_CHUNK_SIZE = 256 * 1024
+USE_DEFAULT_CACHE = object()
+
+PIPELINE_DOWNLOAD_WORKERS = 2
+PIPELINE_PROCESS_WORKERS = 1
+PIPELINE_UPLOAD_WORKERS = 2
+PIPELINE_QUEUE_SIZE = 2
+
+LIST_CONCURRENCY = 4
+# Only what the pipeline and the UI use; full product payloads are large.
+PRODUCT_FIELDS = "id,name,sku,slug,images,meta_data"
+UPDATE_BATCH_SIZE = 100
+UPDATE_BATCH_TIMEOUT = 120
+# Searches refresh the catalog mirror when it is older than this (seconds).
+CATALOG_MAX_AGE = 5 * 60
+
+def download_image(image, product_id, index, total, chunk_size=DOWNLOAD_CHUNK_SIZE, cache=None, pin=False):
+    """
+    Download a single gallery image.
+
+    The body is streamed to a ".part" file in `chunk_size` pieces, checked
+    against Content-Length and then renamed into place, so memory stays flat
+    and a failed download never leaves a truncated image behind.
+
+    With a cache, a cached copy is revalidated with a conditional GET and
+    reused on 304; new downloads are stored in the cache instead of the
+    temp folder.
+
+    Args:
+        image (dict): The WooCommerce image data, with "id" and "src".
+        product_id (int): The product ID, for the event log.
+        index (int): The position in the gallery, for the log.
+        total (int): The number of images being downloaded.
+        chunk_size (int): The read/write buffer size in bytes.
+        cache (DownloadCache, optional): The source image cache.
+        pin (bool): Pin the cached file until the caller unpins it, so it is not evicted before use.
+
+    Returns:
+        str: The downloaded file path, or None if the download failed.
+    """
+    image_url = image.get("src")
+    image_id = image.get("id")
+    file_name = image_url.split("/")[-1]
+    entry = cache.lookup(image_id, image_url, pin=pin) if cache else None
+    hit = False
+    try:
+        file_path, hit = _download_image(
+            image_url, image_id, file_name, product_id, index, total, chunk_size, cache, entry, pin
+        )
+        return file_path
+    finally:
+        # The lookup's pin goes to the caller only on a hit; a new download pins the new entry.
+        if pin and entry is not None and not hit:
+            cache.unpin(entry.path)
+
+
+def _download_image(image_url, image_id, file_name, product_id, index, total, chunk_size, cache, entry, pin):
+    with metrics.busy("download"), events.span(
+        "download", image_id=image_id, product_id=product_id, url=image_url
+    ) as download_event:
+        headers = entry.validators() if entry else {}
+        with http_client.request("GET", image_url, headers=headers, timeout=10, stream=True) as response:
+            download_event["status"] = response.status_code
+            if response.status_code == 304 and entry:
+                cache.touch(entry)
+                download_event["cache"] = "hit"
+                download_event["path"] = entry.path
+                print(f"Image {index + 1}/{total} unchanged, using cached copy: {entry.path}")
+                return entry.path, True
+            if response.status_code != 200:
+                download_event["error"] = f"HTTP {response.status_code}"
+                print(f"Failed to download image {index + 1}/{total}: HTTP {response.status_code}")
+                return None, False
+
+            if cache:
+                part_path = cache.temp_path(file_name)
+            else:
+                # A folder per download: products in flight may share image basenames,
+                # and the basename is kept for the {name} of the output template.
+                part_path = os.path.join(
+                    tempfile.mkdtemp(prefix=f"{product_id}-{image_id}-", dir="temp"), f"{file_name}.part"
+                )
+            try:
+                written = 0
+                with open(part_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=chunk_size):
+                        file.write(chunk)
+                        written += len(chunk)
+                expected = response.headers.get("Content-Length")
+                received = response.raw.tell()
+                if expected is not None and expected.isdigit() and int(expected) != received:
+                    download_event["error"] = f"Incomplete download: {received} of {expected} bytes"
+                    print(f"Failed to download image {index + 1}/{total}: {download_event['error']}")
+                    remove_download(part_path)
+                    return None, False
+                if cache:
+                    file_path = cache.store(
+                        image_id,
+                        image_url,
+                        part_path,
+                        file_name,
+                        etag=response.headers.get("ETag"),
+                        last_modified=response.headers.get("Last-Modified"),
+                        pin=pin,
+                    )
+                    download_event["cache"] = "stale" if entry else "miss"
+                else:
+                    file_path = os.path.join(os.path.dirname(part_path), file_name)
+                    os.replace(part_path, file_path)
+            except BaseException:
+                remove_download(part_path)
+                raise
+        download_event["bytes"] = written
+        download_event["path"] = file_path
+        print(f"Image {index + 1}/{total} downloaded and saved: {file_path}")
+        return file_path, False
+
+
+def get_images(
+    product, limit=0, concurrency=DOWNLOAD_CONCURRENCY, chunk_size=DOWNLOAD_CHUNK_SIZE, cache=USE_DEFAULT_CACHE, pin=False
+):
+    """
+    Download the gallery images of a product, several at a time.
+
+    Args:
+        product (dict): The WooCommerce product data.
+        limit (int): Only download the first `limit` images (0 for all).
+        concurrency (int): The number of parallel downloads for this product.
+        chunk_size (int): The streaming buffer size per download, in bytes.
+        cache (DownloadCache, optional): The source image cache; None downloads into temp/ only.
+        pin (bool): Pin the cached files until they are unpinned (see release_sources).
+
+    Returns:
+        dict: Mapping of image IDs to downloaded file paths, in gallery order.
+            Failed downloads are left out.
+    """
     image_paths = {}
     if product.get("images"):
         images = product.get("images")
-
-        if not os.path.exists("temp"):
-            os.makedirs("temp")
-
-        for index, image in enumerate(images):
-            image_url = image.get("src")
-            image_id = image.get("id")
-            response = requests.get(image_url, timeout=10)
-            if response.status_code == 200:
-                file_name = image_url.split("/")[-1]
-                file_path = os.path.join("temp", file_name)
-                image_paths[image_id] = file_path
-                with open(file_path, "wb") as file:
-                    file.write(response.content)
-                print(
-                    f"Image {index + 1}/{len(images)} downloaded and saved: {file_path}"
+        if limit:
+            images = images[:limit]
+
+        if cache is USE_DEFAULT_CACHE:
+            cache = download_cache.get_cache()
+        if not cache and not os.path.exists("temp"):
+            os.makedirs("temp", exist_ok=True)
+
+        workers = max(1, min(int(concurrency or 1), len(images)))
+        http_client.configure_pool(workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="download") as pool:
+            futures = [
+                events.submit(
+                    pool, download_image, image, product.get("id"), index, len(images), chunk_size, cache, pin
                 )
-                if limit and limit >= index +1:
-                    break
-            else:
-                print(f"Failed to download image {index + 1}/{len(images)}")
+                for index, image in enumerate(images)
+            ]
+            for image, future in zip(images, futures):
+                try:
+                    file_path = future.result()
+                except requests.exceptions.RequestException as e:
+                    print(f"Failed to download image {image.get('src')}: {e}")
+                    continue
+                if file_path:
+                    image_paths[image.get("id")] = file_path
 
         return image_paths
     
@@ -135,48 +293,88 @@ def upload_image(img_path):
     Upload an image to WordPress.
 
     Args:
-        img_path (str): The path to the image file.
+        img_path (str | EncodedImage): The path to the image file, or an image encoded in memory.
 
     Returns:
         int: The ID of the uploaded image, or False if the upload failed.
     """
-    with open(img_path, "rb") as img_file:
-        data = img_file.read()
+    if isinstance(img_path, EncodedImage):
+        data = img_path.data
+        img_path = img_path.path
+    else:
+        with open(img_path, "rb") as img_file:
+            data = img_file.read()
     file_name = os.path.basename(img_path)
     file_name = file_name.replace("–", "-")
 
     credentials = load_credentials()
     if not credentials:
-        messagebox.showerror(
-            "Error", "No WordPress credentials found. Please set them in the settings."
+        notify(
+            "error", "Error", "No WordPress credentials found. Please set them in the settings."
         )
         return None
 
-    username = credentials["username"]
-    password = credentials["password"]
-    credentials_base64 = base64.b64encode(f"{username}:{password}".encode())
     url = f"{credentials['url']}/wp-json/wp/v2/media"
     headers = {
         "Content-Type": "image/jpg",
         "Content-Disposition": f"attachment; filename={file_name}",
-        "Authorization": f"basic {credentials_base64.decode()}",
+        "Authorization": http_client.basic_auth_header(credentials["username"], credentials["password"]),
     }
     print(f"Uploading image {img_path}")
-    try:
-        res = requests.post(url=url, data=data, headers=headers, timeout=10)
-        res.raise_for_status()
-        response_dict = res.json()
-        new_id = response_dict.get("id")
-        link = (
-            response_dict.get("guid").get("rendered")
-            if response_dict.get("guid")
-            else None
-        )
-        print(new_id, link)
-        return new_id if new_id else False
-    except requests.exceptions.RequestException as e:
-        print(f"Error uploading image: {e}")
-        return False
+    with metrics.busy("upload"), events.span("upload", path=img_path, bytes=len(data)) as upload_event:
+        try:
+            res = http_client.request("POST", url, data=data, headers=headers, timeout=10)
+            upload_event["status"] = res.status_code
+            res.raise_for_status()
+            response_dict = res.json()
+            new_id = response_dict.get("id")
+            link = (
+                response_dict.get("guid").get("rendered")
+                if response_dict.get("guid")
+                else None
+            )
+            upload_event["image_id"] = new_id
+            print(new_id, link)
+            return new_id if new_id else False
+        except requests.exceptions.RequestException as e:
+            upload_event["error"] = str(e)
+            print(f"Error uploading image: {e}")
+            return False
+
+
+def upload_images(output_paths, concurrency=UPLOAD_CONCURRENCY, on_uploaded=None):
+    """
+    Upload processed images, several at a time.
+
+    Args:
+        output_paths (dict): Mapping of old image IDs to processed file paths.
+        concurrency (int): The number of parallel uploads.
+        on_uploaded (callable, optional): Called as on_uploaded(old_id, new_id) after each upload.
+
+    Returns:
+        dict: Mapping of old image IDs to new media IDs. Failed uploads are left out.
+    """
+    if not output_paths:
+        return {}
+    workers = max(1, min(int(concurrency or 1), len(output_paths)))
+    http_client.configure_pool(workers)
+    uploaded = {}
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="upload") as pool:
+        futures = {
+            image_id: events.submit(pool, upload_image, output_path)
+            for image_id, output_path in output_paths.items()
+        }
+        for image_id, future in futures.items():
+            try:
+                new_id = future.result()
+            except OSError as e:
+                print(f"Error uploading image {output_paths[image_id]}: {e}")
+                continue
+            if new_id:
+                uploaded[image_id] = new_id
+                if on_uploaded is not None:
+                    on_uploaded(image_id, new_id)
+    return uploaded
 
 
 def delete_img(image_id):
@@ -185,58 +383,137 @@ def delete_img(image_id):
 
     Args:
         image_id (int): The ID of the image to delete.
+
+    Returns:
+        bool: True if the image is gone (deleted now or already missing).
     """
   
     credentials = load_credentials()
     if not credentials:
-        messagebox.showerror(
-            "Error", "No WordPress credentials found. Please set them in the settings."
+        notify(
+            "error", "Error", "No WordPress credentials found. Please set them in the settings."
         )
-        return None
+        return False
 
     url = f"{credentials['url']}/wp-json/wp/v2/media/{image_id}"
-    username = credentials["username"]
-    password = credentials["password"]
-    credentials_base64 = base64.b64encode(f"{username}:{password}".encode())
-
-    res = requests.delete(
-        url=url,
-        headers={"Authorization": f"basic {credentials_base64.decode()}"},
-        params={"force": "true"},
-        timeout=10,
-    )
 
-    if res.status_code == 200:
-        print(f"Image with ID {image_id} deleted successfully.")
-    else:
+    with events.span("delete", image_id=image_id) as delete_event:
+        try:
+            res = http_client.request(
+                "DELETE",
+                url,
+                headers={"Authorization": http_client.basic_auth_header(credentials["username"], credentials["password"])},
+                params={"force": "true"},
+                timeout=10,
+            )
+        except requests.RequestException as exc:
+            delete_event["error"] = f"{type(exc).__name__}: {exc}"
+            print(f"Failed to delete image with ID {image_id}. Error: {exc}")
+            return False
+        delete_event["status"] = res.status_code
+
+        if res.status_code == 200:
+            print(f"Image with ID {image_id} deleted successfully.")
+            return True
+        if res.status_code in (404, 410):
+            return True
+        delete_event["error"] = res.text[:500]
         print(f"Failed to delete image with ID {image_id}. Error: {res.text}")
+        return False
 
 
+def start_media_cleanup(wcapi, options):
+    """
+    Set up the deletion of replaced media for a run, in the mode of options["media_cleanup"].
+
+    The cleaner is stored in options["media_cleaner"]; without it (e.g. the
+    queue cannot be opened) old media is deleted right away.
+    """
+    try:
+        cleaner = media_cleanup.MediaCleaner(
+            media_cleanup.get_queue(),
+            wcapi.url,
+            delete_img,
+            concurrency=options.get("cleanup_concurrency", media_cleanup.DEFAULT_CONCURRENCY),
+            mode=options.get("media_cleanup", media_cleanup.DEFAULT_MODE),
+        )
+    except (OSError, sqlite3.Error, ValueError) as exc:
+        log = options.get("log_message", None)
+        if log:
+            log.log_message(f"Media cleanup queue unavailable, deleting directly: {exc}", logging.WARNING)
+        return None
+    options["media_cleaner"] = cleaner.start()
+    return cleaner
 
 
+def finish_media_cleanup(options):
+    """
+    Drain or hand over the run's queued deletions, depending on the mode.
+    """
+    cleaner = options.pop("media_cleaner", None)
+    if cleaner is None:
+        return
+    pending, failed = cleaner.close()
+    log = options.get("log_message", None)
+    if log and (pending or failed):
+        log.log_message(
+            f"Media cleanup: {cleaner.deleted} deleted, {pending} queued for later, {failed} failed; "
+            "run the cleanup command to retry"
+        )
 
 
-def update_product(product_id, new_list, old_list, options):
+def delete_old_media(options, media_ids):
     """
-    Update the images and meta data of a WooCommerce product.
+    Delete replaced media: queued when the run has a cleaner, otherwise right away.
+    """
+    cleaner = options.get("media_cleaner")
+    if cleaner is not None:
+        cleaner.add(media_ids)
+        return
+    for media_id in media_ids:
+        delete_img(media_id)
 
-    Args:
-        image_ids (list): A list of new image IDs.
-        product_id (int): The ID of the WooCommerce product.
+
+def run_media_cleanup(options):
+    """
+    Delete all queued media of the active store, including earlier failures.
     """
-    
     wcapi = get_wcapi()
     if not wcapi:
         return
+    configure_http(options)
+    queue = media_cleanup.get_queue()
+    cleaner = media_cleanup.MediaCleaner(
+        queue,
+        wcapi.url,
+        delete_img,
+        concurrency=options.get("cleanup_concurrency", media_cleanup.DEFAULT_CONCURRENCY),
+        mode="end_of_run",
+    )
+    queue.reset_failed(cleaner.store)
+    deleted = cleaner.run_pending()
+    pending, failed = cleaner.close()
+    log = options.get("log_message", None)
+    if log:
+        log.log_message(f"Media cleanup: {deleted} deleted, {pending} waiting for a retry, {failed} failed")
+
+
+def product_update_data(new_list, old_list, hash_string, complete=True):
+    """
+    The update payload for a product's new gallery.
+
+    Args:
+        new_list (list): The image IDs of the new gallery, in order.
+        old_list (list): The replaced image IDs.
+        hash_string (str): The options hash, stored as _image_processed.
+        complete (bool): All images were replaced; only then is the product marked as processed.
 
-    # Prepare the data with images and meta data fields
+    Returns:
+        dict: The images and meta_data fields.
+    """
     product_data = {
         "images": [{"id": image_id} for image_id in new_list],
         "meta_data": [
-            {
-                "key": "_image_processed",
-                "value": options['hash_string']
-            },
             {
                 "key": "_old_image_ids",
                 "value": [{"id": image_id} for image_id in old_list]
@@ -244,83 +521,670 @@ def update_product(product_id, new_list, old_list, options):
 
         ]
     }
+    if complete:
+        product_data["meta_data"].insert(0, {"key": "_image_processed", "value": hash_string})
+    return product_data
 
-    # Print product data for debugging
-    print(f"Updating product {product_id} with the following data:")
-    print(json.dumps(product_data, indent=2))
 
-    # Send the update request with images and meta data fields
-    response = wcapi.put(f"products/{product_id}", data=product_data)  # Using 'json' to pass data
+def update_product(product_id, new_list, old_list, options, complete=True):
+    """
+    Update the images and meta data of a WooCommerce product.
+
+    Args:
+        product_id (int): The ID of the WooCommerce product.
+        new_list (list): The image IDs of the new gallery, in order.
+        old_list (list): The replaced image IDs.
+        options (dict): The processing options, holding "hash_string".
+        complete (bool): All images were replaced; only then is the product marked as processed.
+
+    Returns:
+        bool: True if the product was updated.
+    """
     
-    if response.status_code == 200:
-        print(f"Product with ID {product_id} updated successfully with new image IDs and meta data.")
-    else:
+    wcapi = get_wcapi()
+    if not wcapi:
+        return False
+
+    product_data = product_update_data(new_list, old_list, options['hash_string'], complete)
+    print(f"Updating product {product_id} with {len(new_list)} images.")
+
+    # Send the update request with images and meta data fields
+    with events.span(
+        "product_update", product_id=product_id, images=len(new_list), replaced=len(old_list)
+    ) as update_event:
+        response = wcapi.put(f"products/{product_id}", data=product_data)  # Using 'json' to pass data
+        update_event["status"] = response.status_code
+
+        if response.status_code == 200:
+            print(f"Product with ID {product_id} updated successfully with new image IDs and meta data.")
+            catalog = get_catalog(wcapi, options.get("use_catalog", True))
+            if catalog is not None:
+                catalog.put(response.json())
+            return True
+        update_event["error"] = response.text[:500]
         print(f"Failed to update product with ID {product_id}. Error: {response.text}")
+        return False
 
 
+class ProductUpdateBatcher:
+    """
+    Collects product updates and sends them through products/batch.
 
-def process_product_images(options):
+    Updates are sent `batch_size` at a time (the API accepts up to 100) and
+    on `flush()`. Each update carries a callback that is called with the
+    outcome of that product, once its batch has been answered.
+    """
+
+    def __init__(self, wcapi, batch_size=UPDATE_BATCH_SIZE, timeout=UPDATE_BATCH_TIMEOUT, use_catalog=True):
+        """
+        Initialize the ProductUpdateBatcher.
+
+        Args:
+            wcapi (WooCommerceClient): The API client.
+            batch_size (int): Updates per request, at most 100.
+            timeout (int): The timeout of a batch request, in seconds.
+            use_catalog (bool): Write the updated products to the catalog mirror.
+        """
+        self.wcapi = wcapi
+        self.use_catalog = use_catalog
+        self.batch_size = max(1, min(int(batch_size), 100))
+        self.timeout = timeout
+        self.updated = 0
+        self.failed = 0
+        self._pending = []
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+
+    def add(self, product_id, product_data, callback=None):
+        """
+        Queue an update; sends the batch once it is full.
+
+        Args:
+            product_id (int): The product ID.
+            product_data (dict): The fields to update, as for PUT products/<id>.
+            callback (callable, optional): Called as callback(product_id, result, error, definite):
+                `result` is the updated product, or None with an `error` message. `definite`
+                is True only for an error the store reported for this product; after a
+                timeout, a dropped connection or a 5xx the batch may still have been applied.
+        """
+        with self._lock:
+            self._pending.append((product_id, product_data, callback))
+            if len(self._pending) < self.batch_size:
+                return
+            batch, self._pending = self._pending, []
+        self._send(batch)
+
+    def flush(self):
+        """Send the queued updates."""
+        with self._lock:
+            batch, self._pending = self._pending, []
+        if batch:
+            self._send(batch)
+
+    def _send(self, batch):
+        payload = {"update": [{"id": product_id, **product_data} for product_id, product_data, _ in batch]}
+        with self._send_lock, events.span("product_update_batch", count=len(batch)) as batch_event:
+            try:
+                response = self.wcapi.post("products/batch", data=payload, timeout=self.timeout)
+                batch_event["status"] = response.status_code
+                if response.status_code != 200:
+                    raise RuntimeError(f"HTTP {response.status_code}: {response.text[:500]}")
+                results = response.json().get("update") or []
+            except (requests.RequestException, ValueError, RuntimeError) as exc:
+                # The store may have applied the batch before the answer got lost.
+                batch_event["error"] = f"{type(exc).__name__}: {exc}"
+                results = []
+                batch_error = str(exc)
+            else:
+                batch_error = "Missing from the batch response"
+
+            by_id = {result.get("id"): result for result in results if isinstance(result, dict)}
+            catalog = get_catalog(self.wcapi, self.use_catalog)
+            failed = 0
+            for product_id, _, callback in batch:
+                result = by_id.get(product_id)
+                error = None
+                definite = False
+                if result is None:
+                    error = batch_error
+                elif result.get("error"):
+                    error = (result["error"] or {}).get("message") or str(result["error"])
+                    result = None
+                    definite = True
+                if error is not None:
+                    failed += 1
+                    events.emit("product_update", product_id=product_id, error=error[:500])
+                    print(f"Failed to update product with ID {product_id}. Error: {error}")
+                elif catalog is not None:
+                    catalog.put(result)
+                if callback is not None:
+                    callback(product_id, result, error, definite)
+            batch_event["failed"] = failed
+            with self._lock:
+                self.updated += len(batch) - failed
+                self.failed += failed
+
+
+@dataclass
+class ProductWork:
+    """
+    A product on its way through download, processing, upload and update.
     """
-    Process images for a WooCommerce product by resizing and uploading them.
+
+    product: dict
+    options: dict
+    cached: bool = False
+    pinned: bool = False
+    image_paths: dict = field(default_factory=dict)
+    output_directory: str = None
+    processed: dict = field(default_factory=dict)
+    uploaded: dict = field(default_factory=dict)
+
+    @property
+    def product_id(self):
+        return self.product.get("id")
+
+
+def options_hash(options):
+    """
+    The hash of the options that change the output images, stored as _image_processed.
 
     Args:
-        options (dict): Contains options such as product_id, name_template, canvas_width, canvas_height.
+        options (dict): The processing options.
+
+    Returns:
+        str: The SHA256 hex digest.
     """
-    
     # Concatenate the values into a string
     hash_input = f"{options['background_color']}_{options['canvas_height']}_{options['canvas_width']}_{options['image_format']}_{options['image_size']}"
 
     # Create a SHA256 hash from the concatenated string
-    hash_object = hashlib.sha256(hash_input.encode())
-    hash_string = hash_object.hexdigest()
-    options['hash_string'] = hash_string
-    pprint.pprint(hash_string)
-    product_id = options.get("product_id")
+    return hashlib.sha256(hash_input.encode()).hexdigest()
+
+
+def needs_processing(product, hash_string):
+    """
+    True unless the product's _image_processed meta matches `hash_string`.
+    """
+    return product_catalog.processed_hash(product.get("meta_data")) != hash_string
+
+
+def plan_products(wcapi, options):
+    """
+    Work out which products a run has to process.
+
+    With the catalog mirror this is one indexed query after an incremental
+    sync; without it the whole listing is fetched first and filtered in bulk.
+
+    Args:
+        wcapi (WooCommerceClient): The API client.
+        options (dict): The processing options, holding "hash_string".
+
+    Returns:
+        tuple: (products to process, total number of products, number of
+        products to process). The products are an iterator when they come
+        from the mirror, otherwise a list.
+    """
+    hash_string = options["hash_string"]
+    list_concurrency = options.get("list_concurrency", LIST_CONCURRENCY)
+    with events.span("plan") as plan_event:
+        catalog = get_catalog(wcapi, options.get("use_catalog", True))
+        if catalog is not None:
+            catalog.refresh(wcapi, concurrency=list_concurrency)
+            total = catalog.count()
+            pending = catalog.count(pending=hash_string)
+            work_list = catalog.products(pending=hash_string)
+        else:
+            products = list(list_products(wcapi, concurrency=list_concurrency))
+            total = len(products)
+            work_list = [product for product in products if needs_processing(product, hash_string)]
+            pending = len(work_list)
+        plan_event.update(total=total, pending=pending, catalog=catalog is not None)
+    return work_list, total, pending
+
+
+def start_run(wcapi, options):
+    """
+    Open the journal of an all-products run (see api/run_journal.py).
+
+    An unfinished run for the same store and options is resumed; unfinished
+    runs with other options are abandoned and their unattached uploads deleted.
+    The session is stored in options["run_journal"]; the media cleaner must
+    already be set up.
+
+    Returns:
+        RunSession: The session, or None if resuming is off or the journal is unavailable.
+    """
+    if not options.get("resume_runs", True):
+        return None
+    journal = run_journal.get_journal()
+    if journal is None:
+        return None
+    store = wcapi.url.rstrip("/")
+    try:
+        run_id = journal.unfinished(store, options["hash_string"])
+        resumed = run_id is not None
+        if not resumed:
+            run_id = journal.start(store, options["hash_string"])
+        orphans = journal.abandon(store, keep=run_id)
+    except sqlite3.Error as exc:
+        log = options.get("log_message", None)
+        if log:
+            log.log_message(f"Run journal unavailable, the run cannot be resumed: {exc}", logging.WARNING)
+        return None
+    delete_old_media(options, orphans)
+    session = run_journal.RunSession(journal, run_id, resumed)
+    options["run_journal"] = session
+    return session
+
+
+def settle_update(session, product_id, state, options, unattached_status):
+    """
+    Find out from the product itself whether an unconfirmed update landed.
+
+    New media found on the product stays and the old media it replaced is
+    deleted. Uploads not found on the product stay recorded, with
+    `unattached_status`; the product is done when none are left.
+
+    Returns:
+        bool: False if the product could not be fetched, so the outcome is still unknown.
+    """
+    try:
+        product = get_product(product_id)
+    except (requests.RequestException, ValueError):
+        product = None
+    if not isinstance(product, dict) or product.get("id") != product_id:
+        return False
+    present = {image.get("id") for image in product.get("images", [])}
+    uploaded = state["uploaded"]
+    replaced = [old_id for old_id, new_id in uploaded.items() if new_id in present and old_id not in present]
+    delete_old_media(options, replaced)
+    remaining = {old_id: new_id for old_id, new_id in uploaded.items() if new_id not in present}
+    if remaining != uploaded:
+        state["uploaded"] = remaining
+        session.set_uploads(product_id, remaining)
+    state["status"] = unattached_status if remaining else run_journal.DONE
+    session.status(product_id, state["status"])
+    return True
+
+
+def reconcile_run(session, options):
+    """
+    Settle the products of a resumed run whose update was sent but never confirmed.
+
+    Uploads that did not land are reused when the product comes up again.
+
+    Returns:
+        dict: product ID -> state, as RunJournal.products.
+    """
+    states = session.journal.products(session.run_id)
+    for product_id, state in states.items():
+        if state["status"] == run_journal.UPDATING and state["uploaded"]:
+            settle_update(session, product_id, state, options, run_journal.UPLOADED)
+    return states
+
+
+def close_run(session, options):
+    """
+    Finish the journal of a run that went through all of its products.
+
+    Updates that were never confirmed are settled first; uploads that did not
+    land are deleted with the other unattached media. If an update cannot be
+    settled (the product cannot be fetched), the run is left open, so the next
+    run checks it again.
+
+    Returns:
+        bool: True if the run was finished.
+    """
+    unknown = 0
+    for product_id, state in session.journal.products(session.run_id).items():
+        if state["status"] == run_journal.UPDATING and state["uploaded"]:
+            if not settle_update(session, product_id, state, options, run_journal.FAILED):
+                unknown += 1
+    if unknown:
+        log = options.get("log_message", None)
+        if log:
+            log.log_message(
+                f"{unknown} product updates could not be confirmed; the next run will check them", logging.WARNING
+            )
+        return False
+    # Media of products that failed is not attached to anything.
+    delete_old_media(options, session.journal.orphaned_media(session.run_id))
+    session.finish()
+    return True
+
+
+def restore_uploads(product, state, options):
+    """
+    The uploads of an earlier attempt that still apply to `product`.
+
+    An upload applies while its old image is still on the product. Uploads
+    whose old image is gone are deleted; uploads already attached are dropped.
+
+    Returns:
+        dict: Old image ID -> new media ID.
+    """
+    present = {image.get("id") for image in product.get("images", [])}
+    uploaded = {}
+    stale = []
+    for old_id, new_id in state["uploaded"].items():
+        if new_id in present:
+            continue
+        if old_id in present:
+            uploaded[old_id] = new_id
+        else:
+            stale.append(new_id)
+    delete_old_media(options, stale)
+    return uploaded
+
+
+def plan_run(wcapi, options, session, states):
+    """
+    The work list of an all-products run.
+
+    A resumed run is reconciled first (its product states are put in
+    `states`) and continues its stored work list, if it has one; otherwise
+    the products are planned with plan_products.
+
+    Returns:
+        iterable: The products to process.
+    """
+    log = options.get("log_message", None)
+    planned = None
+    if session is not None and session.resumed:
+        states.update(reconcile_run(session, options))
+        planned = session.journal.planned(session.run_id)
+        done = sum(1 for state in states.values() if state["status"] == run_journal.DONE)
+        if log:
+            log.log_message(f"Resuming an interrupted run, {done} products already done")
+    if planned is not None:
+        # Without the catalog the stored work list is continued, so nothing is listed again.
+        if log:
+            log.log_message(f"Continuing the stored plan of {planned} products")
+        return session.journal.plan(session.run_id)
+
+    work_list, total, pending = plan_products(wcapi, options)
+    if session is not None and isinstance(work_list, list):
+        session.journal.save_plan(session.run_id, work_list)
+    if log:
+        log.log_message(f"{pending} of {total} products need processing, {total - pending} are up to date")
+    return work_list
+
+
+def prepare_product(product, options):
+    """
+    Start the work for a product, unless it was already processed with the current options.
+
+    Args:
+        product (dict): The WooCommerce product data.
+        options (dict): The processing options, holding "hash_string".
+
+    Returns:
+        ProductWork: The work item, or None if the product is skipped.
+    """
+    product_id = product.get("id") if product else None
     if not product_id:
         print("No product ID")
-        return
-    product = options.get("product")
-    # Check if the product meta_data contains _image_processed with the current hash
-    if product['meta_data']:
-        for meta in product['meta_data']:
-            if meta['key'] == '_image_processed' and meta['value'] == hash_string:
-                print(f"Skipping product {product_id}, already processed with the current hash.")
-                return
-    image_paths = get_images(product)
-    if not image_paths:
-        return
-    
-   
+        return None
+    if not needs_processing(product, options["hash_string"]):
+        print(f"Skipping product {product_id}, already processed with the current hash.")
+        return None
+    # Each product gets its own copy: several products are in flight at once.
+    return ProductWork(product, {**options, "product_id": product_id, "product": product})
 
-    
-   
-    with tempfile.TemporaryDirectory() as temp_output_directory:
-        print(f"Using temporary directory: {temp_output_directory}")
-
-        old_list = []
-        new_list = []
-        pprint.pprint ( list(image_paths.values()))
-        file = FileProcessor()
-        log = options.get("log_message", None)
-        
-        
-        for image_id, file_path in image_paths.items():
-            
-            processed = file.process_images([file_path], temp_output_directory, options, log, product)
 
-            
-            new_id = upload_image(processed[0])
+def download_product_images(work):
+    """
+    Pipeline stage: download the gallery of a product.
 
-            if new_id:
-                old_list.append(image_id)
-                new_list.append(new_id)
+    Returns:
+        ProductWork: The work item, or None if the product has no images.
+    """
+    options = work.options
+    checkpoint(options)
+    product = work.product
+    if work.uploaded:
+        # Resumed: images uploaded by the earlier run are not done again.
+        product = {**product, "images": [i for i in product.get("images", []) if i.get("id") not in work.uploaded]}
+        if not product["images"]:
+            return work
+    cache = download_cache.get_cache(options.get("download_cache_mb"))
+    work.cached = work.pinned = cache is not None
+    # Pinned until processed: queued products must not lose their sources to eviction.
+    work.image_paths = get_images(
+        product,
+        concurrency=options.get("download_concurrency", DOWNLOAD_CONCURRENCY),
+        chunk_size=options.get("download_chunk_size", DOWNLOAD_CHUNK_SIZE),
+        cache=cache,
+        pin=work.pinned,
+    )
+    if not work.image_paths:
+        return work if work.uploaded else None
+    return work
+
+
+def process_product_work(work):
+    """
+    Pipeline stage: resize the downloaded images.
+
+    The results stay in memory and are uploaded from there, unless
+    options["product_copy_dir"] asks for a copy on disk.
 
+    Returns:
+        ProductWork: The work item.
+    """
+    options = work.options
+    if not work.image_paths:
+        return work
+    # Cached originals are kept for the next run and for previews.
+    process_options = {**options, "delete_images": False} if work.cached else options
+    copy_directory = options.get("product_copy_dir")
+    # DZI output is a tree of tiles and always goes to disk.
+    in_memory = not copy_directory and options.get("image_format") != "DZI"
+    if copy_directory:
+        output_directory = copy_directory
+    elif in_memory:
+        output_directory = ""
+    else:
+        output_directory = work.output_directory = tempfile.mkdtemp(prefix="images_py-")
+        print(f"Using temporary directory: {work.output_directory}")
+    file = FileProcessor()
+    try:
+        output_paths = file.process_images(
+            list(work.image_paths.values()),
+            output_directory,
+            process_options,
+            options.get("log_message", None),
+            work.product,
+            in_memory=in_memory,
+        )
+    finally:
+        release_sources(work)
+    work.processed = dict(zip(work.image_paths, output_paths))
+    if not work.cached and options.get("delete_images"):
+        # The processor deleted the sources; this also removes their folders.
+        remove_downloaded_images(work.image_paths)
+    return work
+
+
+def upload_product_images(work):
+    """
+    Pipeline stage: upload the processed images as new media.
+
+    Returns:
+        ProductWork: The work item.
+    """
+    journal = work.options.get("run_journal")
+    # Each upload is journaled as soon as it returns.
+    on_uploaded = functools.partial(journal.uploaded, work.product_id) if journal is not None else None
+
+    work.uploaded.update(
+        upload_images(work.processed, work.options.get("upload_concurrency", UPLOAD_CONCURRENCY), on_uploaded)
+    )
+    if journal is not None:
+        journal.status(work.product_id, run_journal.UPLOADED)
+    return work
+
+
+def finish_product(work):
+    """
+    Pipeline stage: point the product at the new images, delete the old ones and clean up.
+
+    Returns:
+        ProductWork: The work item.
+    """
+    old_list = []
+    new_list = []
+    # Keep the gallery order; images that failed to download or upload keep their old ID.
+    gallery = []
+    for image in work.product.get("images", []):
+        image_id = image.get("id")
+        new_id = work.uploaded.get(image_id)
+        if new_id:
+            old_list.append(image_id)
+            new_list.append(new_id)
+            gallery.append(new_id)
+        else:
+            gallery.append(image_id)
+
+    journal = work.options.get("run_journal")
+    try:
         if new_list:
-            options["image_ids"] = new_list  # Store new image IDs in options
-            update_product(product_id, new_list, old_list, options)  # Pass new image IDs here
-            for old in old_list:
-                delete_img(old)
+            work.options["image_ids"] = new_list  # Store new image IDs in options
+            complete = len(new_list) == len(gallery)
+            batcher = work.options.get("update_batcher")
+            if journal is not None:
+                journal.status(work.product_id, run_journal.UPDATING)
+            if batcher is not None:
+                # The old images go once the batch holding this update succeeds.
+                def on_updated(product_id, result, error, definite):
+                    if error is None:
+                        delete_old_media(work.options, old_list)
+                        if journal is not None:
+                            journal.status(product_id, run_journal.DONE)
+                        return
+                    # Otherwise the update may have landed: it stays "updating" and is settled later.
+                    if definite and journal is not None:
+                        journal.status(product_id, run_journal.FAILED, str(error)[:500])
+                    log = work.options.get("log_message", None)
+                    if log:
+                        name = work.product.get("name", "")
+                        log.log_message(f"Update failed {name}: {error}", logging.ERROR)
+
+                batcher.add(
+                    work.product_id,
+                    product_update_data(gallery, old_list, work.options["hash_string"], complete),
+                    on_updated,
+                )
+            elif update_product(work.product_id, gallery, old_list, work.options, complete):
+                delete_old_media(work.options, old_list)
+                if journal is not None:
+                    journal.status(work.product_id, run_journal.DONE)
         print("Temporary files processed and uploaded successfully.")
+    finally:
+        remove_output_directory(work)
+    return work
+
+
+def discard_product_work(work):
+    """
+    Clean up after a product that failed or was cancelled before its update.
+    """
+    if work is None:
+        return
+    release_sources(work)
+    remove_output_directory(work)
+    remove_downloaded_images(work.image_paths)
+
+
+def release_sources(work):
+    """
+    Unpin the cached sources of a product, so the cache may evict them again.
+    """
+    if not work.pinned:
+        return
+    work.pinned = False
+    cache = download_cache.get_cache()
+    if cache is None:
+        return
+    for file_path in work.image_paths.values():
+        if cache.contains(file_path):
+            cache.unpin(file_path)
+
+
+def remove_output_directory(work):
+    if work.output_directory:
+        shutil.rmtree(work.output_directory, ignore_errors=True)
+        work.output_directory = None
+
+
+def process_product_images(options):
+    """
+    Process images for a WooCommerce product by resizing and uploading them.
+
+    Args:
+        options (dict): Contains options such as product_id, name_template, canvas_width, canvas_height.
+    """
+    options['hash_string'] = options_hash(options)
+    pprint.pprint(options['hash_string'])
+    if not options.get("product_id"):
+        print("No product ID")
+        return
+    wcapi = get_wcapi()
+    if not wcapi:
+        return
+    configure_http(options)
+    start_media_cleanup(wcapi, options)
+    try:
+        work = prepare_product(options.get("product"), options)
+        if not work:
+            return
+
+        try:
+            for stage in (download_product_images, process_product_work):
+                if stage(work) is None:
+                    discard_product_work(work)
+                    return
+            # Last checkpoint for this product: once uploads start, the product is
+            # finished so a cancel never leaves new media unattached.
+            checkpoint(options)
+            upload_product_images(work)
+        except BaseException:
+            discard_product_work(work)
+            raise
+        finish_product(work)
+    finally:
+        finish_media_cleanup(options)
+
+
+def remove_downloaded_images(image_paths):
+    """
+    Remove downloaded source images from the temp folder. Cached originals are kept.
+
+    Args:
+        image_paths (dict): Mapping of image IDs to downloaded file paths, as returned by get_images.
+    """
+    cache = download_cache.get_cache()
+    for file_path in image_paths.values():
+        if cache and cache.contains(file_path):
+            continue
+        remove_download(file_path)
+
+
+def remove_download(file_path):
+    """
+    Remove a file downloaded into temp/, along with its per-download folder.
+    """
+    try:
+        os.remove(file_path)
+    except OSError:
+        pass
+    directory = os.path.dirname(file_path)
+    if os.path.dirname(directory) == "temp":
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
 
 
 def generate_output_path(
@@ -359,52 +1223,184 @@ def get_first_image_path(product):
             print(f"Processing Image ID: {image_id}")
             print(f"File Path: {file_path}")
             return file_path
-def get_first_image():
+def get_first_image(use_catalog=True):
     """
-    Process images for all WooCommerce products by resizing and uploading them.
+    Download the first image of the first product, for the preview.
 
     Args:
-        options (dict): Contains options such as name_template, canvas_width, canvas_height.
+        use_catalog (bool): Read the product from the catalog mirror when it is synced.
+
+    Returns:
+        str: The image path, or None.
     """
     wcapi = get_wcapi()
     if not wcapi:
         return
 
-    page = 1
-    total_products = 0  # Initialize the counter for total products
+    catalog = get_catalog(wcapi, use_catalog)
+    if catalog is not None and catalog.synced:
+        products = itertools.islice(catalog.products(), 5)
+    else:
+        products = wcapi.get("products", params={"per_page": 5, "page": 1, "_fields": PRODUCT_FIELDS}).json()
+    for product in products or []:
+        return get_first_image_path(product)
+
 
+def get_catalog(wcapi, use_catalog=True):
+    """
+    The local catalog mirror of the store behind `wcapi`, or None if it is disabled.
 
-    products = wcapi.get("products", params={"per_page": 5, "page": page}).json()
-    if not products:
+    Args:
+        wcapi (WooCommerceClient): The API client.
+        use_catalog (bool): The "use_catalog" option; False keeps the mirror out of it.
+    """
+    if not use_catalog:
+        return None
+    return product_catalog.get_catalog(wcapi.url)
+
+
+def sync_catalog(options):
+    """
+    Bring the local catalog mirror up to date.
+
+    Args:
+        options (dict): "catalog_full_sync" forces a full sync.
+    """
+    wcapi = get_wcapi()
+    if not wcapi:
         return
-    for product in products:
-        total_products += 1  # Update the total count
-        return get_first_image_path(product)
-            
-def search_product(search):
+    catalog = get_catalog(wcapi)
+    if catalog is None:
+        return
+    configure_http(options)
+    log = options.get("log_message", None)
+    fetched = catalog.sync(
+        wcapi,
+        full=bool(options.get("catalog_full_sync")),
+        concurrency=options.get("list_concurrency", LIST_CONCURRENCY),
+    )
+    if log:
+        log.log_message(f"Catalog synced: {fetched} products fetched, {catalog.count()} in the mirror")
+
+
+def search_product(search, use_catalog=True):
     """
-    Process images for all WooCommerce products by resizing and uploading them.
+    Search WooCommerce products by name or SKU.
+
+    Searches the local catalog mirror once it has been synced, refreshing it
+    first when it is older than CATALOG_MAX_AGE; otherwise asks the API.
 
     Args:
-        options (dict): Contains options such as name_template, canvas_width, canvas_height.
+        search (str): The search term.
+        use_catalog (bool): Search the catalog mirror when it is synced.
+
+    Returns:
+        list: Up to 100 matching products.
     """
     wcapi = get_wcapi()
     if not wcapi:
         return
 
-    page = 1
-    total_products = 0  # Initialize the counter for total products
+    catalog = get_catalog(wcapi, use_catalog)
+    if catalog is not None and catalog.synced:
+        try:
+            catalog.refresh(wcapi, max_age=CATALOG_MAX_AGE)
+        except requests.RequestException as exc:
+            # A stale mirror is still a good answer.
+            events.emit("catalog_sync", error=f"{type(exc).__name__}: {exc}")
+        return catalog.search(search) or None
+
+    try:
+        products = list(list_products(wcapi, {"search": search}, max_pages=1))
+    except requests.HTTPError as exc:
+        print(f"Product search failed: {exc}")
+        return None
+    return products or None
+
+
+def list_products(wcapi, params=None, per_page=100, concurrency=LIST_CONCURRENCY, max_pages=None):
+    """
+    Page through the products endpoint, fetching pages in parallel.
+
+    The first page tells the number of pages (X-WP-TotalPages); the rest are
+    fetched `concurrency` at a time and yielded in page order. Only the
+    fields in PRODUCT_FIELDS are requested.
+
+    Args:
+        wcapi (WooCommerceClient): The API client.
+        params (dict, optional): Extra query parameters, e.g. {"search": "shirt"}.
+        per_page (int): Products per page (the API maximum is 100).
+        concurrency (int): Pages fetched at the same time.
+        max_pages (int, optional): Stop after this many pages.
+
+    Yields:
+        dict: The products.
+
+    Raises:
+        requests.HTTPError: A page failed (after the governor's retries), so the listing is incomplete.
+    """
+    base_params = {"per_page": per_page, "_fields": PRODUCT_FIELDS, **(params or {})}
+
+    def fetch(page):
+        with events.span("list", page=page) as list_event:
+            response = wcapi.get("products", params={**base_params, "page": page})
+            list_event["status"] = response.status_code
+            if response.status_code != 200:
+                list_event["error"] = response.text[:500]
+                # An empty page would silently end the listing here.
+                raise requests.HTTPError(
+                    f"Listing products page {page} failed: HTTP {response.status_code}", response=response
+                )
+            products = response.json()
+            list_event["count"] = len(products) if products else 0
+            return response, products or []
+
+    response, products = fetch(1)
+    yield from products
+    total_pages = response.headers.get("X-WP-TotalPages")
+    if not products:
+        return
+    if max_pages is not None and max_pages <= 1:
+        return
+
+    if total_pages is None or not total_pages.isdigit():
+        # No paging headers (e.g. stripped by a proxy): walk the pages until one is empty.
+        page = 2
+        while max_pages is None or page <= max_pages:
+            _, products = fetch(page)
+            if not products:
+                return
+            yield from products
+            page += 1
+        return
+
+    last_page = int(total_pages)
+    if max_pages is not None:
+        last_page = min(last_page, max_pages)
+    if last_page < 2:
+        return
+    workers = max(1, min(int(concurrency or 1), last_page - 1))
+    http_client.configure_pool(workers)
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="list") as pool:
+        pages = [events.submit(pool, fetch, page) for page in range(2, last_page + 1)]
+        try:
+            for future in pages:
+                _, products = future.result()
+                yield from products
+        finally:
+            for future in pages:
+                future.cancel()
 
-    while True:
-        products = wcapi.get("products", params={"per_page": 100, "page": page, "search": search}).json()
-        if not products:
-            break
-        return products
 
 def process_all_products(options):
     """
     Process images for all WooCommerce products by resizing and uploading them.
 
+    A planning pass first picks the products that were not processed with the
+    current options (see plan_products). Only those flow through a pipeline:
+    downloading, processing, uploading and updating run as separate stages
+    with their own workers, so the network and the CPU are busy at the same time.
+
     Args:
         options (dict): Contains options such as name_template, canvas_width, canvas_height.
     """
@@ -412,35 +1408,102 @@ def process_all_products(options):
     if not wcapi:
         return
 
-    page = 1
-    total_products = 0  # Initialize the counter for total products
+    configure_http(options)
     log = options.get("log_message", None)
+    options["hash_string"] = options_hash(options)
+    numbers = itertools.count(1)
 
-    while True:
-        products = wcapi.get("products", params={"per_page": 100, "page": page}).json()
-        if not products:
-            break
-
-        product_count = len(products)  # Get the count of products on the current page
-        
-
+    batcher = ProductUpdateBatcher(
+        wcapi, options.get("update_batch_size", UPDATE_BATCH_SIZE), use_catalog=options.get("use_catalog", True)
+    )
+    options["update_batcher"] = batcher
+    start_media_cleanup(wcapi, options)
+    session = start_run(wcapi, options)
+    states = {}
+
+    def start_product(product):
+        """Prepare a product for the pipeline; runs in the source, so every stage gets a ProductWork."""
+        state = states.get(product.get("id")) if product else None
+        if state is not None and state["status"] == run_journal.DONE:
+            return None
+        number = next(numbers)
+        if log and product:
+            name = product.get("name", "")
+            log.log_message(f"#{number} Processing {name} ")  # Log the product name
+        work = prepare_product(product, options)
+        if work is None:
+            return None
+        if state is not None and state["uploaded"]:
+            work.uploaded = restore_uploads(product, state, options)
+            session.set_uploads(work.product_id, work.uploaded)
+        if session is not None:
+            session.status(work.product_id, run_journal.STARTED)
+        return work
+
+    def prepared(products):
         for product in products:
-            total_products += 1  # Update the total count
-            options["product_id"] = product["id"]
-            options["product"] = product
-            if log:
-                if product:
-                    name = product.get("name", "")
-                    log.log_message(f"#{total_products} Processing {name} ")  # Log the product name
-            process_product_images(options)
-
-        page += 1
+            work = start_product(product)
+            if work is not None:
+                yield work
+
+    def report_error(stage, work, error):
+        if log:
+            product = work.product if isinstance(work, ProductWork) else work or {}
+            log.log_message(f"{stage} failed {product.get('name', '')}: {error}", logging.ERROR)
+
+    queue_size = options.get("pipeline_queue_size", PIPELINE_QUEUE_SIZE)
+    completed = False
+    pipeline = Pipeline(
+        [
+            Stage(
+                "products:download",
+                download_product_images,
+                workers=options.get("pipeline_download_workers", PIPELINE_DOWNLOAD_WORKERS),
+                queue_size=queue_size,
+            ),
+            Stage(
+                "products:process",
+                process_product_work,
+                workers=options.get("pipeline_process_workers", PIPELINE_PROCESS_WORKERS),
+                queue_size=queue_size,
+            ),
+            Stage(
+                "products:upload",
+                upload_product_images,
+                workers=options.get("pipeline_upload_workers", PIPELINE_UPLOAD_WORKERS),
+                queue_size=queue_size,
+            ),
+            # Uploaded media must end up on the product, even after a cancel.
+            Stage("products:update", finish_product, workers=1, queue_size=queue_size, finish_on_cancel=True),
+        ],
+        token=options.get("cancel_token"),
+        on_discard=discard_product_work,
+        on_error=report_error,
+    )
+    try:
+        work_list = plan_run(wcapi, options, session, states)
+        pipeline.run(prepared(work_list))
+        completed = True
+    finally:
+        # Also after a cancel: these products already have their new media uploaded.
+        try:
+            batcher.flush()
+            if session is not None and completed:
+                close_run(session, options)
+        finally:
+            options.pop("update_batcher", None)
+            options.pop("run_journal", None)
+            finish_media_cleanup(options)
+    total_products = next(numbers) - 1
+    if log and batcher.failed:
+        log.log_message(f"{batcher.failed} product updates failed", logging.ERROR)
 
     # Log the total number of products processed
     if log:
         log.log_message(f"Total products processed: {total_products}")
 
     # Show completion message
-    messagebox.showinfo(
+    notify(
+        "info",
         "Process Complete", f"All product images processing is complete. Total products processed: {total_products}"
     )
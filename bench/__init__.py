@@ -0,0 +1 @@
+"""Offline benchmarks of the network side: a fake store and a load harness (python -m bench)."""
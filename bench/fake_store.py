@@ -0,0 +1,330 @@
+"""Local stand-in for a WooCommerce/WordPress store.
+
+Implements the endpoints the app uses, on plain http:
+
+    GET    /wp-json/wc/v3/products             list, search, modified_after, _fields
+    GET    /wp-json/wc/v3/products/<id>
+    PUT    /wp-json/wc/v3/products/<id>
+    POST   /wp-json/wc/v3/products/batch
+    POST   /wp-json/wp/v2/media                raw image body
+    DELETE /wp-json/wp/v2/media/<id>
+    GET    /images/<media id>.jpg              with ETag / 304
+
+Authentication is accepted as given. Latency, bandwidth, error and throttle
+rates and the catalog size come from `FakeStoreConfig`, and every request's
+server-side time is recorded per endpoint.
+"""
+from __future__ import annotations
+
+import io
+import json
+import random
+import re
+import threading
+import time
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, Optional
+from urllib.parse import parse_qs, urlsplit
+
+
+@dataclass
+class FakeStoreConfig:
+    products: int = 200
+    images_per_product: int = 3
+    image_kb: int = 200
+    latency_ms: float = 50.0
+    jitter_ms: float = 10.0
+    bandwidth_kbps: float = 0.0  # per connection, both directions; 0 = unlimited
+    error_rate: float = 0.0  # share of API requests answered 500
+    throttle_rate: float = 0.0  # share of API requests answered 429
+    retry_after: int = 1
+    processed_share: float = 0.0  # share of products already marked processed
+    processed_hash: str = ""
+    seed: int = 1
+
+
+def _make_image(size_kb: int, seed: int) -> bytes:
+    """A JPEG of roughly `size_kb` kilobytes (noise compresses badly, so the size is predictable)."""
+    try:
+        from PIL import Image
+    except ImportError:
+        return random.Random(seed).randbytes(size_kb * 1024)
+    rng = random.Random(seed)
+    side = max(16, int((size_kb * 1024 / 1.5) ** 0.5))
+    image = Image.frombytes("RGB", (side, side), rng.randbytes(side * side * 3))
+    buffer = io.BytesIO()
+    image.save(buffer, "JPEG", quality=90)
+    return buffer.getvalue()
+
+
+class FakeStore:
+    """The catalog, media library and request statistics of the fake store."""
+
+    def __init__(self, config: FakeStoreConfig, base_url: str = ""):
+        self.config = config
+        self.base_url = base_url
+        self.rng = random.Random(config.seed)
+        self.lock = threading.Lock()
+        self.image = _make_image(config.image_kb, config.seed)
+        self.media: Dict[int, int] = {}  # media id -> size
+        self.products: Dict[int, dict] = {}
+        self.timings: Dict[str, List[float]] = {}
+        self.statuses: Dict[int, int] = {}
+        self._next_media = 1
+        now = datetime.now(timezone.utc)
+        for index in range(config.products):
+            product_id = 1000 + index
+            images = []
+            for _ in range(config.images_per_product):
+                media_id = self._add_media(len(self.image))
+                images.append(self.image_entry(media_id))
+            meta = []
+            if config.processed_hash and self.rng.random() < config.processed_share:
+                meta.append({"id": index, "key": "_image_processed", "value": config.processed_hash})
+            self.products[product_id] = {
+                "id": product_id,
+                "name": f"Product {index}",
+                "sku": f"SKU-{index:05d}",
+                "slug": f"product-{index}",
+                "images": images,
+                "meta_data": meta,
+                "date_modified_gmt": (now - timedelta(days=1)).strftime("%Y-%m-%dT%H:%M:%S"),
+            }
+
+    def image_entry(self, media_id: int) -> dict:
+        return {"id": media_id, "src": f"{self.base_url}/images/{media_id}.jpg", "name": f"image-{media_id}"}
+
+    def _add_media(self, size: int) -> int:
+        media_id = self._next_media
+        self._next_media += 1
+        self.media[media_id] = size
+        return media_id
+
+    def add_media(self, size: int) -> int:
+        with self.lock:
+            return self._add_media(size)
+
+    def record(self, endpoint: str, seconds: float, status: int) -> None:
+        with self.lock:
+            self.timings.setdefault(endpoint, []).append(seconds)
+            self.statuses[status] = self.statuses.get(status, 0) + 1
+
+    def update(self, product_id: int, data: dict) -> Optional[dict]:
+        with self.lock:
+            product = self.products.get(product_id)
+            if product is None:
+                return None
+            if "images" in data:
+                product["images"] = [self.image_entry(image["id"]) for image in data["images"]]
+            for meta in data.get("meta_data") or []:
+                product["meta_data"] = [m for m in product["meta_data"] if m.get("key") != meta.get("key")]
+                product["meta_data"].append(dict(meta))
+            product["date_modified_gmt"] = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S")
+            return json.loads(json.dumps(product))
+
+
+def _fields(product: dict, fields: Optional[str]) -> dict:
+    if not fields:
+        return product
+    wanted = set(fields.split(","))
+    return {key: value for key, value in product.items() if key in wanted}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # Headers and body go out in separate writes; with Nagle on, every
+    # keep-alive response would wait for a delayed ACK (~40 ms).
+    disable_nagle_algorithm = True
+    server: "FakeStoreServer"
+
+    def log_message(self, format, *args):
+        pass
+
+    # -- plumbing ---------------------------------------------------------
+
+    @property
+    def store(self) -> FakeStore:
+        return self.server.store
+
+    def _delay(self) -> None:
+        config = self.store.config
+        delay = config.latency_ms + self.store.rng.uniform(-config.jitter_ms, config.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000)
+
+    def _transfer_time(self, size: int) -> None:
+        rate = self.store.config.bandwidth_kbps
+        if rate > 0 and size:
+            time.sleep(size / (rate * 1024))
+
+    def _read_body(self) -> bytes:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        self._transfer_time(len(body))
+        return body
+
+    def _send(self, status: int, body: bytes = b"", content_type="application/json", headers=None) -> None:
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if body and self.command != "HEAD":
+            self._transfer_time(len(body))
+            self.wfile.write(body)
+        self._status = status
+
+    def _json(self, status: int, data, headers=None) -> None:
+        self._send(status, json.dumps(data).encode(), headers=headers)
+
+    def _injected_failure(self) -> bool:
+        config = self.store.config
+        roll = self.store.rng.random()
+        if roll < config.throttle_rate:
+            self._json(429, {"code": "too_many_requests"}, {"Retry-After": str(config.retry_after)})
+            return True
+        if roll < config.throttle_rate + config.error_rate:
+            self._json(500, {"code": "internal_server_error"})
+            return True
+        return False
+
+    def _handle(self) -> None:
+        started = time.perf_counter()
+        self._status = 500
+        parts = urlsplit(self.path)
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        endpoint = "other"
+        try:
+            for pattern, method, name, handler in _ROUTES:
+                match = re.fullmatch(pattern, parts.path)
+                if match and method == self.command:
+                    endpoint = name
+                    body = self._read_body() if self.command in ("POST", "PUT") else b""
+                    self._delay()
+                    if name != "image" and self._injected_failure():
+                        return
+                    handler(self, query, body, *match.groups())
+                    return
+            self._json(404, {"code": "rest_no_route"})
+        finally:
+            self.store.record(endpoint, time.perf_counter() - started, self._status)
+
+    do_GET = do_POST = do_PUT = do_DELETE = do_HEAD = _handle
+
+    # -- endpoints --------------------------------------------------------
+
+    def list_products(self, query, body):
+        store = self.store
+        with store.lock:
+            products = sorted(store.products.values(), key=lambda product: product["id"])
+            search = (query.get("search") or "").lower()
+            if search:
+                products = [p for p in products if search in p["name"].lower() or search in p["sku"].lower()]
+            since = query.get("modified_after")
+            if since:
+                products = [p for p in products if p["date_modified_gmt"] > since]
+            per_page = min(100, int(query.get("per_page", 10)))
+            page = max(1, int(query.get("page", 1)))
+            total = len(products)
+            chunk = products[(page - 1) * per_page: page * per_page]
+            data = [_fields(json.loads(json.dumps(p)), query.get("_fields")) for p in chunk]
+        pages = max(1, -(-total // per_page))
+        self._json(200, data, {"X-WP-Total": str(total), "X-WP-TotalPages": str(pages)})
+
+    def get_product(self, query, body, product_id):
+        with self.store.lock:
+            product = self.store.products.get(int(product_id))
+            data = _fields(json.loads(json.dumps(product)), query.get("_fields")) if product else None
+        if data is None:
+            self._json(404, {"code": "woocommerce_rest_product_invalid_id"})
+        else:
+            self._json(200, data)
+
+    def put_product(self, query, body, product_id):
+        product = self.store.update(int(product_id), json.loads(body or b"{}"))
+        if product is None:
+            self._json(404, {"code": "woocommerce_rest_product_invalid_id"})
+        else:
+            self._json(200, product)
+
+    def batch_products(self, query, body):
+        results = []
+        for item in json.loads(body or b"{}").get("update", []):
+            product = self.store.update(int(item.get("id", 0)), item)
+            if product is None:
+                results.append(
+                    {"id": item.get("id"), "error": {"code": "woocommerce_rest_product_invalid_id", "message": "Invalid ID."}}
+                )
+            else:
+                results.append(product)
+        self._json(200, {"update": results})
+
+    def upload_media(self, query, body):
+        media_id = self.store.add_media(len(body))
+        self._json(201, {"id": media_id, "guid": {"rendered": self.store.image_entry(media_id)["src"]}})
+
+    def delete_media(self, query, body, media_id):
+        with self.store.lock:
+            found = self.store.media.pop(int(media_id), None) is not None
+        if found:
+            self._json(200, {"deleted": True})
+        else:
+            self._json(404, {"code": "rest_post_invalid_id"})
+
+    def get_image(self, query, body, media_id):
+        etag = f'"{media_id}"'
+        with self.store.lock:
+            known = int(media_id) in self.store.media
+        if not known:
+            self._json(404, {"code": "not_found"})
+        elif self.headers.get("If-None-Match") == etag:
+            self._send(304, headers={"ETag": etag})
+        else:
+            self._send(200, self.store.image, "image/jpeg", {"ETag": etag})
+
+
+_ROUTES = [
+    (r"/wp-json/wc/v3/products", "GET", "products:list", _Handler.list_products),
+    (r"/wp-json/wc/v3/products/batch", "POST", "products:batch", _Handler.batch_products),
+    (r"/wp-json/wc/v3/products/(\d+)", "GET", "products:get", _Handler.get_product),
+    (r"/wp-json/wc/v3/products/(\d+)", "PUT", "products:put", _Handler.put_product),
+    (r"/wp-json/wp/v2/media", "POST", "media:upload", _Handler.upload_media),
+    (r"/wp-json/wp/v2/media/(\d+)", "DELETE", "media:delete", _Handler.delete_media),
+    (r"/images/(\d+)\.jpg", "GET", "image", _Handler.get_image),
+]
+
+
+class FakeStoreServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config: Optional[FakeStoreConfig] = None, host: str = "127.0.0.1", port: int = 0):
+        """
+        Initialize the FakeStoreServer.
+
+        Args:
+            config (FakeStoreConfig, optional): The store's size and behaviour.
+            host (str): The address to listen on.
+            port (int): The port; 0 picks a free one.
+        """
+        super().__init__((host, port), _Handler)
+        self.store = FakeStore(config or FakeStoreConfig(), self.url)
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeStoreServer":
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-store", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,282 @@
+"""API pipeline load benchmark.
+
+Starts the fake store (bench/fake_store.py), points the app at it and runs
+`process_product_images` and/or `process_all_products`, then reports
+throughput and latency percentiles, measured both by the app (event
+durations) and by the server (per endpoint):
+
+    python -m bench --products 500 --latency-ms 80 --scenario all
+    python -m bench --scenario product --product-runs 20 --set upload_concurrency=8
+    python -m bench --throttle-rate 0.05 --no-resize
+
+The catalog mirror, cleanup queue, run journal and download cache live in a temporary
+directory, so runs never touch the user's data. `--no-resize` copies images
+instead of resizing them, which isolates the network side (and works without
+ImageMagick).
+"""
+from __future__ import annotations
+
+import argparse
+import contextlib
+import io
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List
+
+from bench.fake_store import FakeStoreConfig, FakeStoreServer
+
+
+def percentile(values: List[float], share: float) -> float:
+    """The nearest-rank percentile of `values` (share in 0..1)."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(share * len(ordered)) - 1)]
+
+
+def latency_table(title: str, samples: Dict[str, List[float]]) -> str:
+    """A text table of count and p50/p90/p99/max per name; samples are in milliseconds."""
+    lines = [title, f"  {'name':<26} {'count':>7} {'p50 ms':>9} {'p90 ms':>9} {'p99 ms':>9} {'max ms':>9}"]
+    for name, values in sorted(samples.items()):
+        lines.append(
+            f"  {name:<26} {len(values):>7} {percentile(values, 0.5):>9.1f} {percentile(values, 0.9):>9.1f} "
+            f"{percentile(values, 0.99):>9.1f} {max(values):>9.1f}"
+        )
+    return "\n".join(lines)
+
+
+class EventCollector:
+    """Collects the duration and bytes of every app event during a scenario."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.durations: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+        self.bytes: Dict[str, int] = {}
+
+    def __call__(self, record: dict) -> None:
+        event = record.get("event")
+        with self.lock:
+            if "duration_ms" in record:
+                self.durations.setdefault(event, []).append(record["duration_ms"])
+            if "error" in record:
+                self.errors[event] = self.errors.get(event, 0) + 1
+            if isinstance(record.get("bytes"), int) and event in ("download", "upload"):
+                self.bytes[event] = self.bytes.get(event, 0) + record["bytes"]
+
+
+class CopyProcessor:
+    """Stands in for FileProcessor under --no-resize: copies the images to the output directory."""
+
+    def process_images(self, image_paths, output_directory, options, log, product=None, in_memory=False):
+        from utils.image_processing import EncodedImage
+
+        outputs = []
+        for path in image_paths:
+            target = os.path.join(output_directory, os.path.basename(path))
+            if in_memory:
+                with open(path, "rb") as source:
+                    outputs.append(EncodedImage(target, source.read()))
+                continue
+            shutil.copyfile(path, target)
+            outputs.append(target)
+        return outputs
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m bench", description="Benchmark the API pipeline offline.")
+    parser.add_argument("--scenario", choices=["product", "all", "both"], default="both")
+    parser.add_argument("--products", type=int, default=200, help="Catalog size.")
+    parser.add_argument("--images-per-product", type=int, default=3)
+    parser.add_argument("--image-kb", type=int, default=200, help="Size of every source image.")
+    parser.add_argument("--latency-ms", type=float, default=50.0, help="Added to every request.")
+    parser.add_argument("--jitter-ms", type=float, default=10.0)
+    parser.add_argument("--bandwidth-kbps", type=float, default=0.0, help="Per connection; 0 = unlimited.")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of API requests answered 500.")
+    parser.add_argument("--throttle-rate", type=float, default=0.0, help="Share of API requests answered 429.")
+    parser.add_argument("--retry-after", type=int, default=1, help="Retry-After of the 429 answers, in seconds.")
+    parser.add_argument("--processed-share", type=float, default=0.0, help="Share of products already up to date.")
+    parser.add_argument("--product-runs", type=int, default=10, help="Products processed one by one in 'product'.")
+    parser.add_argument("--no-resize", action="store_true", help="Copy images instead of resizing them.")
+    parser.add_argument("--no-cache", action="store_true", help="Disable the download cache.")
+    parser.add_argument(
+        "--set",
+        action="append",
+        default=[],
+        metavar="KEY=VALUE",
+        help="Override an app option, e.g. --set upload_concurrency=8 (JSON values).",
+    )
+    parser.add_argument("--json", metavar="PATH", help="Also write the results as JSON.")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own output.")
+    return parser
+
+
+def app_options(args) -> dict:
+    from cli import DEFAULT_OPTIONS
+
+    options = dict(DEFAULT_OPTIONS)
+    options["delete_images"] = True
+    for item in args.set:
+        key, _, value = item.partition("=")
+        try:
+            options[key] = json.loads(value)
+        except ValueError:
+            options[key] = value
+    return options
+
+
+def run_scenario(name, func, server, collector_factory, verbose):
+    """Run one scenario and return its measurements."""
+    from api import governor
+    from utils import events
+
+    collector = collector_factory()
+    events.subscribe(collector)
+    store = server.store
+    with store.lock:
+        store.timings.clear()
+        store.statuses.clear()
+    output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+    started = time.perf_counter()
+    try:
+        with output:
+            products = func()
+    finally:
+        events.unsubscribe(collector)
+    wall = time.perf_counter() - started
+    with store.lock:
+        server_ms = {endpoint: [s * 1000 for s in values] for endpoint, values in store.timings.items()}
+        statuses = dict(store.statuses)
+    images = len(collector.durations.get("upload", []))
+    return {
+        "scenario": name,
+        "wall_seconds": round(wall, 3),
+        "products": products,
+        "images_uploaded": images,
+        "products_per_second": round(products / wall, 3) if wall else 0.0,
+        "images_per_second": round(images / wall, 3) if wall else 0.0,
+        "mb_down": round(collector.bytes.get("download", 0) / 1024 / 1024, 2),
+        "mb_up": round(collector.bytes.get("upload", 0) / 1024 / 1024, 2),
+        "client_ms": collector.durations,
+        "client_errors": collector.errors,
+        "server_ms": server_ms,
+        "statuses": statuses,
+        "governor": governor.stats(),  # cumulative over the scenarios
+    }
+
+
+def report(result) -> str:
+    lines = [
+        f"== {result['scenario']} ==",
+        f"  wall {result['wall_seconds']:.2f}s, {result['products']} products ({result['products_per_second']:.2f}/s), "
+        f"{result['images_uploaded']} images uploaded ({result['images_per_second']:.2f}/s), "
+        f"{result['mb_down']} MB down, {result['mb_up']} MB up",
+        f"  HTTP statuses: {json.dumps(result['statuses'], sort_keys=True)}",
+    ]
+    if result["client_errors"]:
+        lines.append(f"  client errors: {json.dumps(result['client_errors'], sort_keys=True)}")
+    lines.append(latency_table("  app events:", result["client_ms"]))
+    lines.append(latency_table("  server endpoints:", result["server_ms"]))
+    return "\n".join(lines)
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    workdir = tempfile.mkdtemp(prefix="images_py-bench-")
+    # Keep the app's persistent state out of the user's directories; set before first use.
+    os.environ["IMAGE_PROCESSOR_CATALOG"] = os.path.join(workdir, "catalog.sqlite")
+    os.environ["IMAGE_PROCESSOR_CLEANUP_QUEUE"] = os.path.join(workdir, "media_cleanup.sqlite")
+    os.environ["IMAGE_PROCESSOR_RUN_JOURNAL"] = os.path.join(workdir, "runs.sqlite")
+    os.environ["IMAGE_PROCESSOR_DOWNLOAD_CACHE"] = "0" if args.no_cache else os.path.join(workdir, "sources")
+
+    from api import woocommerce_api
+    from cli import ConsoleLog
+    from utils import events
+
+    events.configure(None, enabled=False)
+    options = app_options(args)
+    hash_string = woocommerce_api.options_hash(options)
+    config = FakeStoreConfig(
+        products=args.products,
+        images_per_product=args.images_per_product,
+        image_kb=args.image_kb,
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        bandwidth_kbps=args.bandwidth_kbps,
+        error_rate=args.error_rate,
+        throttle_rate=args.throttle_rate,
+        retry_after=args.retry_after,
+        processed_share=args.processed_share,
+        processed_hash=hash_string,
+    )
+    server = FakeStoreServer(config).start()
+    credentials = {
+        "url": server.url,
+        "consumer_key": "ck_bench",
+        "consumer_secret": "cs_bench",
+        "username": "bench",
+        "password": "bench",
+    }
+    # Point the app at the fake store instead of the stored credentials.
+    woocommerce_api.load_credentials = lambda: credentials
+    if args.no_resize:
+        woocommerce_api.FileProcessor = CopyProcessor
+
+    log = ConsoleLog()
+    log.set_level("INFO" if args.verbose else "WARNING")
+    results = []
+    try:
+        if args.scenario in ("product", "both"):
+            product_ids = sorted(server.store.products)[: args.product_runs]
+
+            def single_products():
+                for product_id in product_ids:
+                    product = woocommerce_api.get_product(product_id)
+                    run_options = {**options, "log_message": log, "product": product, "product_id": product_id}
+                    woocommerce_api.process_product_images(run_options)
+                return len(product_ids)
+
+            results.append(run_scenario("product", single_products, server, EventCollector, args.verbose))
+
+        if args.scenario in ("all", "both"):
+
+            def processed():
+                with server.store.lock:
+                    return sum(
+                        1
+                        for product in server.store.products.values()
+                        for meta in product["meta_data"]
+                        if meta.get("key") == "_image_processed" and meta.get("value") == hash_string
+                    )
+
+            def all_products():
+                before = processed()
+                woocommerce_api.process_all_products({**options, "log_message": log})
+                return processed() - before
+
+            results.append(run_scenario("all-products", all_products, server, EventCollector, args.verbose))
+    finally:
+        server.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for result in results:
+        print(report(result))
+    from api import governor
+
+    summary = governor.summary()
+    if summary:
+        print(summary)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as handle:
+            json.dump(results, handle, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""
+Headless command line entry point for the Image Processor.
+
+Runs the same jobs as the desktop app without importing Tk, so it can be used
+from cron on a server:
+
+    python -m cli directory ./photos --dest ./out
+    python -m cli file ./photo.jpg --dest ./out --format WEBP
+    python -m cli product 1234
+    python -m cli all-products
+    python -m cli sync-catalog --full
+    python -m cli cleanup
+    python -m cli run jobs.json
+
+Options that are not given on the command line fall back to the options saved
+by the desktop app. A job file is a JSON list of objects with a "source"
+("directory", "file", "product", "all_products", "sync_catalog" or "cleanup") plus any option overrides,
+e.g. {"source": "directory", "selected_directory": "./photos", "destination_path": "./out"}.
+"""
+import argparse
+import json
+import logging
+import sys
+from datetime import datetime
+
+DEFAULT_OPTIONS = {
+    "canvas_width": 900,
+    "canvas_height": 900,
+    "template": "{slug}_{sku}_{width}x{height}",
+    "delete_images": False,
+    "background_color": "#000000",
+    "image_format": "AUTO",
+    "image_size": "contain",
+    "download_concurrency": 4,
+    "download_chunk_size": 256 * 1024,
+    "download_cache_mb": 2048,
+    "upload_concurrency": 4,
+    "pipeline_download_workers": 2,
+    "pipeline_process_workers": 1,
+    "pipeline_upload_workers": 2,
+    "pipeline_queue_size": 2,
+    "list_concurrency": 4,
+    "use_catalog": True,
+    "update_batch_size": 100,
+    "media_cleanup": "background",
+    "cleanup_concurrency": 2,
+    "http_rate_limit": 0,
+    "http_max_concurrency": 16,
+    "http_max_retries": 4,
+    "product_copy_dir": "",
+    "resume_runs": True,
+}
+
+SOURCES = ("directory", "file", "product", "all_products", "sync_catalog", "cleanup")
+
+
+class ConsoleLog:
+    """
+    Log sink with the LogWindow interface that writes to stderr.
+    """
+
+    def __init__(self, level=logging.INFO):
+        self.level = level
+
+    def set_level(self, level):
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+        if isinstance(level, int):
+            self.level = level
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def log_message(self, message, level=logging.INFO):
+        if level < self.level:
+            return
+        current_time = datetime.now().strftime("%H:%M:%S")
+        print(f"[{current_time}] {message}", file=sys.stderr, flush=True)
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="python -m cli", description="Headless Image Processor.")
+    parser.add_argument("--width", type=int, dest="canvas_width", help="Canvas width in pixels.")
+    parser.add_argument("--height", type=int, dest="canvas_height", help="Canvas height in pixels.")
+    parser.add_argument("--template", help="Filename template, e.g. '{name}_{width}x{height}'.")
+    parser.add_argument(
+        "--format",
+        dest="image_format",
+        choices=["AUTO", "JPEG", "PNG", "GIF", "DZI", "AVIF", "WEBP"],
+        help="Output image format.",
+    )
+    parser.add_argument("--size", dest="image_size", choices=["contain", "cover"], help="Image size mode.")
+    parser.add_argument("--background", dest="background_color", help="Background color or 'transparent'.")
+    parser.add_argument(
+        "--delete-images", dest="delete_images", action="store_true", default=None, help="Delete source images when done."
+    )
+    parser.add_argument(
+        "--download-concurrency", type=int, dest="download_concurrency", help="Parallel image downloads per product."
+    )
+    parser.add_argument(
+        "--download-chunk-size", type=int, dest="download_chunk_size", help="Streaming buffer size per download, in bytes."
+    )
+    parser.add_argument(
+        "--download-cache-mb", type=int, dest="download_cache_mb", help="Size of the source image cache in MB (0 disables it)."
+    )
+    parser.add_argument(
+        "--upload-concurrency", type=int, dest="upload_concurrency", help="Parallel media uploads per product."
+    )
+    parser.add_argument(
+        "--download-workers", type=int, dest="pipeline_download_workers", help="Products downloading at the same time (all-products)."
+    )
+    parser.add_argument(
+        "--process-workers", type=int, dest="pipeline_process_workers", help="Products being resized at the same time (all-products)."
+    )
+    parser.add_argument(
+        "--upload-workers", type=int, dest="pipeline_upload_workers", help="Products uploading at the same time (all-products)."
+    )
+    parser.add_argument(
+        "--queue-size", type=int, dest="pipeline_queue_size", help="Products waiting between pipeline stages (all-products)."
+    )
+    parser.add_argument(
+        "--list-concurrency", type=int, dest="list_concurrency", help="Product pages fetched at the same time."
+    )
+    parser.add_argument(
+        "--no-catalog",
+        dest="use_catalog",
+        action="store_false",
+        default=None,
+        help="List products from the API instead of the local catalog mirror.",
+    )
+    parser.add_argument(
+        "--update-batch-size", type=int, dest="update_batch_size", help="Product updates per batch request (max 100)."
+    )
+    parser.add_argument(
+        "--media-cleanup",
+        dest="media_cleanup",
+        choices=["background", "end_of_run", "deferred"],
+        help="When replaced images are deleted; 'deferred' leaves them for the cleanup command.",
+    )
+    parser.add_argument(
+        "--cleanup-concurrency", type=int, dest="cleanup_concurrency", help="Parallel media deletions."
+    )
+    parser.add_argument(
+        "--http-rate", type=float, dest="http_rate_limit", help="Requests per second per host (0 disables the limit)."
+    )
+    parser.add_argument(
+        "--http-max-concurrency", type=int, dest="http_max_concurrency", help="Ceiling of the adaptive per-host request limit."
+    )
+    parser.add_argument(
+        "--http-retries", type=int, dest="http_max_retries", help="Retries of throttled or failed requests."
+    )
+    parser.add_argument(
+        "--product-copy-dir",
+        dest="product_copy_dir",
+        help="Also write processed product images here; by default they are uploaded from memory.",
+    )
+    parser.add_argument(
+        "--no-resume",
+        dest="resume_runs",
+        action="store_false",
+        default=None,
+        help="Start all-products runs afresh instead of resuming an interrupted one.",
+    )
+    parser.add_argument("--log-level", default="INFO", choices=["DEBUG", "INFO", "WARNING", "ERROR"])
+    parser.add_argument("--timings", action="store_true", help="Print a per-stage timing summary at the end.")
+    parser.add_argument("--events", metavar="PATH", help="Write the JSONL event stream to PATH ('off' to disable).")
+
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    directory = subparsers.add_parser("directory", help="Process all images in a directory.")
+    directory.add_argument("selected_directory")
+    directory.add_argument("--dest", dest="destination_path", required=True, help="Output directory.")
+
+    single = subparsers.add_parser("file", help="Process a single image.")
+    single.add_argument("selected_file")
+    single.add_argument("--dest", dest="destination_path", required=True, help="Output directory.")
+
+    product = subparsers.add_parser("product", help="Process the images of one WooCommerce product.")
+    product.add_argument("product", help="Product ID, or a search term (the first match is used).")
+
+    subparsers.add_parser("all-products", help="Process the images of all WooCommerce products.")
+
+    catalog = subparsers.add_parser("sync-catalog", help="Update the local product catalog mirror.")
+    catalog.add_argument(
+        "--full", dest="catalog_full_sync", action="store_true", help="Re-list all products and drop deleted ones."
+    )
+
+    subparsers.add_parser("cleanup", help="Delete the replaced images still queued for deletion.")
+
+    run = subparsers.add_parser("run", help="Run the jobs in a JSON job file, in order.")
+    run.add_argument("job_file")
+
+    return parser
+
+
+def load_base_options(args):
+    """
+    Merge defaults, the options saved by the desktop app and command line overrides.
+    """
+    from config.encrypt_config import load_options
+
+    options = dict(DEFAULT_OPTIONS)
+    options.update({k: v for k, v in load_options().items() if k in DEFAULT_OPTIONS})
+    for key in DEFAULT_OPTIONS:
+        value = getattr(args, key, None)
+        if value is not None:
+            options[key] = value
+    return options
+
+
+def resolve_product(options, query):
+    """
+    Look up a product by ID or search term and store it in the options.
+
+    Returns:
+        bool: True if a product was found.
+    """
+    from api.woocommerce_api import get_product, search_product
+
+    query = str(query).strip()
+    if query.isdigit():
+        product = get_product(int(query))
+    else:
+        products = search_product(query, options.get("use_catalog", True))
+        product = products[0] if products else None
+    if not product or not product.get("id"):
+        return False
+    options["product"] = product
+    options["product_id"] = product["id"]
+    return True
+
+
+def get_target(source):
+    """
+    Get the processing function for a source, importing it on demand.
+    """
+    if source == "directory":
+        from utils.file_operations import FileProcessor
+
+        return FileProcessor().process_directory_with_logging
+    if source == "file":
+        from utils.file_operations import FileProcessor
+
+        return FileProcessor().proces_single_image
+    if source == "product":
+        from api.woocommerce_api import process_product_images
+
+        return process_product_images
+    if source == "all_products":
+        from api.woocommerce_api import process_all_products
+
+        return process_all_products
+    if source == "sync_catalog":
+        from api.woocommerce_api import sync_catalog
+
+        return sync_catalog
+    if source == "cleanup":
+        from api.woocommerce_api import run_media_cleanup
+
+        return run_media_cleanup
+    raise ValueError(f"Unknown source: {source}")
+
+
+def build_jobs(args, base_options):
+    """
+    Turn the parsed arguments into a list of (source, options) tuples.
+    """
+    if args.command == "run":
+        with open(args.job_file, encoding="utf-8") as job_file:
+            specs = json.load(job_file)
+        if isinstance(specs, dict):
+            specs = specs.get("jobs", [])
+        jobs = []
+        for spec in specs:
+            spec = dict(spec)
+            source = spec.pop("source", None)
+            if source not in SOURCES:
+                raise ValueError(f"Invalid job source: {source!r}")
+            options = dict(base_options)
+            options.update(spec)
+            jobs.append((source, options))
+        return jobs
+
+    options = dict(base_options)
+    source = args.command.replace("-", "_")
+    for key in ("selected_directory", "selected_file", "destination_path", "product", "catalog_full_sync"):
+        if getattr(args, key, None) is not None:
+            options[key] = getattr(args, key)
+    return [(source, options)]
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+
+    from utils import events
+    from utils.jobs import COMPLETED, JobExecutor
+    from utils.timing import timings
+
+    if args.events:
+        events.configure(None if args.events.lower() == "off" else args.events, enabled=args.events.lower() != "off")
+    if args.timings:
+        timings.enabled = True
+
+    log = ConsoleLog()
+    log.set_level(args.log_level)
+    base_options = load_base_options(args)
+    base_options["log_message"] = log
+
+    executor = JobExecutor(max_concurrent=1)
+    submitted = []
+    for source, options in build_jobs(args, base_options):
+        options["log_message"] = log
+        if source == "product" and not resolve_product(options, options.get("product")):
+            log.log_message(f"Product not found: {options.get('product')}", logging.ERROR)
+            continue
+        submitted.append(executor.submit(source, get_target(source), options))
+
+    exit_code = 0 if submitted else 1
+    try:
+        for job in submitted:
+            try:
+                job.result()
+            except Exception:
+                pass
+            log.log_message(f"Job #{job.id} ({job.name}) {job.state}")
+            if job.error is not None:
+                log.log_message(f"Job #{job.id} failed: {job.error}", logging.ERROR)
+            if job.state != COMPLETED:
+                exit_code = 1
+    except KeyboardInterrupt:
+        log.log_message("Interrupted, cancelling jobs...", logging.WARNING)
+        executor.cancel_all()
+        executor.shutdown(wait=True)
+        exit_code = 130
+    finally:
+        summary = timings.summary()
+        if summary:
+            print(summary, file=sys.stderr)
+        if args.timings and "api.governor" in sys.modules:
+            summary = sys.modules["api.governor"].summary()
+            if summary:
+                print(summary, file=sys.stderr)
+        events.flush()
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,14 +1,19 @@
 from __future__ import annotations
 
+import copy
 import json
 import os
 import sys
+import threading
 from pathlib import Path
 from typing import Any, Dict, List, Optional
 
 import platformdirs
-import keyring
-from cryptography.fernet import Fernet
+
+from utils.timing import timings
+
+# keyring and cryptography are imported on first use: they are slow to import and
+# headless runs that only read options never need them.
 
 
 APP_NAME = "Image Processor"
@@ -24,6 +29,27 @@ PERSISTED_OPTION_KEYS = {
     "background_color",
     "image_format",
     "image_size",
+    "preview_interval",
+    "log_level",
+    "collect_timings",
+    "download_concurrency",
+    "download_chunk_size",
+    "download_cache_mb",
+    "upload_concurrency",
+    "pipeline_download_workers",
+    "pipeline_process_workers",
+    "pipeline_upload_workers",
+    "pipeline_queue_size",
+    "list_concurrency",
+    "use_catalog",
+    "update_batch_size",
+    "media_cleanup",
+    "cleanup_concurrency",
+    "http_rate_limit",
+    "http_max_concurrency",
+    "http_max_retries",
+    "product_copy_dir",
+    "resume_runs",
     "destination_path",
     "selected_directory",
 }
@@ -31,6 +57,13 @@ PERSISTED_OPTION_KEYS = {
 # Legacy key used ONLY to decrypt an existing legacy ./config.enc and migrate it.
 LEGACY_FERNET_KEY = b"u4xTBY5Ns4WYdLvqMjEr138mpMmDEhhqTszKCcDy2cI="
 
+# Process-wide cache. Reading credentials means a keyring round-trip (and maybe a
+# Fernet decrypt), which is too slow to repeat for every API call of a run.
+# Saves go through the cache; call invalidate_config_cache() to pick up changes
+# made outside this process.
+_cache: Dict[str, Any] = {}
+_cache_lock = threading.RLock()
+
 
 def _config_dir() -> Path:
     path = Path(platformdirs.user_config_dir(APP_NAME, APP_AUTHOR))
@@ -74,22 +107,41 @@ def _legacy_candidates() -> List[Path]:
     return unique
 
 
+def _fernet(key: bytes):
+    from cryptography.fernet import Fernet
+
+    return Fernet(key)
+
+
 def _try_keyring_get(username: str) -> Optional[str]:
     try:
-        return keyring.get_password(KEYRING_SERVICE, username)
+        import keyring
+
+        with timings.measure("keyring_get"):
+            return keyring.get_password(KEYRING_SERVICE, username)
     except Exception:
         return None
 
 
 def _try_keyring_set(username: str, value: str) -> bool:
     try:
-        keyring.set_password(KEYRING_SERVICE, username, value)
+        import keyring
+
+        with timings.measure("keyring_set"):
+            keyring.set_password(KEYRING_SERVICE, username, value)
         return True
     except Exception:
         return False
 
 
 def _get_or_create_master_key() -> bytes:
+    with _cache_lock:
+        if "master_key" not in _cache:
+            _cache["master_key"] = _read_or_create_master_key()
+        return _cache["master_key"]
+
+
+def _read_or_create_master_key() -> bytes:
     # 1) Allow overriding in dev/CI
     env_key = os.environ.get("IMAGE_PROCESSOR_MASTER_KEY")
     if env_key:
@@ -111,6 +163,8 @@ def _get_or_create_master_key() -> bytes:
         except Exception:
             pass
 
+    from cryptography.fernet import Fernet
+
     new_key = Fernet.generate_key()
     if not _try_keyring_set("master_key", new_key.decode()):
         # best-effort file persistence
@@ -122,6 +176,13 @@ def _get_or_create_master_key() -> bytes:
 
 
 def _load_options() -> Dict[str, Any]:
+    with _cache_lock:
+        if "options" not in _cache:
+            _cache["options"] = _read_options()
+        return copy.deepcopy(_cache["options"])
+
+
+def _read_options() -> Dict[str, Any]:
     path = _options_path()
     if not path.exists():
         return {}
@@ -141,12 +202,26 @@ def _load_options() -> Dict[str, Any]:
         return {}
 
 
+def load_options() -> Dict[str, Any]:
+    """Saved processing options, without touching the keyring or the legacy migration."""
+    return _load_options()
+
+
 def _save_options(options: Dict[str, Any]) -> None:
     path = _options_path()
-    path.write_text(json.dumps(options, indent=2), encoding="utf-8")
+    with _cache_lock:
+        path.write_text(json.dumps(options, indent=2), encoding="utf-8")
+        _cache["options"] = copy.deepcopy(options)
 
 
 def _load_credentials_list() -> List[Dict[str, Any]]:
+    with _cache_lock:
+        if "credentials" not in _cache:
+            _cache["credentials"] = _read_credentials_list()
+        return copy.deepcopy(_cache["credentials"])
+
+
+def _read_credentials_list() -> List[Dict[str, Any]]:
     # Prefer keyring storage
     raw = _try_keyring_get("credentials_json")
     if raw:
@@ -160,8 +235,9 @@ def _load_credentials_list() -> List[Dict[str, Any]]:
     enc_path = _secrets_enc_path()
     if enc_path.exists():
         try:
-            f = Fernet(_get_or_create_master_key())
-            decrypted = f.decrypt(enc_path.read_bytes()).decode("utf-8")
+            f = _fernet(_get_or_create_master_key())
+            with timings.measure("credentials_decrypt"):
+                decrypted = f.decrypt(enc_path.read_bytes()).decode("utf-8")
             data = json.loads(decrypted)
             return data if isinstance(data, list) else []
         except Exception:
@@ -173,24 +249,47 @@ def _load_credentials_list() -> List[Dict[str, Any]]:
 def _save_credentials_list(credentials_list: List[Dict[str, Any]]) -> None:
     payload = json.dumps(credentials_list)
 
-    # Prefer keyring
-    if _try_keyring_set("credentials_json", payload):
-        return
+    with _cache_lock:
+        # Prefer keyring
+        if not _try_keyring_set("credentials_json", payload):
+            # Fallback: encrypted file
+            f = _fernet(_get_or_create_master_key())
+            enc = f.encrypt(payload.encode("utf-8"))
+            _secrets_enc_path().write_bytes(enc)
+        _cache["credentials"] = copy.deepcopy(credentials_list)
 
-    # Fallback: encrypted file
-    f = Fernet(_get_or_create_master_key())
-    enc = f.encrypt(payload.encode("utf-8"))
-    _secrets_enc_path().write_bytes(enc)
+
+def invalidate_config_cache() -> None:
+    """
+    Drop the cached options, credentials and master key so the next read goes to storage.
+
+    The legacy migration is not run again.
+    """
+    with _cache_lock:
+        migrated = _cache.get("migrated", False)
+        _cache.clear()
+        if migrated:
+            _cache["migrated"] = True
 
 
 def _migrate_legacy_config_if_present() -> None:
+    # Probing for a legacy file once per process is enough.
+    with _cache_lock:
+        if _cache.get("migrated"):
+            return
+        with timings.measure("config_migrate"):
+            _migrate_legacy_config()
+        _cache["migrated"] = True
+
+
+def _migrate_legacy_config() -> None:
     # One-time migration from legacy ./config.enc using LEGACY_FERNET_KEY.
     for legacy_path in _legacy_candidates():
         if not legacy_path.exists():
             continue
         try:
             encrypted_data = legacy_path.read_bytes()
-            decrypted_data = Fernet(LEGACY_FERNET_KEY).decrypt(encrypted_data).decode("utf-8")
+            decrypted_data = _fernet(LEGACY_FERNET_KEY).decrypt(encrypted_data).decode("utf-8")
             legacy_config = json.loads(decrypted_data)
         except Exception:
             continue
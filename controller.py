@@ -1,22 +1,40 @@
+import logging
 import tempfile
 import threading
 from utils.file_operations import FileProcessor
 from utils.image_processing import ImageProcessor
+from utils.preview_sampler import PreviewSampler
+from utils.timing import ENABLED_BY_ENV, timings
+from utils.metrics import metrics
+from utils.jobs import JobExecutor
+from utils.notifications import set_notifier
 from ui.options_window import OptionsWindow
-from config.encrypt_config import ConfigEncryptor
-from api.woocommerce_api import get_first_image
+from config.encrypt_config import ConfigEncryptor, load_options
 from PIL import Image, ImageTk
-
-# Enable AVIF support for Pillow previews when the optional plugin is installed.
-try:
-    import pillow_avif  # type: ignore
-except Exception:
-    pillow_avif = None
 from pprint import pformat
-from api.woocommerce_api import process_product_images, process_all_products, search_product, get_first_image_path, get_product
 import customtkinter as ctk
 import os
 
+_avif_previews = None
+
+
+def enable_avif_previews():
+    """
+    Enable AVIF support for Pillow previews when the optional plugin is installed.
+
+    Imported on the first preview instead of at startup.
+    """
+    global _avif_previews
+    if _avif_previews is None:
+        try:
+            import pillow_avif  # type: ignore  # noqa: F401
+
+            _avif_previews = True
+        except Exception:
+            _avif_previews = False
+    return _avif_previews
+
+
 class AppController:
     """
     The controller class for managing the overall state and interactions of the application.
@@ -36,6 +54,7 @@ class AppController:
         self.local_processing_tab = None
         self.settings_tab = None
         self.preview_bar = None
+        self.status_bar = None
         self.log = None
         self.canvas_width = 900
         self.canvas_height = 900
@@ -45,27 +64,106 @@ class AppController:
         self.background_color = "#000000"
         self.image_format = "AUTO"
         self.image_size = "contain"
-        self.config = ConfigEncryptor()
+        self.preview_interval = 500
+        self.preview_sampler = None
+        self.log_level = "INFO"
+        self.collect_timings = False
+        self.download_concurrency = 4
+        self.download_chunk_size = 256 * 1024
+        self.download_cache_mb = 2048
+        self.upload_concurrency = 4
+        self.pipeline_download_workers = 2
+        self.pipeline_process_workers = 1
+        self.pipeline_upload_workers = 2
+        self.pipeline_queue_size = 2
+        self.list_concurrency = 4
+        self.use_catalog = True
+        self.update_batch_size = 100
+        self.media_cleanup = "background"
+        self.cleanup_concurrency = 2
+        self.http_rate_limit = 0
+        self.http_max_concurrency = 16
+        self.http_max_retries = 4
+        self.product_copy_dir = ""
+        self.resume_runs = True
+        self._config = None
         self.type = None
         self.destination_path = None
         self.found_products = None
         self.selected_directory = None
         self.current_product = 0
         self.status = "stopped"
-        self.load_config()
+        self.jobs = JobExecutor(max_concurrent=1)
+        self.current_job = None
+        set_notifier(self.show_notification)
+
+    @property
+    def config(self):
+        """
+        The ConfigEncryptor, created on first use so the legacy migration and
+        keyring lookups stay out of startup.
+        """
+        if self._config is None:
+            self._config = ConfigEncryptor()
+        return self._config
 
     def load_config(self):
-        config = self.config.load_config()
-        if config:
-            if options := config.get("options"):
-                self.canvas_width = options.get("canvas_width", 900)
-                self.canvas_height = options.get("canvas_height", 900)
-                self.template = options.get("template", "{slug}_{sku}_{width}x{height}")
-                self.delete_images = options.get("delete_images", False)
-                self.transparent = options.get("transparent", True)
-                self.background_color = options.get("background_color", "#000000")
-                self.image_format = options.get("image_format", "AUTO")
-                self.image_size = options.get("image_size", "contain")
+        """
+        Load the saved options. Called once the main window is shown.
+        """
+        options = load_options()
+        if not options:
+            # First run or a legacy install: let ConfigEncryptor migrate, then read again.
+            options = (self.config.load_config() or {}).get("options")
+        if options:
+            self.canvas_width = options.get("canvas_width", 900)
+            self.canvas_height = options.get("canvas_height", 900)
+            self.template = options.get("template", "{slug}_{sku}_{width}x{height}")
+            self.delete_images = options.get("delete_images", False)
+            self.transparent = options.get("transparent", True)
+            self.background_color = options.get("background_color", "#000000")
+            self.image_format = options.get("image_format", "AUTO")
+            self.image_size = options.get("image_size", "contain")
+            self.preview_interval = options.get("preview_interval", 500)
+            self.log_level = options.get("log_level", "INFO")
+            self.collect_timings = options.get("collect_timings", False)
+            self.download_concurrency = options.get("download_concurrency", 4)
+            self.download_chunk_size = options.get("download_chunk_size", 256 * 1024)
+            self.download_cache_mb = options.get("download_cache_mb", 2048)
+            self.upload_concurrency = options.get("upload_concurrency", 4)
+            self.pipeline_download_workers = options.get("pipeline_download_workers", 2)
+            self.pipeline_process_workers = options.get("pipeline_process_workers", 1)
+            self.pipeline_upload_workers = options.get("pipeline_upload_workers", 2)
+            self.pipeline_queue_size = options.get("pipeline_queue_size", 2)
+            self.list_concurrency = options.get("list_concurrency", 4)
+            self.use_catalog = options.get("use_catalog", True)
+            self.update_batch_size = options.get("update_batch_size", 100)
+            self.media_cleanup = options.get("media_cleanup", "background")
+            self.cleanup_concurrency = options.get("cleanup_concurrency", 2)
+            self.http_rate_limit = options.get("http_rate_limit", 0)
+            self.http_max_concurrency = options.get("http_max_concurrency", 16)
+            self.http_max_retries = options.get("http_max_retries", 4)
+            self.product_copy_dir = options.get("product_copy_dir", "")
+            self.resume_runs = options.get("resume_runs", True)
+        if self.log:
+            self.log.set_level(self.log_level)
+
+    def show_notification(self, kind, title, message):
+        """
+        Show a notification from processing code as a messagebox on the Tk thread.
+
+        Args:
+            kind (str): "info", "warning" or "error".
+            title (str): The title.
+            message (str): The message.
+        """
+        from tkinter import messagebox
+
+        show = getattr(messagebox, f"show{kind}", messagebox.showinfo)
+        if threading.current_thread() is threading.main_thread():
+            show(title, message)
+        else:
+            self.root.after(0, lambda: show(title, message))
 
     def set_menu_bar(self, menu_bar):
         """
@@ -85,6 +183,7 @@ class AppController:
             menu_bar (MenuBar): The MenuBar instance.
         """
         self.log = log
+        self.log.set_level(self.log_level)
         self.log_message("Init Logs")
 
     def set_local_processing_tab(self, local_processing_tab):
@@ -117,6 +216,16 @@ class AppController:
         self.info_bar = info
         self.log_message("Init info")
 
+    def set_status_bar(self, status):
+        """
+        Set the StatusFrame for the application.
+
+        Args:
+            status (StatusFrame): The StatusFrame instance.
+        """
+        self.status_bar = status
+        self.log_message("Init status")
+
     def set_settings_tab(self, settings_tab):
         """
         Set the SettingsTab for the application.
@@ -141,6 +250,7 @@ class AppController:
         """
         if self.settings_tab:
             self.log_message("Show settings tab")
+            self.settings_tab.ensure_loaded()
             self.settings_tab.tab.tkraise()  # Make sure to raise the correct tab frame
 
     def show_local_processing_options(self):
@@ -151,57 +261,114 @@ class AppController:
             self.log_message("Open options")
             self.open_options_window()
 
-    def log_message(self, obj):
+    def log_message(self, obj, level=logging.INFO):
         """
-        Log a formatted message to the log window using pprint.
+        Log a message to the log window, formatting non-string objects using pprint.
 
         Args:
             obj (object): The object to format and log.
+            level (int, optional): The logging level. Defaults to logging.INFO.
         """
-        if self.log:
-            formatted_message = pformat(obj)
-            self.log.log_message(formatted_message)
-
-    import threading
+        if self.log and self.log.is_enabled_for(level):
+            formatted_message = obj if isinstance(obj, str) else pformat(obj)
+            self.log.log_message(formatted_message, level)
 
     def start_processing(self):
         """
         Start the image processing based on the selected options.
+
+        While a job is running the start button acts as a stop button.
         """
+        if self.status != "stopped":
+            self.cancel_processing()
+            return
+
+        from api.woocommerce_api import process_all_products, process_product_images
+
         source = self.type
+        targets = {
+            "directory": self.file.process_directory_with_logging,
+            "product": process_product_images,
+            "file": self.file.proces_single_image,
+            "all_products": process_all_products,
+        }
+        target_func = targets.get(source)
+        if not target_func:
+            self.log_message(f"Nothing to process for source: {source}")
+            return
+
         options = self.get_options()
         self.log_message(f"Start import source: {source}")
         self.status = "started"
-        self.menu_bar.start_button.configure(fg_color="red", text="Running")
-
-        # Wrapper to process and update status after completion
-        def process_and_update_status(target_func, *args):
-            try:
-                # Execute the actual processing function
-                target_func(*args)
-            finally:
-                # Update status to 'stopped' after processing is done
-                self.status = "stopped"
-                self.menu_bar.start_button.configure(fg_color="#008000", text="Start")
-                self.log_message(f"Processing completed for source: {source}")
-
-        if source == "directory":
-            threading.Thread(
-                target=process_and_update_status, args=(self.file.process_directory_with_logging, options)
-            ).start()
-        elif source == "product":
-            threading.Thread(
-                target=process_and_update_status, args=(process_product_images, options)
-            ).start()
-        elif source == "file":
-            threading.Thread(
-                target=process_and_update_status, args=(self.file.proces_single_image, options)
-            ).start()
-        elif source == "all_products":
-            threading.Thread(
-                target=process_and_update_status, args=(process_all_products, options)
-        ).start()
+        self.menu_bar.start_button.configure(fg_color="red", text="Stop")
+        self.menu_bar.pause_button.configure(state="normal", text="Pause")
+        self.preview_sampler = PreviewSampler(self.preview_interval)
+        options["preview_sampler"] = self.preview_sampler
+        timings.enabled = self.collect_timings or ENABLED_BY_ENV
+        timings.reset()
+        metrics.start()
+
+        job = self.jobs.submit(source, target_func, options)
+        self.current_job = job
+        self.log_message(f"Job #{job.id} queued", logging.DEBUG)
+        job.future.add_done_callback(lambda _future: self.root.after(0, self.on_job_finished, job))
+        self.poll_preview_samples()
+        self.poll_status()
 
+    def on_job_finished(self, job):
+        """
+        Reset the UI after a job has finished. Runs on the Tk thread.
+
+        Args:
+            job (Job): The finished job.
+        """
+        if job is not self.current_job:
+            return
+        self.status = "stopped"
+        self.current_job = None
+        self.reset_run_buttons()
+        self.log_message(f"Processing {job.state} for source: {job.name}")
+        if job.error is not None:
+            self.log_message(f"Job #{job.id} failed: {job.error}", logging.ERROR)
+        summary = timings.summary()
+        if summary:
+            print(summary)
+            self.log_message(summary)
+
+    def cancel_processing(self):
+        """
+        Ask the running job to stop at its next checkpoint.
+        """
+        job = self.current_job
+        if job and not job.token.cancelled:
+            job.cancel()
+            self.status = "cancelling"
+            self.log_message("Cancelling, waiting for in-flight work to finish...")
+            self.menu_bar.start_button.configure(text="Stopping")
+            self.menu_bar.pause_button.configure(state="disabled", text="Pause")
+
+    def toggle_pause(self):
+        """
+        Pause or resume the running job at its next checkpoint.
+        """
+        job = self.current_job
+        if not job or self.status != "started":
+            return
+        if job.token.paused:
+            job.resume()
+            self.log_message("Resumed")
+            self.menu_bar.pause_button.configure(text="Pause")
+        else:
+            job.pause()
+            self.log_message("Paused after the current step")
+            self.menu_bar.pause_button.configure(text="Resume")
+
+    def reset_run_buttons(self):
+        """
+        Put the start and pause buttons back into their idle state.
+        """
+        self.menu_bar.start_button.configure(fg_color="#008000", text="Start")
+        self.menu_bar.pause_button.configure(state="disabled", text="Pause")
 
     def update_options(self, text=None):
         """
@@ -233,6 +400,57 @@ class AppController:
              
         self.update_previews()
 
+    def poll_preview_samples(self):
+        """
+        Show the latest batch preview sample, then reschedule while a run is active.
+
+        Runs on the Tk thread; workers only hand over thumbnails through the sampler.
+        """
+        sampler = self.preview_sampler
+        if sampler is None:
+            return
+        sample = sampler.take()
+        if sample:
+            self.show_preview_sample(sample)
+        if self.status != "stopped":
+            self.root.after(max(int(sampler.interval * 1000), 50), self.poll_preview_samples)
+        else:
+            self.preview_sampler = None
+
+    def poll_status(self):
+        """
+        Refresh the status panel from the aggregated run metrics at a fixed rate.
+        """
+        if not self.status_bar:
+            return
+        running = self.status != "stopped"
+        self.status_bar.update(metrics.snapshot(), running)
+        if running:
+            self.root.after(1000, self.poll_status)
+
+    def show_preview_sample(self, sample):
+        """
+        Display a PreviewSample in the preview bar.
+
+        Args:
+            sample (PreviewSample): The sample taken from the PreviewSampler.
+        """
+        for thumb, name, image_label, filename_label in (
+            (sample.before, sample.before_name, self.preview_bar.before_image_label, self.preview_bar.before_filename_label),
+            (sample.after, sample.after_name, self.preview_bar.after_image_label, self.preview_bar.after_filename_label),
+        ):
+            if not thumb:
+                continue
+            width, height, pixels = thumb
+            photo = ImageTk.PhotoImage(Image.frombytes("RGBA", (width, height), pixels))
+            image_label.configure(image=photo)
+            image_label.image = photo
+            if name:
+                file_name = os.path.basename(name)
+                if len(file_name) > 35:
+                    file_name = f"...{file_name[-35:]}"
+                filename_label.configure(text=file_name)
+
     def update_previews(self, before_path=None, after_path=None):
         """
         Update the image previews.
@@ -242,17 +460,24 @@ class AppController:
             after_path (str, optional): The path to the 'after' image.
         """
         first_image_path = False
-        if self.status != "started":
+        if self.status == "stopped":
             if self.type == "all_products":
-                first_image_path = get_first_image()
+                from api.woocommerce_api import get_first_image
+
+                first_image_path = get_first_image(self.use_catalog)
                 
             elif self.type == "product" and self.found_products:
+                from api.woocommerce_api import get_first_image_path
+
                 first_image_path = get_first_image_path(self.found_products[self.current_product])
             else:
             
                 print("getting first path")
                 first_image_path = self.file.get_first_image_path()
 
+        if before_path or after_path or first_image_path:
+            enable_avif_previews()
+
         if before_path :
             before_img = Image.open(before_path)
             before_img.thumbnail((200, 200))
@@ -310,6 +535,7 @@ class AppController:
             image_path (str): The path to the image file.
             label (ctk.CTkLabel): The label to set the image on.
         """
+        enable_avif_previews()
         img = Image.open(image_path)
         img.thumbnail((150, 150))
         photo = ImageTk.PhotoImage(img)
@@ -391,7 +617,6 @@ class AppController:
             "canvas_height": self.canvas_height,
             "log_message": self.log,  # Use the log method from the log_window
             "format_log_message": self.log_message,
-            "update_previews": self.update_previews,
             "product_id": product_id,
             "product": product,
             "template": self.template,
@@ -399,6 +624,27 @@ class AppController:
             "background_color": self.background_color,
             "image_format": self.image_format,
             "image_size": self.image_size,
+            "preview_interval": self.preview_interval,
+            "log_level": self.log_level,
+            "collect_timings": self.collect_timings,
+            "download_concurrency": self.download_concurrency,
+            "download_chunk_size": self.download_chunk_size,
+            "download_cache_mb": self.download_cache_mb,
+            "upload_concurrency": self.upload_concurrency,
+            "pipeline_download_workers": self.pipeline_download_workers,
+            "pipeline_process_workers": self.pipeline_process_workers,
+            "pipeline_upload_workers": self.pipeline_upload_workers,
+            "pipeline_queue_size": self.pipeline_queue_size,
+            "list_concurrency": self.list_concurrency,
+            "use_catalog": self.use_catalog,
+            "update_batch_size": self.update_batch_size,
+            "media_cleanup": self.media_cleanup,
+            "cleanup_concurrency": self.cleanup_concurrency,
+            "http_rate_limit": self.http_rate_limit,
+            "http_max_concurrency": self.http_max_concurrency,
+            "http_max_retries": self.http_max_retries,
+            "product_copy_dir": self.product_copy_dir,
+            "resume_runs": self.resume_runs,
             "selected_directory": self.selected_directory,
             "destination_path" : self.destination_path
         }
@@ -450,6 +696,87 @@ class AppController:
                 "options": ["contain", "cover"],
                 "default": self.image_size,
             },
+            "preview_interval": {
+                "type": "number",
+                "label": "Preview interval (ms):",
+                "default": self.preview_interval,
+                "min": 100,
+                "max": 60000,
+            },
+            "log_level": {
+                "type": "dropdown",
+                "label": "Log Level:",
+                "options": ["INFO", "DEBUG"],
+                "default": self.log_level,
+            },
+            "collect_timings": {
+                "type": "checkbox",
+                "label": "Collect stage timings",
+                "default": self.collect_timings,
+            },
+            "download_concurrency": {
+                "type": "number",
+                "label": "Parallel downloads:",
+                "default": self.download_concurrency,
+                "min": 1,
+                "max": 16,
+            },
+            "download_cache_mb": {
+                "type": "number",
+                "label": "Download cache (MB, 0 = off):",
+                "default": self.download_cache_mb,
+                "min": 0,
+                "max": 100000,
+            },
+            "upload_concurrency": {
+                "type": "number",
+                "label": "Parallel uploads:",
+                "default": self.upload_concurrency,
+                "min": 1,
+                "max": 16,
+            },
+            "pipeline_process_workers": {
+                "type": "number",
+                "label": "Image processing workers:",
+                "default": self.pipeline_process_workers,
+                "min": 1,
+                "max": 16,
+            },
+            "use_catalog": {
+                "type": "checkbox",
+                "label": "Use local product catalog",
+                "default": self.use_catalog,
+            },
+            "resume_runs": {
+                "type": "checkbox",
+                "label": "Resume interrupted runs",
+                "default": self.resume_runs,
+            },
+            "media_cleanup": {
+                "type": "dropdown",
+                "label": "Delete old images:",
+                "options": ["background", "end_of_run", "deferred"],
+                "default": self.media_cleanup,
+            },
+            "http_rate_limit": {
+                "type": "number",
+                "label": "Requests per second per host (0 = off):",
+                "default": self.http_rate_limit,
+                "min": 0,
+                "max": 1000,
+            },
+            "http_max_concurrency": {
+                "type": "number",
+                "label": "Max requests in flight per host:",
+                "default": self.http_max_concurrency,
+                "min": 1,
+                "max": 64,
+            },
+            "product_copy_dir": {
+                "type": "text",
+                "label": "Keep product images in (empty = none):",
+                "default": self.product_copy_dir,
+            },
         }
 
         OptionsWindow(self.root, self.apply_options, current_options)
@@ -470,6 +797,21 @@ class AppController:
         self.background_color = options["background_color"]
         self.image_size = options["image_size"]
         self.image_format = options["image_format"]
+        self.preview_interval = options["preview_interval"]
+        self.log_level = options["log_level"]
+        self.collect_timings = options["collect_timings"]
+        self.download_concurrency = options["download_concurrency"]
+        self.download_cache_mb = options["download_cache_mb"]
+        self.upload_concurrency = options["upload_concurrency"]
+        self.pipeline_process_workers = options["pipeline_process_workers"]
+        self.use_catalog = options["use_catalog"]
+        self.resume_runs = options["resume_runs"]
+        self.media_cleanup = options["media_cleanup"]
+        self.http_rate_limit = options["http_rate_limit"]
+        self.http_max_concurrency = options["http_max_concurrency"]
+        self.product_copy_dir = options["product_copy_dir"].strip()
+        if self.log:
+            self.log.set_level(self.log_level)
         self.apply_canvas_size()
         self.apply_background_color()
         self.apply_image_size()
@@ -477,6 +819,8 @@ class AppController:
         self.update_previews()
 
     def process_product(self, input):
+        from api.woocommerce_api import get_product, search_product
+
         cleaned_input = (input or "").strip()
         self.found_products = None
         self.current_product = 0
@@ -486,7 +830,7 @@ class AppController:
             if product:
                 self.found_products = [product]
         else:
-            self.found_products = search_product(cleaned_input)
+            self.found_products = search_product(cleaned_input, self.use_catalog)
 
         if self.found_products:
             count_products = len(self.found_products)
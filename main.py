@@ -1,10 +1,24 @@
 """
 Main module for the Image Processor application.
+
+    python main.py --profile-startup      print per-module import and init times
+    python main.py --startup-budget 2.5   exit 1 if the window takes longer to show
+
+The profile can also be enabled with IMAGE_PROCESSOR_PROFILE_STARTUP=1.
 """
-from PIL import Image, ImageTk
-import customtkinter as ctk
+import argparse
 import os
 import sys
+
+from utils.startup_profile import profiler
+
+if "--profile-startup" in sys.argv or "--startup-budget" in sys.argv or os.environ.get(
+    "IMAGE_PROCESSOR_PROFILE_STARTUP", ""
+).strip().lower() in ("1", "on", "true", "yes"):
+    profiler.install()
+
+from PIL import Image, ImageTk
+import customtkinter as ctk
 from ui.menu import MenuBar  # Import the new MenuBar class
 from ui.log_frame import LogWindow
 from ui.button_frame import ButtonFrame
@@ -13,6 +27,7 @@ from ui.settings_tab import SettingsTab
 from controller import AppController
 
 from ui.preview_frame import PreviewFrame  # Import the new PreviewFrame class
+from ui.status_frame import StatusFrame
 
 
 def resource_path(relative_path: str) -> str:
@@ -32,14 +47,16 @@ class ImageProcessorApp:
 
 
 
-    def __init__(self, root):
+    def __init__(self, root, on_started=None):
         """
         Initialize the ImageProcessorApp.
 
         Args:
             root (ctk.CTk): The root CustomTkinter window.
+            on_started (callable, optional): Called with the app once the window is shown and the first preview rendered.
         """
         self.root = root
+        self.on_started = on_started
         self.root.title("Image Processor")
         self.root.geometry("553x800")
 
@@ -61,8 +78,20 @@ class ImageProcessorApp:
             pass
 
         # Initialize the controller
-        self.controller = AppController(self.root)
+        with profiler.phase("controller"):
+            self.controller = AppController(self.root)
 
+        with profiler.phase("ui"):
+            self.build_ui()
+
+        # Saved options and the first preview are loaded once the window is up;
+        # the credentials when the settings tab is first opened.
+        self.root.after_idle(self.on_ui_shown)
+
+    def build_ui(self):
+        """
+        Create the menu bar, frames and tabs.
+        """
         # Create the menu bar
         self.menu_bar = MenuBar(self.root, self.controller)
 
@@ -82,7 +111,7 @@ class ImageProcessorApp:
 
         # Log Frame (appears at the bottom)
         self.log_frame = ctk.CTkFrame(self.master_main_frame)
-        self.log_frame.grid(row=3, column=0, sticky="ew")  # Set sticky to "ew" to expand horizontally
+        self.log_frame.grid(row=4, column=0, sticky="ew")  # Set sticky to "ew" to expand horizontally
         self.log_frame.grid_columnconfigure(0, weight=1)
         self.log_window = LogWindow(self.log_frame)
         self.controller.set_log(self.log_window)
@@ -104,6 +133,12 @@ class ImageProcessorApp:
         self.preview_frame.grid_columnconfigure(0, weight=1)
         self.preview_frame = PreviewFrame(self.preview_frame)  # Initialize the PreviewFrame
 
+        # Status Frame (live throughput and ETA)
+        self.status_frame = ctk.CTkFrame(self.master_main_frame)
+        self.status_frame.grid(row=3, column=0, sticky="ew")
+        self.status_frame.grid_columnconfigure(0, weight=1)
+        self.status_frame = StatusFrame(self.status_frame)
+
         
 
         # Settings Tab
@@ -114,15 +149,28 @@ class ImageProcessorApp:
         self.controller.set_settings_tab(self.settings_tab)
         self.controller.set_preview_bar(self.preview_frame)
         self.controller.set_info_bar(self.info_frame)
+        self.controller.set_status_bar(self.status_frame)
         self.controller.set_menu_bar( self.menu_bar)
         # Position the tabs
         self.master_main_frame.grid(row=0, column=0, sticky="nsew")  # Make sure master_main_frame expands
         self.settings_tab.tab.grid(row=0, column=0, sticky="nsew")
 
         # Show the default tab (Local Processing Tab)
-        self.controller.update_options()
         self.open_local_processing_tab()
 
+    def on_ui_shown(self):
+        """
+        Load the saved options and render the first preview.
+        """
+        with profiler.phase("first_paint"):
+            self.root.update_idletasks()
+        with profiler.phase("load_config"):
+            self.controller.load_config()
+        with profiler.phase("first_preview"):
+            self.controller.update_options()
+        if self.on_started:
+            self.on_started(self)
+
     def open_local_processing_tab(self):
         """
         Show the Local Processing tab.
@@ -139,7 +187,7 @@ class ImageProcessorApp:
         """
         Show the Settings tab.
         """
-        self.settings_tab.tab.tkraise()
+        self.controller.show_settings_tab()
 
     def run(self):
         """
@@ -150,9 +198,47 @@ class ImageProcessorApp:
         
 
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Image Processor.")
+    parser.add_argument(
+        "--profile-startup", action="store_true", help="Print per-module import and init times once the window is shown."
+    )
+    parser.add_argument(
+        "--startup-budget",
+        type=float,
+        metavar="SECONDS",
+        help="Start, show the window and exit; exit code 1 if that took longer than SECONDS.",
+    )
+    args, _ = parser.parse_known_args(argv)
+    return args
+
+
+def report_startup(app, args):
+    """
+    Print the startup profile and enforce the budget, if requested.
+    """
+    elapsed = profiler.elapsed()
+    if profiler.enabled:
+        report = profiler.report()
+        print(report, file=sys.stderr)
+        profiler.uninstall()
+        if app.controller.log:
+            app.controller.log_message(f"Startup took {elapsed * 1000:.0f} ms")
+    if args.startup_budget is not None:
+        within_budget = elapsed <= args.startup_budget
+        print(
+            f"Startup {elapsed:.2f}s, budget {args.startup_budget:.2f}s: {'ok' if within_budget else 'exceeded'}",
+            file=sys.stderr,
+        )
+        app.root.destroy()
+        sys.exit(0 if within_budget else 1)
+
+
 if __name__ == "__main__":
-    root = ctk.CTk()
-    ctk.set_appearance_mode("dark")
-    ctk.set_default_color_theme("blue")
-    app = ImageProcessorApp(root)
+    args = parse_args()
+    with profiler.phase("window"):
+        root = ctk.CTk()
+        ctk.set_appearance_mode("dark")
+        ctk.set_default_color_theme("blue")
+    app = ImageProcessorApp(root, on_started=lambda started: report_startup(started, args))
     app.run()
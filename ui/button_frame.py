@@ -83,7 +83,7 @@ class ButtonFrame:
         Set the clicked button to green and the rest to gray for a specific button store.
         Also update the description and input fields based on the active button.
         """
-        if self.controller.status != "started":
+        if self.controller.status == "stopped":
             for label, button in button_store.items():
                 if label == active_label:
                     self.controller.update_options(active_label)
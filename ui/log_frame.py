@@ -1,7 +1,29 @@
+import logging
+import queue
+from collections import deque
+
 import customtkinter as ctk
 from datetime import datetime
 class LogWindow:
-    def __init__(self, parent):
+    def __init__(self, parent, level=logging.INFO, max_lines=1000, flush_interval=100):
+        """
+        Initialize the LogWindow.
+
+        Messages may be logged from any thread; they are queued and written to the
+        textbox in bulk on the Tk thread every `flush_interval` milliseconds.
+
+        Args:
+            parent (ctk.CTkFrame): The parent frame.
+            level (int): The minimum logging level that is shown.
+            max_lines (int): The maximum number of lines kept in the textbox.
+            flush_interval (int): Milliseconds between two queue drains.
+        """
+        self.level = level
+        self.max_lines = max_lines
+        self.flush_interval = flush_interval
+        self._queue = queue.SimpleQueue()
+        self._line_count = 0
+
         self.frame = ctk.CTkFrame(parent)
         self.frame.pack(expand=True, fill="both")
 
@@ -12,28 +34,69 @@ class LogWindow:
         self.scrollbar.pack(side="right", fill="y")
 
         self.log_text.configure(yscrollcommand=self.scrollbar.set)
+        self.frame.after(self.flush_interval, self.flush)
+
+    def set_level(self, level):
+        """
+        Set the minimum logging level.
 
-    def log_message(self, message):
+        Args:
+            level (int | str): A logging level such as logging.DEBUG or "DEBUG".
         """
-        Log a message to the log window with the current timestamp.
+        if isinstance(level, str):
+            level = logging.getLevelName(level.upper())
+        if isinstance(level, int):
+            self.level = level
+
+    def is_enabled_for(self, level):
+        return level >= self.level
+
+    def log_message(self, message, level=logging.INFO):
+        """
+        Queue a message for the log window with the current timestamp.
+
+        Safe to call from worker threads; messages below the current level are dropped.
         """
+        if level < self.level:
+            return
         # Get the current time in the desired format (e.g., HH:MM:SS)
         current_time = datetime.now().strftime("%H:%M:%S")
-        
+
         # Prepend the current time to the message
-        full_message = f"[{current_time}] {message}"
+        self._queue.put(f"[{current_time}] {message}")
+
+    def flush(self):
+        """
+        Drain the queue into the textbox and reschedule. Runs on the Tk thread.
+        """
+        # Anything that would be trimmed straight away is never inserted.
+        lines = deque(maxlen=self.max_lines)
+        try:
+            while True:
+                lines.append(self._queue.get_nowait())
+        except queue.Empty:
+            pass
+        if lines:
+            self._write(lines)
+        self.frame.after(self.flush_interval, self.flush)
 
-        # Log the message
+    def _write(self, lines):
+        chunk = "\n".join(lines) + "\n"
         self.log_text.configure(state="normal")
-        self.log_text.insert(ctk.END, full_message + "\n")
+        self.log_text.insert(ctk.END, chunk)
+        self._line_count += chunk.count("\n")
+        excess = self._line_count - self.max_lines
+        if excess > 0:
+            self.log_text.delete("1.0", f"{excess + 1}.0")
+            self._line_count -= excess
         self.log_text.see(ctk.END)
         self.log_text.configure(state="disabled")
-        self.log_text.update_idletasks()
 
     def clear(self):
         self.log_text.configure(state="normal")
         self.log_text.delete('1.0', ctk.END)
         self.log_text.configure(state="disabled")
+        self._line_count = 0
 
 # Example usage
 if __name__ == "__main__":
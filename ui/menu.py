@@ -69,6 +69,16 @@ class MenuBar:
             icon_size,
             side="right",
         )
+        self.pause_button = self.create_menu_button(
+            None,
+            "#363636",
+            "Pause",
+            self.controller.toggle_pause,
+            button_width,
+            icon_size,
+            side="right",
+        )
+        self.pause_button.configure(state="disabled")
     
 
     def create_menu_button(
@@ -78,7 +88,7 @@ class MenuBar:
         Create a button with an icon for the menu.
 
         Args:
-            icon_path (str): Path to the icon.
+            icon_path (str): Path to the icon, or None for a text-only button.
             command (callable): The function to call when the button is pressed.
             button_width (int): The width of the button.
             icon_size (int): The size of the icon.
@@ -100,4 +110,14 @@ class MenuBar:
                 width=button_width,
             )
             button.pack(side=side, padx=5, pady=5)
-            return button  
\ No newline at end of file
+            return button
+
+        button = ctk.CTkButton(
+            self.menu_frame,
+            text=text,
+            fg_color=bg_color,
+            command=command,
+            width=button_width,
+        )
+        button.pack(side=side, padx=5, pady=5)
+        return button  
\ No newline at end of file
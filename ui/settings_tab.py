@@ -1,8 +1,5 @@
 import customtkinter as ctk
-from api.woocommerce_api import (
-    load_credentials,
-)
-from config.encrypt_config import ConfigEncryptor
+from config.encrypt_config import ConfigEncryptor, invalidate_config_cache
 from tkinter import messagebox
 from PIL import Image, ImageTk
 
@@ -27,20 +24,30 @@ class SettingsTab:
     def __init__(self, tab_parent, controller):
         self.tab = ctk.CTkFrame(tab_parent)
         self.tab.grid(row=0, column=0, sticky="nsew")
-         # Initialize an instance of ConfigEncryptor
+        self.config_encryptor = None
+        self.credentials_list = []
+        self.active_credential_set = {'nice_name': "Default"}
+        self.inputs = {}
+        self.loaded = False
+
+    def ensure_loaded(self):
+        """
+        Load the credentials and build the form the first time the tab is shown.
+
+        Reading credentials goes through the keyring (and the one-time legacy
+        migration), which is too slow to do while the main window starts up.
+        """
+        if self.loaded:
+            return
+        self.loaded = True
+        # Initialize an instance of ConfigEncryptor
         self.config_encryptor = ConfigEncryptor()  # per-user storage + legacy migration
         config = self.config_encryptor.load_config()
-        self.credentials_list = []
         if config:
-            self.credentials_list = self.config_encryptor.load_config().get('credentials') 
+            self.credentials_list = config.get('credentials') or []
             self.active_credential_set = (
                 self.get_active_credential_set()
-            )  # Fetch active credentials
-        else:
-            self.active_credential_set = {
-                'nice_name': "Default"
-            }
-        self.inputs = {}
+            ) or {'nice_name': "Default"}  # Fetch active credentials
         self.setup_ui()
 
     def get_active_credential_set(self):
@@ -247,6 +254,7 @@ class SettingsTab:
         ConfigEncryptor().save_credentials(credentials)
 
         # Reload from storage to avoid duplicates and to reflect the active flag updates.
+        invalidate_config_cache()
         config = ConfigEncryptor().load_config() or {}
         self.credentials_list = config.get("credentials", []) or []
         self.credential_dropdown.configure(
@@ -278,6 +286,7 @@ class SettingsTab:
 
         # Save updated credentials list to storage
         ConfigEncryptor().delete_credentials(selected_name)
+        invalidate_config_cache()
 
         # Update the dropdown and form after deletion
         if self.credentials_list:
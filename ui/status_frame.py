@@ -0,0 +1,87 @@
+import customtkinter as ctk
+
+
+def format_duration(seconds):
+    """
+    Format a number of seconds as H:MM:SS, or a dash when unknown.
+    """
+    if seconds is None:
+        return "-"
+    seconds = int(seconds)
+    hours, remainder = divmod(seconds, 3600)
+    minutes, seconds = divmod(remainder, 60)
+    return f"{hours}:{minutes:02d}:{seconds:02d}"
+
+
+class StatusFrame:
+    """
+    Class to show live throughput, queue depths and ETA of the running job.
+    """
+
+    def __init__(self, parent):
+        """
+        Initialize the StatusFrame.
+
+        Args:
+            parent (ctk.CTkFrame): The parent frame where the status panel will be placed.
+        """
+        self.parent = parent
+        self.setup_ui()
+
+    def setup_ui(self):
+        """
+        Set up the labels of the status panel.
+        """
+        self.progress_label = ctk.CTkLabel(self.parent, text="Idle", font=("Helvetica", 12, "bold"))
+        self.progress_label.grid(row=0, column=0, padx=5, pady=(5, 0), sticky="w")
+
+        self.eta_label = ctk.CTkLabel(self.parent, text="")
+        self.eta_label.grid(row=0, column=1, padx=5, pady=(5, 0), sticky="e")
+
+        self.throughput_label = ctk.CTkLabel(self.parent, text="", font=("Helvetica", 10))
+        self.throughput_label.grid(row=1, column=0, columnspan=2, padx=5, sticky="w")
+
+        self.pipeline_label = ctk.CTkLabel(self.parent, text="", font=("Helvetica", 10))
+        self.pipeline_label.grid(row=2, column=0, columnspan=2, padx=5, pady=(0, 5), sticky="w")
+
+    def update(self, snapshot, running=True):
+        """
+        Show a MetricsSnapshot.
+
+        Args:
+            snapshot (MetricsSnapshot): The aggregated counters to display.
+            running (bool): Whether the job is still running.
+        """
+        total = snapshot.images_total or "?"
+        state = "Running" if running else "Finished"
+        text = f"{state}: {snapshot.images_done}/{total} images"
+        if snapshot.errors:
+            text += f", {snapshot.errors} errors"
+        self.progress_label.configure(text=text)
+
+        if running:
+            self.eta_label.configure(
+                text=f"Elapsed {format_duration(snapshot.elapsed)}  ETA {format_duration(snapshot.eta_seconds)}"
+            )
+        else:
+            self.eta_label.configure(text=f"Elapsed {format_duration(snapshot.elapsed)}")
+
+        self.throughput_label.configure(
+            text=(
+                f"{snapshot.images_per_second:.1f} img/s   "
+                f"in {snapshot.mb_in_per_second:.1f} MB/s   out {snapshot.mb_out_per_second:.1f} MB/s   "
+                f"down {snapshot.mb_down_per_second:.1f} MB/s   up {snapshot.mb_up_per_second:.1f} MB/s"
+            )
+        )
+
+        stages = sorted(set(snapshot.queues) | set(snapshot.workers))
+        parts = []
+        for stage in stages:
+            part = stage
+            if stage in snapshot.queues:
+                part += f" q={snapshot.queues[stage]}"
+            if stage in snapshot.workers:
+                busy, workers = snapshot.workers[stage]
+                part += f" {busy}/{workers} busy"
+            parts.append(part)
+        self.pipeline_label.configure(text="   ".join(parts))
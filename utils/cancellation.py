@@ -0,0 +1,64 @@
+import threading
+
+
+class JobCancelled(Exception):
+    """
+    Raised at a checkpoint after the running job was cancelled.
+    """
+
+
+class CancelToken:
+    """
+    Cooperative cancel and pause flag shared between the UI and a running job.
+
+    Processing code calls `checkpoint()` between stages: it blocks while the job
+    is paused and raises JobCancelled once it has been cancelled.
+    """
+
+    def __init__(self):
+        self._cancelled = threading.Event()
+        self._running = threading.Event()
+        self._running.set()
+
+    @property
+    def cancelled(self):
+        return self._cancelled.is_set()
+
+    @property
+    def paused(self):
+        return not self._running.is_set() and not self.cancelled
+
+    def cancel(self):
+        """
+        Request cancellation. A paused job is woken up so it can stop.
+        """
+        self._cancelled.set()
+        self._running.set()
+
+    def pause(self):
+        if not self.cancelled:
+            self._running.clear()
+
+    def resume(self):
+        self._running.set()
+
+    def checkpoint(self):
+        """
+        Wait while paused, then raise JobCancelled if cancellation was requested.
+        """
+        if not self._running.is_set():
+            self._running.wait()
+        if self._cancelled.is_set():
+            raise JobCancelled()
+
+
+def checkpoint(options):
+    """
+    Run the checkpoint of the cancel token in `options`, if there is one.
+
+    Args:
+        options (dict): Processing options, optionally holding a "cancel_token".
+    """
+    token = options.get("cancel_token") if options else None
+    if token is not None:
+        token.checkpoint()
@@ -36,6 +36,7 @@
 #
 
 import io
+import logging
 import math
 import optparse
 import os
@@ -51,6 +52,8 @@ import PIL.Image
 
 from collections import deque
 
+from utils.timing import size_bucket, timings
+
 
 NS_DEEPZOOM = "http://schemas.microsoft.com/deepzoom/2008"
 
@@ -434,6 +437,7 @@ class ImageCreator(object):
         else:
             self.image = PIL.Image.open((source))
         width, height = self.image.size
+        source_size = size_bucket(width, height)
         self.descriptor = DeepZoomImageDescriptor(
             width=width,
             height=height,
@@ -445,17 +449,19 @@ class ImageCreator(object):
         image_files = _get_or_create_path(_get_files_path(destination))
         for level in range(self.descriptor.num_levels):
             level_dir = _get_or_create_path(os.path.join(image_files, str(level)))
-            level_image = self.get_image(level)
-            for (column, row) in self.tiles(level):
-                bounds = self.descriptor.get_tile_bounds(level, column, row)
-                tile = level_image.crop(bounds)
-                format = self.descriptor.tile_format
-                tile_path = os.path.join(level_dir, "%s_%s.%s" % (column, row, format))
-                if self.descriptor.tile_format == "jpg":
-                    jpeg_quality = int(self.image_quality * 100)
-                    tile.save(tile_path, "JPEG", quality=jpeg_quality)
-                else:
-                    tile.save(tile_path)
+            with timings.measure("dzi_level_resize", self.tile_format, source_size):
+                level_image = self.get_image(level)
+            with timings.measure("dzi_level_tiles", self.tile_format, source_size):
+                for (column, row) in self.tiles(level):
+                    bounds = self.descriptor.get_tile_bounds(level, column, row)
+                    tile = level_image.crop(bounds)
+                    format = self.descriptor.tile_format
+                    tile_path = os.path.join(level_dir, "%s_%s.%s" % (column, row, format))
+                    if self.descriptor.tile_format == "jpg":
+                        jpeg_quality = int(self.image_quality * 100)
+                        tile.save(tile_path, "JPEG", quality=jpeg_quality)
+                    else:
+                        tile.save(tile_path)
         # Create descriptor
         self.descriptor.save(destination)
 
@@ -502,8 +508,9 @@ class DZI:
         image_path = os.path.normpath(input)
         output_path = os.path.normpath(output)
         log = options.get("log_message")
-        log(image_path)
-        log(output_path)
+        if log:
+            log.log_message(image_path, logging.DEBUG)
+            log.log_message(output_path, logging.DEBUG)
         # Create Deep Zoom Image creator with weird parameters
         creator = ImageCreator(
             tile_size=254,
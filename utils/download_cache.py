@@ -0,0 +1,244 @@
+"""Persistent cache of downloaded source images.
+
+Originals are stored under the per-user cache directory, one folder per
+(media id, URL) key, so files with the same basename never collide:
+
+    <cache>/sources/ab/ab12.../photo.jpg
+
+A small SQLite index keeps the ETag/Last-Modified validators and the last use
+of every entry. Downloads revalidate cached entries with a conditional GET;
+a 304 costs one round-trip instead of the whole image. The cache is bounded
+in size and evicts the least recently used entries first, except entries that
+are pinned: downloaded, but not yet read by the processing stage.
+"""
+from __future__ import annotations
+
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+DEFAULT_MAX_MB = 2048
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    key TEXT PRIMARY KEY,
+    media_id TEXT,
+    url TEXT NOT NULL,
+    path TEXT NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    size INTEGER NOT NULL,
+    last_used REAL NOT NULL
+)
+"""
+
+
+@dataclass
+class CacheEntry:
+    key: str
+    media_id: Optional[str]
+    url: str
+    path: str
+    etag: Optional[str]
+    last_modified: Optional[str]
+    size: int
+    last_used: float
+
+    def validators(self) -> Dict[str, str]:
+        """Headers for a conditional GET of this entry."""
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+
+class DownloadCache:
+    def __init__(self, root, max_bytes: int = DEFAULT_MAX_MB * 1024 * 1024):
+        """
+        Initialize the DownloadCache.
+
+        Args:
+            root (str | Path): The cache directory.
+            max_bytes (int): The size limit; least recently used entries are evicted beyond it.
+        """
+        self.root = Path(root)
+        self.max_bytes = max_bytes
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._pins: Dict[str, int] = {}  # path -> pin count
+        self._db = sqlite3.connect(str(self.root / "index.db"), check_same_thread=False)
+        with self._db:
+            self._db.execute(_SCHEMA)
+
+    @staticmethod
+    def make_key(media_id, url: str) -> str:
+        return hashlib.sha256(f"{media_id}|{url}".encode("utf-8")).hexdigest()
+
+    def entry_dir(self, key: str) -> Path:
+        return self.root / key[:2] / key
+
+    def contains(self, path) -> bool:
+        """True if `path` is a file inside the cache."""
+        try:
+            Path(path).resolve().relative_to(self.root.resolve())
+            return True
+        except ValueError:
+            return False
+
+    def lookup(self, media_id, url: str, pin: bool = False) -> Optional[CacheEntry]:
+        """
+        The cached entry for an image, or None if it is not cached (or its file is gone).
+        With `pin`, the entry is pinned until `unpin(entry.path)`.
+        """
+        key = self.make_key(media_id, url)
+        with self._lock:
+            row = self._db.execute("SELECT * FROM entries WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            entry = CacheEntry(*row)
+            if not os.path.exists(entry.path):
+                with self._db:
+                    self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                return None
+            if pin:
+                self._pin_locked(entry.path)
+            return entry
+
+    def touch(self, entry: CacheEntry) -> None:
+        """Mark an entry as used, after a successful revalidation."""
+        entry.last_used = time.time()
+        with self._lock, self._db:
+            self._db.execute("UPDATE entries SET last_used = ? WHERE key = ?", (entry.last_used, entry.key))
+
+    def store(
+        self, media_id, url: str, source_path, file_name: str, etag=None, last_modified=None, pin: bool = False
+    ) -> str:
+        """
+        Move a completed download into the cache.
+
+        Args:
+            media_id: The WordPress media ID.
+            url (str): The image URL.
+            source_path (str): The downloaded file; it is moved, not copied.
+            file_name (str): The file name to keep (the URL basename).
+            etag (str, optional): The ETag response header.
+            last_modified (str, optional): The Last-Modified response header.
+            pin (bool): Pin the entry until `unpin(path)`.
+
+        Returns:
+            str: The path of the cached file.
+        """
+        key = self.make_key(media_id, url)
+        directory = self.entry_dir(key)
+        directory.mkdir(parents=True, exist_ok=True)
+        path = str(directory / file_name)
+        os.replace(source_path, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            with self._db:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, str(media_id), url, path, etag, last_modified, size, time.time()),
+                )
+            if pin:
+                self._pin_locked(path)
+            self._evict_locked(keep=key)
+        return path
+
+    def unpin(self, path: str) -> None:
+        """Release one pin of an entry; it can be evicted once no pin is left."""
+        with self._lock:
+            count = self._pins.get(path, 0) - 1
+            if count > 0:
+                self._pins[path] = count
+            else:
+                self._pins.pop(path, None)
+
+    def _pin_locked(self, path: str) -> None:
+        self._pins[path] = self._pins.get(path, 0) + 1
+
+    def temp_path(self, file_name: str) -> str:
+        """A unique ".part" path inside the cache, on the same filesystem as the entries."""
+        import tempfile
+
+        tmp_dir = self.root / "tmp"
+        tmp_dir.mkdir(exist_ok=True)
+        fd, path = tempfile.mkstemp(prefix=f"{file_name}.", suffix=".part", dir=str(tmp_dir))
+        os.close(fd)
+        return path
+
+    def size(self) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def _evict_locked(self, keep: Optional[str] = None) -> None:
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        rows = self._db.execute("SELECT key, path, size FROM entries ORDER BY last_used").fetchall()
+        with self._db:
+            for key, path, size in rows:
+                if total <= self.max_bytes:
+                    break
+                if key == keep or path in self._pins:
+                    continue
+                try:
+                    os.remove(path)
+                    os.rmdir(os.path.dirname(path))
+                except OSError:
+                    pass
+                self._db.execute("DELETE FROM entries WHERE key = ?", (key,))
+                total -= size
+
+
+_cache: Optional[DownloadCache] = None
+_cache_lock = threading.Lock()
+_enabled = True
+
+
+def _default_root() -> Path:
+    setting = os.environ.get("IMAGE_PROCESSOR_DOWNLOAD_CACHE")
+    if setting:
+        return Path(setting)
+
+    import platformdirs
+
+    from config.encrypt_config import APP_AUTHOR, APP_NAME
+
+    return Path(platformdirs.user_cache_dir(APP_NAME, APP_AUTHOR)) / "sources"
+
+
+def get_cache(max_mb: Optional[int] = None) -> Optional[DownloadCache]:
+    """
+    The process-wide download cache.
+
+    Args:
+        max_mb (int, optional): Update the size limit in megabytes; 0 disables the cache
+            until it is called with a positive size again.
+
+    Returns:
+        DownloadCache: The cache, or None if it is disabled or cannot be created.
+    """
+    global _cache, _enabled
+    if max_mb is not None:
+        _enabled = int(max_mb) > 0
+    if not _enabled:
+        return None
+    if os.environ.get("IMAGE_PROCESSOR_DOWNLOAD_CACHE", "").strip().lower() in ("0", "off", "false", "no"):
+        return None
+    with _cache_lock:
+        if _cache is None:
+            try:
+                _cache = DownloadCache(_default_root(), DEFAULT_MAX_MB * 1024 * 1024)
+            except (OSError, sqlite3.Error):
+                return None
+        if max_mb is not None:
+            _cache.max_bytes = int(max_mb) * 1024 * 1024
+        return _cache
@@ -0,0 +1,254 @@
+"""Structured event stream.
+
+Every pipeline stage reports what it did as one JSON object per line in a
+rotating ``events.jsonl`` file under the per-user log directory. Writes are
+buffered and flushed in batches, so emitting an event costs a ``json.dumps``
+and a list append on the hot path.
+
+Set ``IMAGE_PROCESSOR_EVENTS=0`` to disable the file, or to a path to write
+somewhere else.
+"""
+from __future__ import annotations
+
+import atexit
+import contextvars
+import json
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional
+
+RUN_ID = uuid.uuid4().hex[:12]
+
+
+class EventWriter:
+    """Buffered, size-rotated JSONL writer. Safe to share between threads."""
+
+    def __init__(
+        self,
+        path,
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 5,
+        buffer_size: int = 256,
+        flush_interval: float = 1.0,
+    ):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.buffer_size = buffer_size
+        self.flush_interval = flush_interval
+        self._lock = threading.Lock()
+        self._buffer: List[str] = []
+        self._last_flush = time.monotonic()
+        self._file = None
+        self._size = 0
+
+    def write(self, event: Dict[str, Any]) -> None:
+        line = json.dumps(event, separators=(",", ":"), default=str)
+        with self._lock:
+            self._buffer.append(line)
+            if (
+                len(self._buffer) >= self.buffer_size
+                or time.monotonic() - self._last_flush >= self.flush_interval
+            ):
+                self._flush_locked()
+
+    def flush(self) -> None:
+        with self._lock:
+            self._flush_locked()
+
+    def close(self) -> None:
+        with self._lock:
+            self._flush_locked()
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+
+    def _open(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._size = self._file.tell()
+
+    def _flush_locked(self) -> None:
+        self._last_flush = time.monotonic()
+        if not self._buffer:
+            return
+        data = "\n".join(self._buffer) + "\n"
+        self._buffer.clear()
+        try:
+            if self._file is None:
+                self._open()
+            if self._size and self._size + len(data) > self.max_bytes:
+                self._rotate()
+            self._file.write(data)
+            self._file.flush()
+            self._size += len(data)
+        except OSError:
+            # Losing metrics must never break a run.
+            pass
+
+    def _rotate(self) -> None:
+        self._file.close()
+        for index in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{index}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{index + 1}"))
+        if self.backup_count > 0:
+            os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+        else:
+            self.path.unlink(missing_ok=True)
+        self._open()
+
+
+_context: contextvars.ContextVar = contextvars.ContextVar("event_context", default={})
+_writer: Optional[EventWriter] = None
+_configured = False
+_listeners: List[Callable[[Dict[str, Any]], None]] = []
+_config_lock = threading.Lock()
+
+
+def _default_path() -> Optional[Path]:
+    setting = os.environ.get("IMAGE_PROCESSOR_EVENTS")
+    if setting is not None and setting.strip().lower() in ("", "0", "off", "false", "no"):
+        return None
+    if setting and setting.strip().lower() not in ("1", "on", "true", "yes"):
+        return Path(setting)
+
+    import platformdirs
+
+    from config.encrypt_config import APP_AUTHOR, APP_NAME
+
+    return Path(platformdirs.user_log_dir(APP_NAME, APP_AUTHOR)) / "events.jsonl"
+
+
+def configure(path=None, enabled: bool = True, **kwargs) -> Optional[EventWriter]:
+    """
+    Replace the process-wide event writer.
+
+    Args:
+        path (str | Path, optional): The JSONL file. Defaults to the per-user log directory.
+        enabled (bool): Write events to disk at all. Listeners are called either way.
+        **kwargs: Passed on to EventWriter.
+
+    Returns:
+        EventWriter: The new writer, or None if disabled.
+    """
+    global _writer, _configured
+    with _config_lock:
+        if _writer is not None:
+            _writer.close()
+        _writer = None
+        if enabled:
+            path = path or _default_path()
+            if path:
+                _writer = EventWriter(path, **kwargs)
+        _configured = True
+        return _writer
+
+
+def get_writer() -> Optional[EventWriter]:
+    if not _configured:
+        with _config_lock:
+            if not _configured:
+                _configure_default()
+    return _writer
+
+
+def _configure_default() -> None:
+    global _writer, _configured
+    try:
+        path = _default_path()
+        _writer = EventWriter(path) if path else None
+    except Exception:
+        _writer = None
+    _configured = True
+
+
+def subscribe(listener: Callable[[Dict[str, Any]], None]) -> None:
+    """Call `listener(event)` for every emitted event, in the emitting thread."""
+    _listeners.append(listener)
+
+
+def unsubscribe(listener: Callable[[Dict[str, Any]], None]) -> None:
+    try:
+        _listeners.remove(listener)
+    except ValueError:
+        pass
+
+
+def emit(event: str, **fields: Any) -> Dict[str, Any]:
+    """
+    Emit a single event.
+
+    Args:
+        event (str): The stage name, e.g. "download" or "upload".
+        **fields: Extra data such as duration_ms, bytes, image_id, product_id or error.
+
+    Returns:
+        dict: The emitted record.
+    """
+    record = {"event": event, "ts": fields.pop("ts", None) or time.time(), "run": RUN_ID}
+    record.update(_context.get())
+    record.update(fields)
+    writer = get_writer()
+    if writer is not None:
+        writer.write(record)
+    for listener in list(_listeners):
+        try:
+            listener(record)
+        except Exception:
+            pass
+    return record
+
+
+def bind(**fields: Any) -> contextvars.Token:
+    """
+    Add fields (e.g. job_id) to every event emitted from the current context.
+
+    Returns:
+        contextvars.Token: Pass to `unbind` to restore the previous fields.
+    """
+    return _context.set({**_context.get(), **fields})
+
+
+def unbind(token: contextvars.Token) -> None:
+    _context.reset(token)
+
+
+def submit(pool, fn: Callable, *args: Any, **kwargs: Any):
+    """
+    Submit `fn` to a concurrent.futures executor, carrying the bound event fields along.
+    """
+    return pool.submit(contextvars.copy_context().run, fn, *args, **kwargs)
+
+
+@contextmanager
+def span(event: str, **fields: Any):
+    """
+    Time a block and emit it as one event.
+
+    The yielded dict can be filled in by the block (bytes, status, error, ...).
+    Exceptions are recorded in "error" and re-raised.
+    """
+    started = time.time()
+    start = time.perf_counter()
+    record: Dict[str, Any] = dict(fields)
+    try:
+        yield record
+    except BaseException as exc:
+        record.setdefault("error", f"{type(exc).__name__}: {exc}")
+        raise
+    finally:
+        record["duration_ms"] = round((time.perf_counter() - start) * 1000, 3)
+        emit(event, ts=started, **record)
+
+
+def flush() -> None:
+    if _writer is not None:
+        _writer.flush()
+
+
+atexit.register(flush)
@@ -1,8 +1,11 @@
+import logging
 import os
 import shutil
-from tkinter import filedialog, messagebox
 from pprint import pprint
-from utils.deepzoom import DZI
+from utils import events
+from utils.metrics import metrics
+from utils.cancellation import checkpoint
+from utils.notifications import notify
 
 
 class FileProcessor:
@@ -21,6 +24,8 @@ class FileProcessor:
         Returns:
             str: The selected directory path.
         """
+        from tkinter import filedialog
+
         self.selected_directory = filedialog.askdirectory()
         return self.selected_directory
 
@@ -31,6 +36,8 @@ class FileProcessor:
         Returns:
             str: The selected directory path.
         """
+        from tkinter import filedialog
+
         self.selected_file = filedialog.askopenfilename()
         return self.selected_file
 
@@ -56,17 +63,18 @@ class FileProcessor:
                         return os.path.join(root, file)
         return None
 
-    def log_message(self, message, log=None):
+    def log_message(self, message, log=None, level=logging.INFO):
         """
         Log a message or print it if no log function is provided.
 
         Args:
             message (str): The message to log or print.
             log (function, optional): The log function to use. Defaults to None.
+            level (int, optional): The logging level. Defaults to logging.INFO.
         """
         if log:
-            log.log_message(message)
-        else:
+            log.log_message(message, level)
+        elif level >= logging.INFO:
             print(message)
 
     def process_directory_with_logging(self, options):
@@ -79,15 +87,14 @@ class FileProcessor:
         if options.get("selected_directory"):
             self.selected_directory = options.get("selected_directory")
         if not self.selected_directory:
-            messagebox.showwarning(
-                "No Directory", "Please select a directory.")
+            notify("warning", "No Directory", "Please select a directory.")
             return
         log = options.get("log_message", None)
         self.log_message(
             f"Processing started for directory: {self.selected_directory}", log
         )
         self.log_message(
-            options, log
+            options, log, logging.DEBUG
         )
         output_directory = options.get('destination_path')
         if not output_directory:
@@ -96,8 +103,7 @@ class FileProcessor:
 
         self.process_images(image_paths, output_directory, options, log)
 
-        messagebox.showinfo("Process Complete",
-                            "Image processing is complete.")
+        notify("info", "Process Complete", "Image processing is complete.")
         self.log_message("Processing complete.", log)
 
     def create_output_directory(self, log):
@@ -130,20 +136,22 @@ class FileProcessor:
             list: A list of image paths.
         """
         image_paths = []
-        for root, dirs, files in os.walk(self.selected_directory):
-            if "ProcessedImages" in dirs:
-                dirs.remove("ProcessedImages")
-            for file in files:
-                if file.lower().endswith(
-                    (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif")
-                ):
-                    file_path = os.path.join(root, file)
-                    image_paths.append(file_path)
-                    self.log_message(f"Found: {file_path}", log)
+        with events.span("scan", path=self.selected_directory) as scan_event:
+            for root, dirs, files in os.walk(self.selected_directory):
+                if "ProcessedImages" in dirs:
+                    dirs.remove("ProcessedImages")
+                for file in files:
+                    if file.lower().endswith(
+                        (".png", ".jpg", ".jpeg", ".gif", ".webp", ".avif")
+                    ):
+                        file_path = os.path.join(root, file)
+                        image_paths.append(file_path)
+                        self.log_message(f"Found: {file_path}", log, logging.DEBUG)
+            scan_event["count"] = len(image_paths)
         self.log_message(f"Total images found: {len(image_paths)}", log)
         return image_paths
 
-    def process_images(self, image_paths, output_directory, options, log, product = None):
+    def process_images(self, image_paths, output_directory, options, log, product = None, in_memory=False):
         """
         Process each image by resizing and saving it to the output directory.
 
@@ -152,9 +160,11 @@ class FileProcessor:
             output_directory (str): The path to the output directory.
             options (dict): Processing options.
             log (function): The log function to use.
+            in_memory (bool): Keep the results in memory instead of writing them
+                (not for DZI, which is always written).
 
         Returns:
-            list: A list of output image paths.
+            list: A list of output image paths, or EncodedImage objects when in_memory.
         """
         from utils.image_processing import ImageProcessor
         processed_images = []
@@ -163,33 +173,54 @@ class FileProcessor:
         image.set_image_size(options.get("image_size", "contain"))
         image.set_canvas_size( options.get("canvas_width"), options.get("canvas_height"))
         format = options.get("image_format")
-        
-        for file_path in image_paths:
-            output_path = self.generate_output_path(output_directory, file_path, options, product)
-            previews = options.get("update_previews")
-            previews(file_path)
+        metrics.expect(len(image_paths))
+
+        try:
+            for index, file_path in enumerate(image_paths):
+                checkpoint(options)
+                metrics.set_queue("process", len(image_paths) - index)
+                with metrics.busy("process"):
+                    processed_images.append(
+                        self._process_image(file_path, output_directory, options, log, product, image, format, in_memory)
+                    )
+        finally:
+            metrics.set_queue("process", 0)
+
+        return processed_images
+
+    def _process_image(self, file_path, output_directory, options, log, product, image, format, in_memory=False):
+        """
+        Process a single image for process_images.
+
+        Returns:
+            str | EncodedImage: The output image path, or the encoded image when in_memory.
+        """
+        from utils.image_processing import EncodedImage
+
+        output_path = self.generate_output_path(output_directory, file_path, options, product)
+        in_memory = in_memory and format != "DZI"
+        if not in_memory:
             os.makedirs(os.path.dirname(output_path), exist_ok=True)
-            log.log_message(f"Running: {file_path}")
-            # Check if the image is JPG and set background color accordingly
-            if file_path.lower().endswith(".jpg") or file_path.lower().endswith(".jpeg"):
-                image.set_background_color("white")
-            else:
-                image.set_background_color(options.get("background_color", "transparent"))
-            
-            if format == "DZI":
+        self.log_message(f"Running: {file_path}", log, logging.DEBUG)
+        # Check if the image is JPG and set background color accordingly
+        if file_path.lower().endswith(".jpg") or file_path.lower().endswith(".jpeg"):
+            image.set_background_color("white")
+        else:
+            image.set_background_color(options.get("background_color", "transparent"))
+
+        if format == "DZI":
+            from utils.deepzoom import DZI
+
+            with events.span("dzi", path=file_path, output=output_path):
                 DZI(file_path, output_path, options)
-            else:
-                image.resize_image(file_path, output_path, options)
-
-            # Collect the processed output path
-            processed_images.append(output_path)
-            previews(None, output_path)
-            if os.path.exists(file_path) and options.get("delete_images", False):
-                self.log_message(f"Removing: {file_path}", log)
-                os.remove(file_path)
-            self.log_message(f"Processed: {file_path}", log)
-        
-        return processed_images
+        else:
+            blob = image.resize_image(file_path, output_path, options, write=not in_memory)
+
+        if os.path.exists(file_path) and options.get("delete_images", False):
+            self.log_message(f"Removing: {file_path}", log, logging.DEBUG)
+            os.remove(file_path)
+        self.log_message(f"Processed: {file_path}", log, logging.DEBUG)
+        return EncodedImage(output_path, blob) if in_memory else output_path
 
 
     def proces_single_image(self, options):
@@ -199,22 +230,24 @@ class FileProcessor:
         Args:
             options (dict): Processing options.
         """
+        if options.get("selected_file"):
+            self.selected_file = options.get("selected_file")
         if not self.selected_file:
-            messagebox.showwarning(
-                "No File", "Please select a file.")
+            notify("warning", "No File", "Please select a file.")
             return
         log = options.get("log_message", None)
         self.log_message(
             f"Processing started for file: {self.selected_file}", log
         )
 
-        output_directory = self.create_output_directory(log)
+        output_directory = options.get('destination_path')
+        if not output_directory:
+            output_directory = self.create_output_directory(log)
         image_paths = [self.selected_file]
 
         self.process_images(image_paths, output_directory, options, log)
 
-        messagebox.showinfo("Process Complete",
-                            "Image processing is complete.")
+        notify("info", "Process Complete", "Image processing is complete.")
         self.log_message("Processing complete.", log)
 
     def generate_output_path(self, output_directory, file_path, options, product = None):
@@ -1,21 +1,48 @@
+import logging
 import os
 import tempfile
-from wand.image import Image
-from wand.color import Color
+from dataclasses import dataclass
+
+from utils import events
+from utils.timing import size_bucket, timings
 
 try:
     from PIL import Image as PILImage
 except Exception:  # Pillow is also used elsewhere; keep this optional here.
     PILImage = None
 
+@dataclass
+class EncodedImage:
+    """
+    A processed image kept in memory instead of being written to disk.
+
+    `path` is where it would have been written; its name and extension are
+    used for the upload.
+    """
+
+    path: str
+    data: bytes
+
+    @property
+    def name(self):
+        return os.path.basename(self.path)
+
+
 class ImageProcessor:
+    """
+    Resize images onto a fixed-size canvas using Wand (ImageMagick).
+
+    Wand is imported when an image is processed, so creating an ImageProcessor
+    does not load ImageMagick.
+    """
+
     def __init__(self, canvas_width=900, canvas_height=900, background_color="transparent", image_size="fit"):
         """
         Initialize the ImageProcessor with default values.
         """
         self.canvas_width = canvas_width
         self.canvas_height = canvas_height
-        self.background_color = Color(background_color)
+        self.background_color = background_color
         self.image_size = image_size
       
 
@@ -30,7 +57,7 @@ class ImageProcessor:
         """
         Set the background color.
         """
-        self.background_color = Color(color)
+        self.background_color = color
 
     def set_image_size(self, size):
         """
@@ -38,58 +65,107 @@ class ImageProcessor:
         """
         self.image_size = size
 
-    def resize_image(self, image_path, output_path, options):
+    def resize_image(self, image_path, output_path, options, write=True):
         """
         Resize and process the image.
 
         Args:
             image_path (str): The path to the input image.
             output_path (str): The path to the output image.
-            additional_name (str, optional): Additional name to append to the output filename.
-            mode (str, optional): The resizing mode ("contain", "cover", "fit"). Default is "contain".
+            options (dict): Processing options.
+            write (bool): Write the result to `output_path`; otherwise only return it.
+
+        Returns:
+            bytes: The encoded image.
         """
+        from wand.color import Color
+        from wand.image import Image
+
         log = options.get("log_message", None)
-        
+        sampler = options.get("preview_sampler")
+        sample = sampler is not None and sampler.wants_sample()
+        before_thumb = None
+
         # Normalize the paths to ensure consistency
         image_path = os.path.normpath(image_path)
         output_path = os.path.normpath(output_path)
 
+        source_format = os.path.splitext(image_path)[1].lstrip(".").lower()
         converted_tmp_path = None
         img = None
         try:
-            try:
-                img = Image(filename=image_path)
-            except Exception as e:
-                # Wand/ImageMagick AVIF support depends on the installed ImageMagick build.
-                # If it can't read AVIF, fall back to Pillow (+ pillow-avif-plugin) and convert to PNG.
-                if os.path.splitext(image_path)[1].lower() != ".avif":
-                    raise
-                converted_tmp_path = self._convert_avif_to_temp_png(image_path, log)
-                img = Image(filename=converted_tmp_path)
-                self.log_message(f"Opened AVIF via Pillow fallback: {image_path}", log)
-
-            self.log_message(f"Original image size: {img.width}x{img.height}", log)
-            if self.image_size == "contain":
-                self._contain(img)
-            elif self.image_size == "cover":
-                self._cover(img)
-            # elif self.image_size == "fit":
-            #     self._fit(img)
-
-            x_offset = int((self.canvas_width - img.width) / 2)
-            y_offset = int((self.canvas_height - img.height) / 2)
-
-            with Image(width=self.canvas_width, height=self.canvas_height, background=self.background_color) as canvas:
-                canvas.composite(img, left=x_offset, top=y_offset)
+            with events.span("decode", path=image_path) as decode_event, timings.measure(
+                "decode", source_format
+            ) as decode_timer:
+                decode_event["bytes"] = os.path.getsize(image_path)
+                try:
+                    img = Image(filename=image_path)
+                except Exception as e:
+                    # Wand/ImageMagick AVIF support depends on the installed ImageMagick build.
+                    # If it can't read AVIF, fall back to Pillow (+ pillow-avif-plugin) and convert to PNG.
+                    if os.path.splitext(image_path)[1].lower() != ".avif":
+                        raise
+                    converted_tmp_path = self._convert_avif_to_temp_png(image_path, log)
+                    img = Image(filename=converted_tmp_path)
+                    decode_event["fallback"] = "pillow"
+                    self.log_message(f"Opened AVIF via Pillow fallback: {image_path}", log, logging.DEBUG)
+                decode_event["width"] = img.width
+                decode_event["height"] = img.height
+                source_size = decode_timer.size = size_bucket(img.width, img.height)
+
+            self.log_message(f"Original image size: {img.width}x{img.height}", log, logging.DEBUG)
+
+            with Image(width=self.canvas_width, height=self.canvas_height, background=Color(self.background_color)) as canvas:
+                with events.span(
+                    "resize",
+                    path=image_path,
+                    mode=self.image_size,
+                    width=self.canvas_width,
+                    height=self.canvas_height,
+                ):
+                    with timings.measure(self.image_size, source_format, source_size):
+                        if self.image_size == "contain":
+                            self._contain(img)
+                        elif self.image_size == "cover":
+                            self._cover(img)
+                        # elif self.image_size == "fit":
+                        #     self._fit(img)
+                    if sample:
+                        before_thumb = self._thumbnail(img, sampler.size)
+
+                    x_offset = int((self.canvas_width - img.width) / 2)
+                    y_offset = int((self.canvas_height - img.height) / 2)
+                    with timings.measure("composite", source_format, source_size):
+                        canvas.composite(img, left=x_offset, top=y_offset)
+
                 # Create a new filename
                 new_filename = os.path.splitext(os.path.basename(output_path))[0]
 
                 new_filename += os.path.splitext(output_path)[1]
                 # Construct the final output path
                 final_output_path = os.path.join(os.path.dirname(output_path), new_filename)
-                # Save the image to the final output path
-                canvas.save(filename=final_output_path)
-                self.log_message(f"Saved to: {final_output_path}", log)
+                # Encode, then save the image to the final output path
+                output_format = self._output_format(final_output_path)
+                with events.span(
+                    "encode", path=final_output_path, format=output_format
+                ) as encode_event, timings.measure("encode", output_format, source_size):
+                    blob = canvas.make_blob(format=output_format)
+                    encode_event["bytes"] = len(blob)
+                if write:
+                    with events.span("write", path=final_output_path, bytes=len(blob)), timings.measure(
+                        "write", output_format, source_size
+                    ):
+                        with open(final_output_path, "wb") as output_file:
+                            output_file.write(blob)
+                    self.log_message(f"Saved to: {final_output_path}", log, logging.DEBUG)
+                if sample:
+                    sampler.submit(
+                        before_thumb,
+                        self._thumbnail(canvas, sampler.size),
+                        image_path,
+                        final_output_path,
+                    )
+                return blob
         finally:
             try:
                 if img is not None:
@@ -116,18 +192,42 @@ class ImageProcessor:
                 "Install it with: pip install pillow-avif-plugin"
             )
 
-        with PILImage.open(image_path) as im:
+        with timings.measure("avif_fallback", "avif"), PILImage.open(image_path) as im:
             # Preserve alpha if present; Wand will composite onto the selected background.
             if im.mode not in ("RGB", "RGBA"):
                 im = im.convert("RGBA")
             tmp = tempfile.NamedTemporaryFile(delete=False, suffix=".png")
             tmp.close()
             im.save(tmp.name, format="PNG")
-            self.log_message(f"Converted AVIF to temporary PNG: {tmp.name}", log)
+            self.log_message(f"Converted AVIF to temporary PNG: {tmp.name}", log, logging.DEBUG)
             return tmp.name
 
 
-    def _cover(self, img:Image):
+    @staticmethod
+    def _output_format(output_path):
+        """
+        Get the ImageMagick format name for an output path from its extension.
+        """
+        extension = os.path.splitext(output_path)[1].lstrip(".").lower()
+        return extension or "png"
+
+    def _thumbnail(self, img, size):
+        """
+        Create a small raw RGBA copy of an already-decoded image for previews.
+
+        Args:
+            img (wand.image.Image): The decoded image.
+            size (tuple): The maximum thumbnail size (width, height).
+
+        Returns:
+            tuple: (width, height, rgba_bytes)
+        """
+        with img.clone() as thumb:
+            thumb.transform(resize=f"{size[0]}x{size[1]}>")
+            thumb.depth = 8
+            return thumb.width, thumb.height, thumb.make_blob(format="RGBA")
+
+    def _cover(self, img):
         """
         Resize the image to cover the entire canvas.
         """
@@ -164,17 +264,18 @@ class ImageProcessor:
     #         img.transform(resize=f"{self.canvas_width}x{self.canvas_height}>")
     #     print(f"Fit resized image size: {img.width}x{img.height}")
 
-    def log_message(self, message, log=None):
+    def log_message(self, message, log=None, level=logging.INFO):
         """
         Log a message or print it if no log function is provided.
 
         Args:
             message (str): The message to log or print.
             log (function, optional): The log function to use. Defaults to None.
+            level (int, optional): The logging level. Defaults to logging.INFO.
         """
         if log:
-            log.log_message(message)
-        else:
+            log.log_message(message, level)
+        elif level >= logging.INFO:
             print(message)
 
 
@@ -0,0 +1,200 @@
+"""Long-lived job executor.
+
+The UI and the CLI submit processing work here instead of starting their own
+threads. Jobs get an id, a state, a CancelToken and a completion future, and
+at most `max_concurrent` of them run at the same time; the rest wait in FIFO
+order, so several sources can be queued back to back without sharing the
+temp folder or the upload connection pool with another run.
+"""
+from __future__ import annotations
+
+import itertools
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional
+
+from utils import events
+from utils.cancellation import CancelToken, JobCancelled
+
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+CANCELLED = "cancelled"
+FAILED = "failed"
+
+FINISHED_STATES = (COMPLETED, CANCELLED, FAILED)
+
+
+@dataclass
+class Job:
+    id: int
+    name: str
+    func: Callable[[dict], Any]
+    options: dict
+    token: CancelToken = field(default_factory=CancelToken)
+    future: Future = field(default_factory=Future)
+    state: str = QUEUED
+    error: Optional[BaseException] = None
+    submitted_at: float = field(default_factory=time.time)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+
+    @property
+    def done(self) -> bool:
+        return self.state in FINISHED_STATES
+
+    def cancel(self) -> None:
+        """Cancel the job; a queued job never starts, a running one stops at its next checkpoint."""
+        self.token.cancel()
+
+    def pause(self) -> None:
+        self.token.pause()
+
+    def resume(self) -> None:
+        self.token.resume()
+
+    def result(self, timeout: Optional[float] = None) -> Any:
+        """Wait for the job and return its result (raises on failure or cancellation)."""
+        return self.future.result(timeout)
+
+
+class JobExecutor:
+    def __init__(self, max_concurrent: int = 1):
+        """
+        Initialize the JobExecutor.
+
+        Args:
+            max_concurrent (int): The maximum number of jobs running at the same time.
+        """
+        self.max_concurrent = max(1, int(max_concurrent))
+        self._queue: "queue.Queue[Optional[Job]]" = queue.Queue()
+        self._jobs: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+        self._workers: List[threading.Thread] = []
+        self._listeners: List[Callable[[Job], None]] = []
+        self._shutdown = False
+
+    def add_listener(self, listener: Callable[[Job], None]) -> None:
+        """Call `listener(job)` on every state change, from the worker thread."""
+        self._listeners.append(listener)
+
+    def submit(self, name: str, func: Callable[[dict], Any], options: dict) -> Job:
+        """
+        Queue `func(options)` as a new job.
+
+        The job's cancel token and id are added to `options` as "cancel_token" and "job_id".
+
+        Returns:
+            Job: The queued job.
+        """
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("JobExecutor has been shut down")
+            job = Job(id=next(self._ids), name=name, func=func, options=options)
+            options["cancel_token"] = job.token
+            options["job_id"] = job.id
+            self._jobs[job.id] = job
+            self._ensure_workers()
+        events.emit("job", job_id=job.id, name=name, state=QUEUED)
+        self._queue.put(job)
+        return job
+
+    def get(self, job_id: int) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def jobs(self) -> List[Job]:
+        with self._lock:
+            return list(self._jobs.values())
+
+    def active(self) -> List[Job]:
+        """Jobs that are queued or running."""
+        return [job for job in self.jobs() if not job.done]
+
+    def busy(self) -> bool:
+        return bool(self.active())
+
+    def cancel_all(self) -> None:
+        for job in self.active():
+            job.cancel()
+
+    def shutdown(self, wait: bool = True, cancel: bool = False) -> None:
+        """
+        Stop accepting jobs and let the workers exit once the queue is drained.
+
+        Args:
+            wait (bool): Block until the workers have exited.
+            cancel (bool): Cancel queued and running jobs first.
+        """
+        with self._lock:
+            self._shutdown = True
+            workers = list(self._workers)
+        if cancel:
+            self.cancel_all()
+        for _ in workers:
+            self._queue.put(None)
+        if wait:
+            for worker in workers:
+                worker.join()
+
+    def _ensure_workers(self) -> None:
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        while len(self._workers) < self.max_concurrent:
+            worker = threading.Thread(
+                target=self._worker, name=f"job-worker-{len(self._workers) + 1}", daemon=True
+            )
+            worker.start()
+            self._workers.append(worker)
+
+    def _worker(self) -> None:
+        while True:
+            job = self._queue.get()
+            if job is None:
+                return
+            self._run(job)
+
+    def _set_state(self, job: Job, state: str) -> None:
+        job.state = state
+        fields = {"job_id": job.id, "name": job.name, "state": state}
+        if job.started_at and job.finished_at:
+            fields["duration_ms"] = round((job.finished_at - job.started_at) * 1000, 3)
+        if job.error is not None:
+            fields["error"] = f"{type(job.error).__name__}: {job.error}"
+        events.emit("job", **fields)
+        for listener in list(self._listeners):
+            try:
+                listener(job)
+            except Exception:
+                pass
+
+    def _run(self, job: Job) -> None:
+        if job.token.cancelled or not job.future.set_running_or_notify_cancel():
+            job.finished_at = time.time()
+            self._set_state(job, CANCELLED)
+            if not job.future.done():
+                job.future.set_exception(JobCancelled())
+            return
+
+        job.started_at = time.time()
+        self._set_state(job, RUNNING)
+        binding = events.bind(job_id=job.id)
+        try:
+            result = job.func(job.options)
+        except JobCancelled as exc:
+            job.finished_at = time.time()
+            self._set_state(job, CANCELLED)
+            job.future.set_exception(exc)
+        except BaseException as exc:
+            job.error = exc
+            job.finished_at = time.time()
+            self._set_state(job, FAILED)
+            job.future.set_exception(exc)
+        else:
+            job.finished_at = time.time()
+            self._set_state(job, COMPLETED)
+            job.future.set_result(result)
+        finally:
+            events.unbind(binding)
@@ -0,0 +1,168 @@
+"""Aggregated run counters for the live status panel.
+
+Counters are fed from the event stream (see utils/events.py) and from gauges
+set by the processing code (queue depths, busy workers). The UI reads a
+`snapshot()` at a fixed refresh rate, so the cost per image is a few integer
+additions under a lock.
+"""
+from __future__ import annotations
+
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from utils import events
+
+
+@dataclass
+class MetricsSnapshot:
+    elapsed: float = 0.0
+    images_done: int = 0
+    images_total: int = 0
+    errors: int = 0
+    images_per_second: float = 0.0
+    mb_in_per_second: float = 0.0
+    mb_out_per_second: float = 0.0
+    mb_down_per_second: float = 0.0
+    mb_up_per_second: float = 0.0
+    eta_seconds: Optional[float] = None
+    queues: Dict[str, int] = field(default_factory=dict)
+    workers: Dict[str, tuple] = field(default_factory=dict)
+
+
+class RunMetrics:
+    def __init__(self, window: float = 10.0, smoothing: float = 0.3):
+        """
+        Initialize the RunMetrics.
+
+        Args:
+            window (float): Seconds of history used for the moving-average rates.
+            smoothing (float): EWMA factor applied to the image rate used for the ETA.
+        """
+        self.window = window
+        self.smoothing = smoothing
+        self._lock = threading.Lock()
+        self.start()
+
+    def start(self) -> None:
+        """Reset all counters for a new run."""
+        with self._lock:
+            self._started = time.monotonic()
+            self._counters = {
+                "images": 0,
+                "bytes_in": 0,
+                "bytes_out": 0,
+                "bytes_down": 0,
+                "bytes_up": 0,
+                "errors": 0,
+            }
+            self._total = 0
+            self._queues: Dict[str, int] = {}
+            self._busy: Dict[str, int] = {}
+            self._workers: Dict[str, int] = {}
+            self._history = deque()
+            self._rate = None
+
+    def expect(self, count: int) -> None:
+        """Add `count` images to the expected total used for the ETA."""
+        with self._lock:
+            self._total += count
+
+    def set_queue(self, stage: str, depth: int) -> None:
+        with self._lock:
+            self._queues[stage] = depth
+
+    def set_workers(self, stage: str, count: int) -> None:
+        with self._lock:
+            self._workers[stage] = count
+
+    @contextmanager
+    def busy(self, stage: str):
+        """Mark one worker of `stage` as busy for the duration of the block."""
+        with self._lock:
+            self._busy[stage] = self._busy.get(stage, 0) + 1
+            self._workers.setdefault(stage, 1)
+        try:
+            yield
+        finally:
+            with self._lock:
+                # start() may have reset the counts while this stage was running.
+                self._busy[stage] = max(self._busy.get(stage, 0) - 1, 0)
+
+    def on_event(self, record: dict) -> None:
+        """Event listener: fold stage events into the counters."""
+        event = record.get("event")
+        failed = "error" in record
+        size = record.get("bytes") or 0
+        with self._lock:
+            if failed:
+                self._counters["errors"] += 1
+                return
+            if event == "decode":
+                self._counters["bytes_in"] += size
+            elif event == "encode":
+                self._counters["images"] += 1
+                self._counters["bytes_out"] += size
+            elif event == "dzi":
+                self._counters["images"] += 1
+            elif event == "download":
+                self._counters["bytes_down"] += size
+            elif event == "upload":
+                self._counters["bytes_up"] += size
+
+    def snapshot(self) -> MetricsSnapshot:
+        """
+        Sample the counters and compute moving-average rates and the ETA.
+
+        Meant to be called at a fixed refresh rate; each call adds a history point.
+        """
+        now = time.monotonic()
+        with self._lock:
+            counters = dict(self._counters)
+            self._history.append((now, counters))
+            while len(self._history) > 2 and now - self._history[0][0] > self.window:
+                self._history.popleft()
+            oldest_time, oldest = self._history[0]
+            span = now - oldest_time
+
+            def rate(key, scale=1.0):
+                return (counters[key] - oldest[key]) / span / scale if span > 0 else 0.0
+
+            images_per_second = rate("images")
+            if span > 0:
+                self._rate = (
+                    images_per_second
+                    if self._rate is None
+                    else self.smoothing * images_per_second + (1 - self.smoothing) * self._rate
+                )
+            remaining = max(self._total - counters["images"], 0)
+            eta = None
+            if self._total and self._rate:
+                eta = remaining / self._rate
+            elif self._total and not remaining:
+                eta = 0.0
+
+            return MetricsSnapshot(
+                elapsed=now - self._started,
+                images_done=counters["images"],
+                images_total=self._total,
+                errors=counters["errors"],
+                images_per_second=images_per_second,
+                mb_in_per_second=rate("bytes_in", 1024 * 1024),
+                mb_out_per_second=rate("bytes_out", 1024 * 1024),
+                mb_down_per_second=rate("bytes_down", 1024 * 1024),
+                mb_up_per_second=rate("bytes_up", 1024 * 1024),
+                eta_seconds=eta,
+                queues=dict(self._queues),
+                workers={
+                    stage: (self._busy.get(stage, 0), total)
+                    for stage, total in self._workers.items()
+                },
+            )
+
+
+metrics = RunMetrics()
+events.subscribe(metrics.on_event)
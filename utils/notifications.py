@@ -0,0 +1,35 @@
+"""User-facing notifications without a hard Tk dependency.
+
+Processing code calls `notify("info" | "warning" | "error", title, message)`.
+The desktop app installs a handler that shows a messagebox on the Tk thread;
+headless runs (CLI, cron) fall back to stderr.
+"""
+import sys
+
+_handler = None
+
+
+def set_notifier(handler):
+    """
+    Install the function that shows notifications.
+
+    Args:
+        handler (callable): Called as handler(kind, title, message), or None to reset.
+    """
+    global _handler
+    _handler = handler
+
+
+def notify(kind, title, message):
+    """
+    Show a notification to the user.
+
+    Args:
+        kind (str): "info", "warning" or "error".
+        title (str): The title.
+        message (str): The message.
+    """
+    if _handler is not None:
+        _handler(kind, title, message)
+    else:
+        print(f"[{kind}] {title}: {message}", file=sys.stderr)
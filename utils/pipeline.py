@@ -0,0 +1,210 @@
+"""Staged worker pipeline.
+
+Items flow from a source iterator through a chain of stages. Each stage has
+its own worker threads and a bounded input queue, so a slow stage applies
+back-pressure instead of letting work pile up, and the stages overlap: while
+one product is being resized the next one downloads and the previous one
+uploads. Throughput approaches that of the slowest stage.
+
+A stage function takes an item and returns the item for the next stage, or
+None to drop it. An exception fails only that item: it is reported as a
+"pipeline_error" event and handed to `on_discard`. A JobCancelled raised by a
+stage (or a cancelled token) stops the whole pipeline; `run()` then discards
+the items still queued and re-raises it. Stages marked `finish_on_cancel`
+(e.g. everything after an upload) still finish the items that reach them.
+An exception from the source iterator stops the feed; the items already fed
+are finished and `run()` re-raises it.
+"""
+from __future__ import annotations
+
+import queue
+import threading
+from dataclasses import dataclass
+from typing import Any, Callable, Iterable, List, Optional
+
+from utils import events
+from utils.cancellation import CancelToken, JobCancelled
+from utils.metrics import metrics
+
+_DONE = object()
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable[[Any], Any]
+    workers: int = 1
+    queue_size: int = 4
+    finish_on_cancel: bool = False
+
+
+class Pipeline:
+    def __init__(
+        self,
+        stages: List[Stage],
+        token: Optional[CancelToken] = None,
+        on_discard: Optional[Callable[[Any], None]] = None,
+        on_error: Optional[Callable[[str, Any, BaseException], None]] = None,
+    ):
+        """
+        Initialize the Pipeline.
+
+        Args:
+            stages (list): The stages, in order.
+            token (CancelToken, optional): Checked before every item; pauses and cancels the pipeline.
+            on_discard (callable, optional): Called with every item that fails or is left over after a cancel.
+            on_error (callable, optional): Called as on_error(stage_name, item, exception) when an item fails.
+        """
+        if not stages:
+            raise ValueError("A pipeline needs at least one stage")
+        self.stages = stages
+        self.token = token
+        self.on_discard = on_discard
+        self.on_error = on_error
+        self.completed = 0
+        self.failed = 0
+        self._queues = [queue.Queue(maxsize=max(1, stage.queue_size)) for stage in stages]
+        self._stop = threading.Event()
+        self._cancelled: Optional[JobCancelled] = None
+        self._source_error: Optional[BaseException] = None
+        self._running: List[int] = []
+        self._lock = threading.Lock()
+
+    def run(self, source: Iterable[Any]) -> int:
+        """
+        Feed the items of `source` through the stages and wait until all are done.
+
+        The source is iterated in its own thread, so listing overlaps with the stages too.
+
+        Returns:
+            int: The number of items that made it through the last stage.
+        """
+        threads = [threading.Thread(target=self._feed, args=(source,), name="pipeline-source", daemon=True)]
+        self._running = [stage.workers for stage in self.stages]
+        for index, stage in enumerate(self.stages):
+            metrics.set_workers(stage.name, stage.workers)
+            for worker in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(index,),
+                        name=f"pipeline-{stage.name}-{worker + 1}",
+                        daemon=True,
+                    )
+                )
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for stage in self.stages:
+            metrics.set_queue(stage.name, 0)
+        if self._cancelled is not None:
+            raise self._cancelled
+        if self._source_error is not None:
+            raise self._source_error
+        return self.completed
+
+    def _checkpoint(self) -> None:
+        if self.token is not None:
+            self.token.checkpoint()
+
+    def _put(self, index: int, item: Any) -> bool:
+        """Put an item on the queue of stage `index`, giving up once the pipeline stops."""
+        target = self._queues[index]
+        if self.stages[index].finish_on_cancel:
+            target.put(item)
+            metrics.set_queue(self.stages[index].name, target.qsize())
+            return True
+        while not self._stop.is_set():
+            try:
+                target.put(item, timeout=0.1)
+                metrics.set_queue(self.stages[index].name, target.qsize())
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _feed(self, source: Iterable[Any]) -> None:
+        try:
+            for item in source:
+                self._checkpoint()
+                if not self._put(0, item):
+                    self._discard(item)
+                    break
+        except JobCancelled as exc:
+            self._cancel(exc)
+        except Exception as exc:
+            events.emit("pipeline_error", stage="source", error=f"{type(exc).__name__}: {exc}")
+            self._source_error = exc
+        finally:
+            # One end marker per worker of the first stage.
+            for _ in range(self.stages[0].workers):
+                self._queues[0].put(_DONE)
+
+    def _work(self, index: int) -> None:
+        stage = self.stages[index]
+        inbox = self._queues[index]
+        last = index == len(self.stages) - 1
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            metrics.set_queue(stage.name, inbox.qsize())
+            if self._stop.is_set() and not stage.finish_on_cancel:
+                self._discard(item)
+                continue
+            try:
+                if not stage.finish_on_cancel:
+                    self._checkpoint()
+                with metrics.busy(stage.name):
+                    result = stage.func(item)
+            except JobCancelled as exc:
+                self._cancel(exc)
+                self._discard(item)
+                continue
+            except Exception as exc:
+                with self._lock:
+                    self.failed += 1
+                events.emit("pipeline_error", stage=stage.name, error=f"{type(exc).__name__}: {exc}")
+                self._report(stage.name, item, exc)
+                self._discard(item)
+                continue
+            if result is None:
+                continue
+            if last:
+                with self._lock:
+                    self.completed += 1
+            elif not self._put(index + 1, result):
+                self._discard(result)
+
+        # The last worker of this stage to finish closes the next stage.
+        with self._lock:
+            self._running[index] -= 1
+            close = self._running[index] == 0
+        if close and not last:
+            for _ in range(self.stages[index + 1].workers):
+                self._queues[index + 1].put(_DONE)
+
+    def _cancel(self, exc: JobCancelled) -> None:
+        with self._lock:
+            if self._cancelled is None:
+                self._cancelled = exc
+        self._stop.set()
+
+    def _report(self, stage: str, item: Any, exc: BaseException) -> None:
+        # A failing error handler must not take the worker (and the end markers) down with it.
+        if self.on_error is None:
+            return
+        try:
+            self.on_error(stage, item, exc)
+        except Exception:
+            pass
+
+    def _discard(self, item: Any) -> None:
+        if self.on_discard is None:
+            return
+        try:
+            self.on_discard(item)
+        except Exception:
+            pass
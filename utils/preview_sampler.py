@@ -0,0 +1,80 @@
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Tuple
+
+# (width, height, raw RGBA pixels)
+Thumbnail = Tuple[int, int, bytes]
+
+
+@dataclass
+class PreviewSample:
+    before: Optional[Thumbnail] = None
+    after: Optional[Thumbnail] = None
+    before_name: Optional[str] = None
+    after_name: Optional[str] = None
+
+
+class PreviewSampler:
+    """
+    Rate-limited hand-off of preview thumbnails from worker threads to the UI.
+
+    Workers ask `wants_sample()` before doing any preview work, so at most one
+    image per interval pays for thumbnailing. The UI thread polls `take()` on
+    its own timer; no Tk calls are made from the workers.
+    """
+
+    def __init__(self, interval_ms=500, size=(200, 200)):
+        """
+        Initialize the PreviewSampler.
+
+        Args:
+            interval_ms (int): Minimum time between two samples in milliseconds.
+            size (tuple): The maximum thumbnail size (width, height).
+        """
+        self.interval = max(int(interval_ms), 0) / 1000.0
+        self.size = size
+        self._lock = threading.Lock()
+        self._next_sample_at = 0.0
+        self._latest = None
+
+    def wants_sample(self):
+        """
+        Claim the next sample slot if the interval has elapsed.
+
+        Returns:
+            bool: True if the caller should produce and submit a sample.
+        """
+        now = time.monotonic()
+        if now < self._next_sample_at:
+            return False
+        with self._lock:
+            if now < self._next_sample_at:
+                return False
+            self._next_sample_at = now + self.interval
+            return True
+
+    def submit(self, before=None, after=None, before_name=None, after_name=None):
+        """
+        Store a sample, replacing any sample the UI has not picked up yet.
+
+        Args:
+            before (tuple, optional): The 'before' thumbnail as (width, height, rgba_bytes).
+            after (tuple, optional): The 'after' thumbnail as (width, height, rgba_bytes).
+            before_name (str, optional): The source path.
+            after_name (str, optional): The output path.
+        """
+        sample = PreviewSample(before, after, before_name, after_name)
+        with self._lock:
+            self._latest = sample
+
+    def take(self):
+        """
+        Pop the most recent sample.
+
+        Returns:
+            PreviewSample: The latest sample, or None if nothing new arrived.
+        """
+        with self._lock:
+            sample, self._latest = self._latest, None
+        return sample
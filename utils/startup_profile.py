@@ -0,0 +1,95 @@
+"""Startup profiling.
+
+Records how long each module import and each named init phase takes, measured
+from the moment this module is imported (first thing in main.py). Enable it
+with ``--profile-startup`` or ``IMAGE_PROCESSOR_PROFILE_STARTUP=1``.
+"""
+from __future__ import annotations
+
+import builtins
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List, Tuple
+
+_STARTED = time.perf_counter()
+
+
+class StartupProfiler:
+    def __init__(self):
+        self.enabled = False
+        self.imports: Dict[str, Tuple[float, float]] = {}
+        self.phases: List[Tuple[str, float, float]] = []
+        self._local = threading.local()
+        self._original_import = None
+
+    def elapsed(self) -> float:
+        """Seconds since the profiler module was imported."""
+        return time.perf_counter() - _STARTED
+
+    def install(self) -> None:
+        """Start timing imports. Only first-time (uncached) imports are recorded."""
+        if self.enabled:
+            return
+        self.enabled = True
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self) -> None:
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        original = self._original_import
+        if level == 0 and name in sys.modules:
+            return original(name, globals, locals, fromlist, level)
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        start = time.perf_counter()
+        try:
+            return original(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - start
+            children = stack.pop()
+            if stack:
+                stack[-1] += elapsed
+            if level:
+                package = (globals or {}).get("__package__") or ""
+                name = f"{package}.{name}" if name else package
+            if name not in self.imports:
+                self.imports[name] = (elapsed, elapsed - children)
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time an init phase, e.g. building the controller or the UI."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, start - _STARTED, time.perf_counter() - start))
+
+    def report(self, top: int = 25) -> str:
+        """
+        Format the slowest imports and all phases.
+
+        Args:
+            top (int): The number of imports to list.
+        """
+        lines = [f"Startup: {self.elapsed() * 1000:.0f} ms"]
+        if self.phases:
+            lines.append(f"{'phase':<28}{'at ms':>10}{'took ms':>10}")
+            for name, at, took in self.phases:
+                lines.append(f"{name:<28}{at * 1000:>10.1f}{took * 1000:>10.1f}")
+        if self.imports:
+            lines.append(f"{'import (top %d)' % top:<60}{'cumul ms':>10}{'self ms':>10}")
+            slowest = sorted(self.imports.items(), key=lambda item: item[1][0], reverse=True)[:top]
+            for name, (cumulative, own) in slowest:
+                lines.append(f"{name:<60}{cumulative * 1000:>10.1f}{own * 1000:>10.1f}")
+        return "\n".join(lines)
+
+
+profiler = StartupProfiler()
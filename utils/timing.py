@@ -0,0 +1,187 @@
+"""Hot-path stage timers.
+
+`timings.measure(stage, fmt, size)` wraps a block with a monotonic timer and
+adds the result to a log-bucketed histogram per (stage, format, size bucket).
+While disabled it returns a shared no-op context, so instrumented code pays
+one attribute check per stage.
+
+Enable with ``IMAGE_PROCESSOR_TIMINGS=1`` or the "Collect stage timings" option.
+"""
+from __future__ import annotations
+
+import math
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Histogram buckets are 4 per power of two of microseconds (~19% wide), up to ~18 minutes.
+_BUCKETS_PER_OCTAVE = 4
+_BUCKET_COUNT = 30 * _BUCKETS_PER_OCTAVE
+
+
+def size_bucket(width: int, height: int) -> str:
+    """
+    Classify an image by megapixels.
+
+    Returns:
+        str: One of "<1MP", "1-4MP", "4-16MP" or ">16MP".
+    """
+    megapixels = (width * height) / 1_000_000
+    if megapixels < 1:
+        return "<1MP"
+    if megapixels < 4:
+        return "1-4MP"
+    if megapixels < 16:
+        return "4-16MP"
+    return ">16MP"
+
+
+class Histogram:
+    """Constant-memory latency histogram with approximate percentiles."""
+
+    def __init__(self):
+        self.counts = [0] * _BUCKET_COUNT
+        self.count = 0
+        self.total = 0.0
+        self.min = math.inf
+        self.max = 0.0
+
+    def add(self, seconds: float) -> None:
+        micros = seconds * 1_000_000
+        index = int(math.log2(micros) * _BUCKETS_PER_OCTAVE) + 1 if micros >= 1 else 0
+        self.counts[min(index, _BUCKET_COUNT - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        self.min = min(self.min, seconds)
+        self.max = max(self.max, seconds)
+
+    def percentile(self, pct: float) -> float:
+        """Upper bound (in seconds) of the bucket holding the given percentile."""
+        if not self.count:
+            return 0.0
+        target = max(1, math.ceil(self.count * pct / 100))
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                upper = 2 ** (index / _BUCKETS_PER_OCTAVE) / 1_000_000
+                return min(upper, self.max)
+        return self.max
+
+
+class _Measurement:
+    __slots__ = ("owner", "stage", "fmt", "size", "start", "seconds")
+
+    def __init__(self, owner, stage, fmt, size):
+        self.owner = owner
+        self.stage = stage
+        self.fmt = fmt
+        self.size = size
+        self.seconds = 0.0
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.seconds = time.perf_counter() - self.start
+        self.owner.record(self.stage, self.seconds, self.fmt, self.size)
+        return False
+
+
+class _NullMeasurement:
+    """Returned while timings are disabled. Attribute writes are accepted and ignored."""
+
+    seconds = 0.0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+    def __setattr__(self, name, value):
+        pass
+
+
+_NULL = _NullMeasurement()
+
+
+class StageTimings:
+    def __init__(self, enabled: bool = False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._histograms: Dict[Tuple[str, str, str], Histogram] = {}
+
+    def measure(self, stage: str, fmt: str = "", size: str = ""):
+        """
+        Time a block as `stage`.
+
+        The returned object's `fmt` and `size` may be set inside the block
+        once they are known (e.g. after decoding).
+        """
+        if not self.enabled:
+            return _NULL
+        return _Measurement(self, stage, fmt, size)
+
+    def record(self, stage: str, seconds: float, fmt: str = "", size: str = "") -> None:
+        if not self.enabled:
+            return
+        key = (stage, fmt or "", size or "")
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = Histogram()
+            histogram.add(seconds)
+
+    def reset(self) -> None:
+        with self._lock:
+            self._histograms.clear()
+
+    def snapshot(self) -> List[dict]:
+        """
+        Aggregate statistics per (stage, format, size bucket), in milliseconds.
+        """
+        with self._lock:
+            items = sorted(self._histograms.items())
+            rows = []
+            for (stage, fmt, size), histogram in items:
+                rows.append(
+                    {
+                        "stage": stage,
+                        "format": fmt,
+                        "size": size,
+                        "count": histogram.count,
+                        "total_ms": histogram.total * 1000,
+                        "mean_ms": histogram.total * 1000 / histogram.count,
+                        "p50_ms": histogram.percentile(50) * 1000,
+                        "p90_ms": histogram.percentile(90) * 1000,
+                        "p99_ms": histogram.percentile(99) * 1000,
+                        "max_ms": histogram.max * 1000,
+                    }
+                )
+        return rows
+
+    def summary(self) -> Optional[str]:
+        """
+        Format the collected timings as a table, or None if nothing was recorded.
+        """
+        rows = self.snapshot()
+        if not rows:
+            return None
+        lines = [
+            f"{'stage':<16}{'format':<8}{'size':<8}{'count':>7}{'p50':>9}{'p90':>9}{'p99':>9}{'max':>9}{'total s':>10}"
+        ]
+        for row in rows:
+            lines.append(
+                f"{row['stage']:<16}{row['format']:<8}{row['size']:<8}{row['count']:>7}"
+                f"{row['p50_ms']:>9.1f}{row['p90_ms']:>9.1f}{row['p99_ms']:>9.1f}{row['max_ms']:>9.1f}"
+                f"{row['total_ms'] / 1000:>10.2f}"
+            )
+        return "Stage timings (ms):\n" + "\n".join(lines)
+
+
+ENABLED_BY_ENV = os.environ.get("IMAGE_PROCESSOR_TIMINGS", "").lower() in ("1", "true", "yes", "on")
+
+timings = StageTimings(enabled=ENABLED_BY_ENV)
@@ -3,7 +3,6 @@ from __future__ import annotations
 from dataclasses import dataclass
 from typing import Optional
 
-import requests
 from packaging.version import InvalidVersion, Version
 
 
@@ -51,6 +50,8 @@ def get_current_version() -> str:
 
 
 def _github_get_json(url: str, timeout_seconds: float = 10.0) -> dict:
+    import requests
+
     headers = {
         "Accept": "application/vnd.github+json",
         "User-Agent": "images_py-update-checker",